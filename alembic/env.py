@@ -10,7 +10,7 @@ from app.db.database import Base
 from app.core.config import DATABASE_URL
 
 # Import all models here so Alembic can detect them
-from app.db.models import ChatSession, ChatMessage, Document, Chunk, Embedding
+from app.db.models import ChatSession, ChatMessage, Document, Chunk, Embedding, EmbeddingCacheEntry, IngestJob
 
 # this is the Alembic Config object
 config = context.config
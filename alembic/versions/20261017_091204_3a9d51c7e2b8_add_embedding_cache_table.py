@@ -0,0 +1,39 @@
+"""add embedding cache table
+
+Revision ID: 3a9d51c7e2b8
+Revises: 6ebaf1ec46e2
+Create Date: 2026-10-17 09:12:04.118302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a9d51c7e2b8'
+down_revision: Union[str, None] = '6ebaf1ec46e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Create embedding_cache table with vector type using raw SQL
+    # (same approach as the embeddings table)
+    op.execute('''
+        CREATE TABLE embedding_cache (
+            content_hash VARCHAR(64) NOT NULL PRIMARY KEY,
+            embedding_model VARCHAR(100) NOT NULL,
+            dimensions INTEGER NOT NULL,
+            embedding vector(1536) NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            last_used_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+        );
+    ''')
+    op.create_index(op.f('ix_embedding_cache_last_used_at'), 'embedding_cache', ['last_used_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_embedding_cache_last_used_at'), table_name='embedding_cache')
+    op.drop_table('embedding_cache')
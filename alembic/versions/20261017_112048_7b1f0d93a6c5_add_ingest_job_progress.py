@@ -0,0 +1,27 @@
+"""add ingest job progress
+
+Revision ID: 7b1f0d93a6c5
+Revises: c4e8a2f61d07
+Create Date: 2026-10-17 11:20:48.310576
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b1f0d93a6c5'
+down_revision: Union[str, None] = 'c4e8a2f61d07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('ingest_jobs', sa.Column('progress', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('ingest_jobs', 'progress')
@@ -0,0 +1,30 @@
+"""add document content hash
+
+Revision ID: e92c4b7d15fa
+Revises: 7b1f0d93a6c5
+Create Date: 2026-10-17 12:33:07.842193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e92c4b7d15fa'
+down_revision: Union[str, None] = '7b1f0d93a6c5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('documents', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index('ix_documents_collection_id_content_hash', 'documents', ['collection_id', 'content_hash'], unique=False)
+    op.add_column('ingest_jobs', sa.Column('content_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('ingest_jobs', 'content_hash')
+    op.drop_index('ix_documents_collection_id_content_hash', table_name='documents')
+    op.drop_column('documents', 'content_hash')
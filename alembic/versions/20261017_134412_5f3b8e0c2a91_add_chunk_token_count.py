@@ -0,0 +1,26 @@
+"""add chunk token count
+
+Revision ID: 5f3b8e0c2a91
+Revises: e92c4b7d15fa
+Create Date: 2026-10-17 13:44:12.057361
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f3b8e0c2a91'
+down_revision: Union[str, None] = 'e92c4b7d15fa'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('chunks', sa.Column('token_count', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('chunks', 'token_count')
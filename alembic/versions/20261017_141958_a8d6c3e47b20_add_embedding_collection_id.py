@@ -0,0 +1,53 @@
+"""add embedding collection_id and per-collection vector indexes
+
+Revision ID: a8d6c3e47b20
+Revises: 5f3b8e0c2a91
+Create Date: 2026-10-17 14:19:58.733804
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8d6c3e47b20'
+down_revision: Union[str, None] = '5f3b8e0c2a91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Denormalize collection_id onto embeddings
+    op.add_column('embeddings', sa.Column('collection_id', sa.UUID(), nullable=True))
+    op.execute("""
+        UPDATE embeddings e
+        SET collection_id = d.collection_id
+        FROM documents d
+        WHERE e.document_id = d.id
+    """)
+    op.alter_column('embeddings', 'collection_id', nullable=False)
+    op.create_index(op.f('ix_embeddings_collection_id'), 'embeddings', ['collection_id'], unique=False)
+    op.create_foreign_key('embeddings_collection_id_fkey', 'embeddings', 'collections', ['collection_id'], ['id'], ondelete='CASCADE')
+
+    # Partial HNSW index per existing collection (new collections get theirs
+    # from app.services.vector_index when they are created)
+    conn = op.get_bind()
+    for (collection_id,) in conn.execute(sa.text("SELECT id FROM collections")):
+        op.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_embeddings_vec_{collection_id.hex}
+            ON embeddings
+            USING hnsw (embedding vector_cosine_ops)
+            WHERE collection_id = '{collection_id}'
+        """)
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    for (collection_id,) in conn.execute(sa.text("SELECT id FROM collections")):
+        op.execute(f"DROP INDEX IF EXISTS idx_embeddings_vec_{collection_id.hex}")
+
+    op.drop_constraint('embeddings_collection_id_fkey', 'embeddings', type_='foreignkey')
+    op.drop_index(op.f('ix_embeddings_collection_id'), table_name='embeddings')
+    op.drop_column('embeddings', 'collection_id')
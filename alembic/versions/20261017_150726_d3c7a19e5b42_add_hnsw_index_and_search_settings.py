@@ -0,0 +1,60 @@
+"""add hnsw global vector index and per-collection search settings
+
+Revision ID: d3c7a19e5b42
+Revises: a8d6c3e47b20
+Create Date: 2026-10-17 15:07:26.418230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core import config
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3c7a19e5b42'
+down_revision: Union[str, None] = 'a8d6c3e47b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('collections', sa.Column('hnsw_ef_search', sa.Integer(), nullable=True))
+    op.add_column('collections', sa.Column('ivfflat_probes', sa.Integer(), nullable=True))
+
+    # Replace the fixed lists=100 ivfflat index, which was trained on whatever
+    # rows existed when it was created.
+    op.execute('DROP INDEX IF EXISTS idx_embeddings_vector_ivfflat')
+
+    if config.VECTOR_INDEX_TYPE == 'ivfflat':
+        rows = op.get_bind().execute(sa.text('SELECT count(*) FROM embeddings')).scalar() or 0
+        lists = max(1, rows // 1000) if rows <= 1_000_000 else int(rows ** 0.5)
+        op.execute(f'''
+            CREATE INDEX idx_embeddings_vector_ivfflat
+            ON embeddings
+            USING ivfflat (embedding vector_cosine_ops)
+            WITH (lists = {lists});
+        ''')
+    else:
+        op.execute(f'''
+            CREATE INDEX idx_embeddings_vector_hnsw
+            ON embeddings
+            USING hnsw (embedding vector_cosine_ops)
+            WITH (m = {int(config.HNSW_M)}, ef_construction = {int(config.HNSW_EF_CONSTRUCTION)});
+        ''')
+
+
+def downgrade() -> None:
+    op.execute('DROP INDEX IF EXISTS idx_embeddings_vector_hnsw')
+    op.execute('DROP INDEX IF EXISTS idx_embeddings_vector_ivfflat')
+    op.execute('''
+        CREATE INDEX idx_embeddings_vector_ivfflat
+        ON embeddings
+        USING ivfflat (embedding vector_cosine_ops)
+        WITH (lists = 100);
+    ''')
+
+    op.drop_column('collections', 'ivfflat_probes')
+    op.drop_column('collections', 'hnsw_ef_search')
@@ -0,0 +1,26 @@
+"""add collection content_version
+
+Revision ID: 1e6f4b8d2c73
+Revises: d3c7a19e5b42
+Create Date: 2026-10-17 16:03:14.902117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1e6f4b8d2c73'
+down_revision: Union[str, None] = 'd3c7a19e5b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('collections', sa.Column('content_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('collections', 'content_version')
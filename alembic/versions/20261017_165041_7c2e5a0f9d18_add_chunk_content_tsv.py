@@ -0,0 +1,39 @@
+"""add generated chunks.content_tsv with GIN index for hybrid search
+
+Revision ID: 7c2e5a0f9d18
+Revises: 1e6f4b8d2c73
+Create Date: 2026-10-17 16:50:41.205873
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2e5a0f9d18'
+down_revision: Union[str, None] = '1e6f4b8d2c73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Stored generated column: Postgres computes it for existing rows (table
+    # rewrite) and keeps it current on every insert/update of content.
+    op.add_column(
+        'chunks',
+        sa.Column(
+            'content_tsv',
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('english', content)", persisted=True),
+            nullable=True
+        )
+    )
+    op.create_index('ix_chunks_content_tsv', 'chunks', ['content_tsv'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_chunks_content_tsv', table_name='chunks', postgresql_using='gin')
+    op.drop_column('chunks', 'content_tsv')
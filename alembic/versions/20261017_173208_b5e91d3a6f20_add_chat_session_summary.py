@@ -0,0 +1,28 @@
+"""add chat session rolling summary
+
+Revision ID: b5e91d3a6f20
+Revises: 7c2e5a0f9d18
+Create Date: 2026-10-17 17:32:08.417350
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5e91d3a6f20'
+down_revision: Union[str, None] = '7c2e5a0f9d18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('chat_sessions', sa.Column('summary', sa.Text(), nullable=True))
+    op.add_column('chat_sessions', sa.Column('summary_until', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('chat_sessions', 'summary_until')
+    op.drop_column('chat_sessions', 'summary')
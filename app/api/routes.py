@@ -1,11 +1,22 @@
-from fastapi import APIRouter, UploadFile, File, BackgroundTasks, HTTPException, Depends, Form, Query
-from fastapi.responses import JSONResponse
+import json
+
+import anyio
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Form, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from uuid import UUID
+from uuid import UUID, uuid4
 
 from app.schemas.schemas import (
     UploadResponse,
     QueryRequest,
+    BatchQueryRequest,
+    BatchQueryItem,
+    BatchQueryResponse,
+    SearchRequest,
+    SearchHit,
+    SearchResponse,
     QueryResponse,
     DeleteSessionRequest,
     DeleteSessionResponse,
@@ -20,14 +31,32 @@ from app.schemas.schemas import (
     DeleteDocumentResponse,
     DeleteCollectionResponse,
     CollectionsListResponse,
-    DocumentsListResponse
+    DocumentsListResponse,
+    JobStatusResponse,
+    CollectionSearchSettings,
+    RebuildIndexResponse
 )
 
-from app.services.ingest import ingest_pdf_file
-from app.services.qa import answer_query
+from app.core import config
+from app.services.job_queue import enqueue_ingest_job
+from app.services.ingest import find_duplicate_document
+from app.services.qa import aanswer_query, answer_queries_batch, stream_answer_query
 from app.services import status as job_status
+from app.services.embedding_cache import get_cache_stats
+from app.services.query_embedding_cache import aget_query_embedding, get_query_cache_stats
+from app.services.pg_vector_client import asearch_chunks
+from app.services import mmap_index
+from app.services.answer_cache import bump_collection_version, get_answer_cache, get_answer_cache_stats
+from app.services.vector_index import (
+    drop_collection_index_async,
+    count_index_rows,
+    collection_index_name,
+    ivfflat_lists_for_rows,
+    rebuild_ivfflat_index
+)
 
 from app.services.chat_memory import (
+    aget_session_messages,
     delete_session_history,
     get_session_messages,
     get_all_sessions,
@@ -36,12 +65,14 @@ from app.services.chat_memory import (
     deactivate_session
 )
 
-from app.db.database import get_db
+from app.db.database import get_async_db, get_db
 from app.db.models import ChatSession, Collection, Document, Chunk, Embedding
 
+import hashlib
 import logging
-import shutil
 import os
+import threading
+from typing import Optional
 
 
 router = APIRouter()
@@ -50,13 +81,17 @@ logger = logging.getLogger("app.api")
 
 @router.post("/ingest", response_model=UploadResponse)
 def ingest_document(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    collection: str = Query("default")
+    collection: str = Query("default"),
+    db: Session = Depends(get_db)
 ):
     """
-    Upload a PDF and ingest it into pgvector database.
+    Upload a PDF and queue it for ingestion into pgvector database.
     Documents are shared across all sessions - no session_id required.
+    Returns immediately with a job_id; poll GET /api/status/{job_id}.
+    The job is processed by a separate worker (python -m app.worker).
+    Re-uploading an identical file returns status "duplicate" without a job;
+    a changed file with an existing filename updates that document in place.
     
     Parameters:
     - file: PDF file to upload (form-data)
@@ -65,36 +100,50 @@ def ingest_document(
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported.")
 
-    upload_dir = os.path.join(os.getcwd(), "uploads")
-    os.makedirs(upload_dir, exist_ok=True)
+    os.makedirs(config.UPLOAD_DIR, exist_ok=True)
 
-    tmp_path = os.path.join(upload_dir, file.filename)
+    # Unique on-disk name so concurrent uploads of the same file don't collide
+    filename = os.path.basename(file.filename)
+    tmp_path = os.path.join(config.UPLOAD_DIR, f"{uuid4().hex}_{filename}")
 
+    # Hash while writing so duplicate uploads are detected without a second read
+    digest = hashlib.sha256()
     with open(tmp_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
-
-    # generate a job id and record queued status
-    import time
-    job_id = f"{collection}-{file.filename}-{int(time.time())}"
-    job_status.set_status(job_id, "queued")
+        for block in iter(lambda: file.file.read(1024 * 1024), b""):
+            digest.update(block)
+            f.write(block)
+    content_hash = digest.hexdigest()
+
+    existing_collection = db.query(Collection).filter(Collection.name == collection).first()
+    if existing_collection:
+        duplicate = find_duplicate_document(db, existing_collection.id, content_hash)
+        if duplicate:
+            os.remove(tmp_path)
+            logger.info(f"Upload of {filename} is identical to document {duplicate.id}; skipping ingest")
+            return UploadResponse(
+                filename=filename,
+                collection=collection,
+                status="duplicate",
+                document_id=duplicate.id
+            )
 
-    # Let FastAPI run the blocking ingestion in its thread pool via BackgroundTasks
-    logger.info("Starting synchronous ingest for %s", file.filename)
-    ingest_pdf_file(tmp_path, collection, job_id)
+    job = enqueue_ingest_job(db, tmp_path, filename, collection, content_hash=content_hash)
 
     return UploadResponse(
-        filename=file.filename,
+        filename=filename,
         collection=collection,
-        status="completed",
-        job_id=job_id
+        status=job.status,
+        job_id=str(job.id)
     )
 
 
 @router.post("/query", response_model=QueryResponse)
-def query_docs(payload: QueryRequest, db: Session = Depends(get_db)):
+async def query_docs(payload: QueryRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Retrieve from vector DB and generate an answer. Non-creative, faithful to sources.
     Supports chat memory when session_id is provided.
+    Runs on the event loop (AsyncOpenAI + async engine), so in-flight queries
+    are not capped by the threadpool size.
     """
     logger.info(
         "Query received for collection=%s, session_id=%s",
@@ -102,12 +151,17 @@ def query_docs(payload: QueryRequest, db: Session = Depends(get_db)):
         payload.session_id
     )
 
-    answer, source_docs = answer_query(
+    answer, source_docs = await aanswer_query(
         payload.query,
         collection=payload.collection,
         k=payload.k,
         session_id=payload.session_id,
-        db=db
+        db=db,
+        ef_search=payload.ef_search,
+        probes=payload.probes,
+        search_mode=payload.search_mode,
+        mmr=payload.mmr,
+        mmr_lambda=payload.mmr_lambda
     )
 
     return QueryResponse(
@@ -117,6 +171,115 @@ def query_docs(payload: QueryRequest, db: Session = Depends(get_db)):
     )
 
 
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/query/stream")
+async def query_docs_stream(payload: QueryRequest, request: Request):
+    """
+    Same as /query, streamed as server-sent events: a "sources" event once
+    retrieval finishes, "token" events as the answer is generated, then
+    "done" (or "error"). The chat turn is saved when the stream completes;
+    if the client disconnects first, the upstream completion is closed.
+    """
+    logger.info(
+        "Streaming query received for collection=%s, session_id=%s",
+        payload.collection,
+        payload.session_id
+    )
+
+    events = stream_answer_query(
+        payload.query,
+        collection=payload.collection,
+        k=payload.k,
+        session_id=payload.session_id,
+        ef_search=payload.ef_search,
+        probes=payload.probes,
+        search_mode=payload.search_mode,
+        mmr=payload.mmr,
+        mmr_lambda=payload.mmr_lambda
+    )
+
+    async def _sse():
+        try:
+            while True:
+                # Retrieval and the OpenAI stream block, so step the generator in the threadpool
+                event = await run_in_threadpool(next, events, None)
+                if event is None:
+                    break
+                if await request.is_disconnected():
+                    logger.info("Client disconnected; closing streaming query")
+                    break
+                yield _sse_event(*event)
+        finally:
+            # Runs on cancellation too; closing the generator closes the upstream stream
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(events.close)
+
+    return StreamingResponse(
+        _sse(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/query/batch", response_model=BatchQueryResponse)
+def query_docs_batch(payload: BatchQueryRequest, db: Session = Depends(get_db)):
+    """
+    Answer many stateless queries at once (evaluation runs, FAQ pre-generation).
+    All queries are embedded in one request and retrieved in one SQL statement;
+    LLM calls run with bounded concurrency, and a failed item reports its
+    error without failing the batch.
+    """
+    logger.info(
+        "Batch query received for collection=%s, queries=%d",
+        payload.collection,
+        len(payload.queries)
+    )
+
+    results = answer_queries_batch(
+        payload.queries,
+        collection=payload.collection,
+        k=payload.k,
+        db=db,
+        ef_search=payload.ef_search,
+        probes=payload.probes
+    )
+
+    return BatchQueryResponse(results=[BatchQueryItem(**r) for r in results])
+
+
+@router.post("/search", response_model=SearchResponse)
+async def search_docs(payload: SearchRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Retrieval only: ranked chunks with distances and metadata, no LLM call.
+    Paginate with limit/offset; has_more tells whether another page exists.
+    """
+    query_embedding = await aget_query_embedding(payload.query, db=db)
+
+    # One extra row tells whether another page exists
+    hits = await asearch_chunks(
+        db,
+        query_embedding,
+        collection=payload.collection,
+        limit=payload.limit + 1,
+        offset=payload.offset,
+        max_distance=payload.max_distance,
+        ef_search=payload.ef_search,
+        probes=payload.probes
+    )
+
+    return SearchResponse(
+        query=payload.query,
+        collection=payload.collection,
+        results=[SearchHit(**h) for h in hits[:payload.limit]],
+        limit=payload.limit,
+        offset=payload.offset,
+        has_more=len(hits) > payload.limit
+    )
+
+
 # SESSION ENDPOINTS - Specific routes BEFORE parameterized routes
 @router.post("/session/new", response_model=CreateSessionResponse)
 def create_session(db: Session = Depends(get_db)):
@@ -219,13 +382,13 @@ def list_all_sessions(db: Session = Depends(get_db)):
 
 # Parameterized routes AFTER specific routes
 @router.get("/session/{session_id}", response_model=SessionHistoryResponse)
-def get_session(session_id: UUID, db: Session = Depends(get_db)):
+async def get_session(session_id: UUID, db: AsyncSession = Depends(get_async_db)):
     """
     Retrieve all chat history for a specific session.
     """
     logger.info("Get session request for session_id=%s", session_id)
 
-    messages = get_session_messages(db, session_id)
+    messages = await aget_session_messages(db, session_id)
 
     return SessionHistoryResponse(
         session_id=session_id,
@@ -281,9 +444,55 @@ def delete_session(session_id: UUID, db: Session = Depends(get_db)):
     )
 
 
-@router.get("/status/{job_id}")
+@router.get("/status/{job_id}", response_model=JobStatusResponse)
 def get_status(job_id: str):
-    return {"job_id": job_id, "status": job_status.get_status(job_id)}
+    """
+    Ingest job status with progress counters and per-stage timings
+    (read, chunk, embed, store).
+    """
+    job = job_status.get_job(job_id)
+
+    if not job:
+        return JobStatusResponse(job_id=job_id, status="unknown")
+
+    return JobStatusResponse(
+        job_id=job_id,
+        status=job.status,
+        filename=job.filename,
+        collection=job.collection_name,
+        error=job.error,
+        attempts=job.attempts or 0,
+        stalled=job_status.is_stalled(job),
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        updated_at=job.updated_at,
+        progress=job.progress
+    )
+
+
+@router.get("/embedding-cache/stats")
+def embedding_cache_stats():
+    """
+    Hit/miss counters for the persistent embedding cache (this process only).
+    """
+    return get_cache_stats()
+
+
+@router.get("/query-embedding-cache/stats")
+def query_embedding_cache_stats():
+    """
+    Hit rate, size and evictions of the in-process query embedding cache (this process only).
+    """
+    return get_query_cache_stats()
+
+
+@router.get("/answer-cache/stats")
+def answer_cache_stats():
+    """
+    Hit rate and invalidations of the semantic answer cache (this process only).
+    """
+    return get_answer_cache_stats()
 
 
 # ===== DOCUMENT & COLLECTION MANAGEMENT ENDPOINTS =====
@@ -386,8 +595,12 @@ def delete_document_by_id(document_id: UUID, db: Session = Depends(get_db)):
     collection_name = document.collection.name
     
     # Delete document (CASCADE will handle chunks and embeddings)
+    collection_id = document.collection_id
+    bump_collection_version(db, collection_id)
     db.delete(document)
     db.commit()
+
+    mmap_index.sync_collection_async(collection_id)
     
     logger.info(f"Deleted document {document_id} ({filename}) with {chunk_count} chunks and {embedding_count} embeddings")
     
@@ -424,8 +637,13 @@ def delete_all_documents_in_collection(collection_name: str, db: Session = Depen
         total_embeddings += db.query(Embedding).filter(Embedding.document_id == doc.id).count()
     
     # Delete collection (CASCADE will handle documents, chunks, and embeddings)
+    collection_id = collection.id
     db.delete(collection)
     db.commit()
+
+    get_answer_cache().invalidate(collection_id)
+    mmap_index.drop_collection(collection_id)
+    drop_collection_index_async(collection_id)
     
     logger.info(
         f"Deleted collection '{collection_name}' with {doc_count} documents, "
@@ -441,4 +659,69 @@ def delete_all_documents_in_collection(collection_name: str, db: Session = Depen
     )
 
 
+@router.put("/collections/{collection_name}/search-settings", response_model=CollectionSearchSettings)
+def update_collection_search_settings(
+    collection_name: str,
+    payload: CollectionSearchSettings,
+    db: Session = Depends(get_db)
+):
+    """
+    Set per-collection defaults for hnsw.ef_search / ivfflat.probes.
+    Null resets a value to the global default. Query requests can still override.
+    """
+    collection = db.query(Collection).filter(Collection.name == collection_name).first()
+
+    if not collection:
+        raise HTTPException(status_code=404, detail=f"Collection '{collection_name}' not found")
+
+    collection.hnsw_ef_search = payload.hnsw_ef_search
+    collection.ivfflat_probes = payload.ivfflat_probes
+    db.commit()
+
+    return CollectionSearchSettings(
+        hnsw_ef_search=collection.hnsw_ef_search,
+        ivfflat_probes=collection.ivfflat_probes
+    )
+
+
+# ===== ADMIN ENDPOINTS =====
+
+@router.post("/admin/vector-index/rebuild", response_model=RebuildIndexResponse, status_code=202)
+def rebuild_vector_index(
+    collection: Optional[str] = Query(None),
+    lists: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db)
+):
+    """
+    Rebuild the global vector index (or one collection's partial index) as
+    ivfflat with lists sized to the current row count, using
+    CREATE INDEX CONCURRENTLY. Runs in the background; reads and writes continue.
+    """
+    collection_id = None
+    if collection is not None:
+        collection_row = db.query(Collection).filter(Collection.name == collection).first()
+        if not collection_row:
+            raise HTTPException(status_code=404, detail=f"Collection '{collection}' not found")
+        collection_id = collection_row.id
+
+    rows = count_index_rows(collection_id)
+    lists = lists or ivfflat_lists_for_rows(rows)
+
+    def _rebuild():
+        try:
+            rebuild_ivfflat_index(collection_id, lists=lists)
+        except Exception as e:
+            logger.error(f"Vector index rebuild failed: {e}", exc_info=True)
+
+    threading.Thread(target=_rebuild, name="vector-index-rebuild", daemon=True).start()
+
+    return RebuildIndexResponse(
+        index="idx_embeddings_vector_ivfflat" if collection_id is None else collection_index_name(collection_id),
+        rows=rows,
+        lists=lists,
+        collection_name=collection,
+        message="Index rebuild started (CREATE INDEX CONCURRENTLY)"
+    )
+
+
 # python -m uvicorn app.main:app --reload --host 127.0.0.1 --port 8000
@@ -12,7 +12,106 @@ class Settings:
     # gemini_api_key: str = os.getenv("GEMINI_API_KEY", "test")
     llm_model: str = os.getenv("LLM_MODEL", "gpt-4o")
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
+    openai_base_url: str = os.getenv("OPENAI_BASE_URL", "")
+
+    # Embedding batching limits (per embeddings.create request)
+    embed_batch_max_inputs: int = int(os.getenv("EMBED_BATCH_MAX_INPUTS", "2048"))
+    embed_batch_max_tokens: int = int(os.getenv("EMBED_BATCH_MAX_TOKENS", "300000"))
+    embed_max_input_tokens: int = int(os.getenv("EMBED_MAX_INPUT_TOKENS", "8191"))
+    embed_dimensions: int = int(os.getenv("EMBED_DIMENSIONS", "1536"))
+    embed_cache_enabled: bool = os.getenv("EMBED_CACHE_ENABLED", "true").lower() == "true"
+    embed_cache_max_rows: int = int(os.getenv("EMBED_CACHE_MAX_ROWS", "500000"))
+    embed_cache_evict_interval_seconds: float = float(os.getenv("EMBED_CACHE_EVICT_INTERVAL_SECONDS", "300"))
+    embed_cache_touch_interval_seconds: float = float(os.getenv("EMBED_CACHE_TOUCH_INTERVAL_SECONDS", "3600"))
+    embed_max_concurrency: int = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+    embed_max_retries: int = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+
+    # In-process query embedding cache (LRU + TTL, bounded by bytes)
+    query_embed_cache_enabled: bool = os.getenv("QUERY_EMBED_CACHE_ENABLED", "true").lower() == "true"
+    query_embed_cache_max_bytes: int = int(os.getenv("QUERY_EMBED_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    query_embed_cache_ttl_seconds: float = float(os.getenv("QUERY_EMBED_CACHE_TTL_SECONDS", "3600"))
+
+    # Semantic answer cache for stateless queries (per collection, in-process)
+    answer_cache_enabled: bool = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    answer_cache_similarity_threshold: float = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.95"))
+    answer_cache_max_entries: int = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+    answer_cache_ttl_seconds: float = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
     
+    # Chunking in embedding-model tokens
+    chunk_tokens: int = int(os.getenv("CHUNK_TOKENS", "300"))
+    chunk_overlap_tokens: int = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+
+    # Vector index: "hnsw" or "ivfflat" for the global embeddings index
+    vector_index_type: str = os.getenv("VECTOR_INDEX_TYPE", "hnsw").lower()
+    hnsw_m: int = int(os.getenv("HNSW_M", "16"))
+    hnsw_ef_construction: int = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+    # Query-time defaults; overridable per collection and per request
+    hnsw_ef_search: int = int(os.getenv("HNSW_EF_SEARCH", "40"))
+    ivfflat_probes: int = int(os.getenv("IVFFLAT_PROBES", "10"))
+
+    # Retrieval backend: "auto" serves collections up to ANN_MMAP_MAX_ROWS from
+    # memory-mapped in-process vectors, larger ones from Postgres; "postgres" always uses pgvector
+    retrieval_backend: str = os.getenv("RETRIEVAL_BACKEND", "auto").lower()
+    ann_mmap_dir: str = os.getenv("ANN_MMAP_DIR", os.path.join(os.getcwd(), "ann_index"))
+    ann_mmap_max_rows: int = int(os.getenv("ANN_MMAP_MAX_ROWS", "200000"))
+    ann_mmap_dtype: str = os.getenv("ANN_MMAP_DTYPE", "float16")
+
+    # Prompt context assembly: LLM-token budget, near-duplicate cut-off and
+    # neighbor-chunk expansion around the strongest hits
+    context_token_budget: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+    context_dedup_threshold: float = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+    context_neighbor_radius: int = int(os.getenv("CONTEXT_NEIGHBOR_RADIUS", "1"))
+    context_neighbor_top_hits: int = int(os.getenv("CONTEXT_NEIGHBOR_TOP_HITS", "2"))
+    context_neighbor_max_distance: float = float(os.getenv("CONTEXT_NEIGHBOR_MAX_DISTANCE", "0.35"))
+
+    # Chat memory: recent turns sent verbatim (at most N turns, within a token budget);
+    # older turns are folded into a rolling per-session summary in the background
+    chat_history_max_turns: int = int(os.getenv("CHAT_HISTORY_MAX_TURNS", "6"))
+    chat_history_token_budget: int = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1500"))
+    chat_summary_enabled: bool = os.getenv("CHAT_SUMMARY_ENABLED", "true").lower() == "true"
+    chat_summary_model: str = os.getenv("CHAT_SUMMARY_MODEL", "gpt-4o-mini")
+    chat_summary_max_tokens: int = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "400"))
+    chat_summary_fold_turns: int = int(os.getenv("CHAT_SUMMARY_FOLD_TURNS", "10"))
+
+    # Chat turns are saved write-behind: batched inserts every interval or once max turns are queued
+    chat_write_behind_enabled: bool = os.getenv("CHAT_WRITE_BEHIND_ENABLED", "true").lower() == "true"
+    chat_write_behind_interval_seconds: float = float(os.getenv("CHAT_WRITE_BEHIND_INTERVAL_SECONDS", "0.5"))
+    chat_write_behind_max_turns: int = int(os.getenv("CHAT_WRITE_BEHIND_MAX_TURNS", "100"))
+    chat_write_behind_max_queued_turns: int = int(os.getenv("CHAT_WRITE_BEHIND_MAX_QUEUED_TURNS", "1000"))
+    chat_write_behind_max_retries: int = int(os.getenv("CHAT_WRITE_BEHIND_MAX_RETRIES", "8"))
+
+    # MMR rerank (QueryRequest.mmr): candidate pool size and default lambda
+    mmr_pool_size: int = int(os.getenv("MMR_POOL_SIZE", "50"))
+    mmr_lambda: float = float(os.getenv("MMR_LAMBDA", "0.5"))
+
+    # Async query path: connection pool of the asyncio engine, max HTTP connections to OpenAI
+    async_db_pool_size: int = int(os.getenv("ASYNC_DB_POOL_SIZE", "20"))
+    async_db_max_overflow: int = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "20"))
+    openai_max_connections: int = int(os.getenv("OPENAI_MAX_CONNECTIONS", "200"))
+
+    # POST /api/query/batch: concurrent LLM completions per batch
+    batch_query_llm_concurrency: int = int(os.getenv("BATCH_QUERY_LLM_CONCURRENCY", "8"))
+
+    # Hybrid (full-text + vector) search: candidates per arm and RRF constant
+    hybrid_candidates: int = int(os.getenv("HYBRID_CANDIDATES", "40"))
+    hybrid_rrf_k: int = int(os.getenv("HYBRID_RRF_K", "60"))
+
+    # Ingest pipeline: max chunks (text + vectors) held in memory at once
+    ingest_window_chunks: int = int(os.getenv("INGEST_WINDOW_CHUNKS", "256"))
+
+    # PDF text extraction: process pool size (0 = extract in the calling thread)
+    pdf_extract_workers: int = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+    pdf_extract_shard_pages: int = int(os.getenv("PDF_EXTRACT_SHARD_PAGES", "25"))
+
+    # Ingest job queue / worker
+    upload_dir: str = os.getenv("UPLOAD_DIR", os.path.join(os.getcwd(), "uploads"))
+    ingest_worker_concurrency: int = int(os.getenv("INGEST_WORKER_CONCURRENCY", "2"))
+    ingest_worker_poll_seconds: float = float(os.getenv("INGEST_WORKER_POLL_SECONDS", "2"))
+    ingest_job_stale_seconds: int = int(os.getenv("INGEST_JOB_STALE_SECONDS", "1800"))
+    ingest_job_max_attempts: int = int(os.getenv("INGEST_JOB_MAX_ATTEMPTS", "3"))
+    ingest_progress_interval_seconds: float = float(os.getenv("INGEST_PROGRESS_INTERVAL_SECONDS", "2"))
+    ingest_job_stall_seconds: int = int(os.getenv("INGEST_JOB_STALL_SECONDS", "300"))
+
     # Database configuration with AWS RDS support
     database_url: str = os.getenv(
         "DATABASE_URL",
@@ -37,4 +136,67 @@ EMBED_MODEL = settings.embed_model
 # GEMINI_API_KEY = settings.gemini_api_key
 LLM_MODEL = settings.llm_model
 OPENAI_API_KEY = settings.openai_api_key
+OPENAI_BASE_URL = settings.openai_base_url
+EMBED_BATCH_MAX_INPUTS = settings.embed_batch_max_inputs
+EMBED_BATCH_MAX_TOKENS = settings.embed_batch_max_tokens
+EMBED_MAX_INPUT_TOKENS = settings.embed_max_input_tokens
+EMBED_DIMENSIONS = settings.embed_dimensions
+EMBED_CACHE_ENABLED = settings.embed_cache_enabled
+EMBED_CACHE_MAX_ROWS = settings.embed_cache_max_rows
+EMBED_CACHE_EVICT_INTERVAL_SECONDS = settings.embed_cache_evict_interval_seconds
+EMBED_CACHE_TOUCH_INTERVAL_SECONDS = settings.embed_cache_touch_interval_seconds
+EMBED_MAX_CONCURRENCY = settings.embed_max_concurrency
+EMBED_MAX_RETRIES = settings.embed_max_retries
+QUERY_EMBED_CACHE_ENABLED = settings.query_embed_cache_enabled
+QUERY_EMBED_CACHE_MAX_BYTES = settings.query_embed_cache_max_bytes
+QUERY_EMBED_CACHE_TTL_SECONDS = settings.query_embed_cache_ttl_seconds
+ANSWER_CACHE_ENABLED = settings.answer_cache_enabled
+ANSWER_CACHE_SIMILARITY_THRESHOLD = settings.answer_cache_similarity_threshold
+ANSWER_CACHE_MAX_ENTRIES = settings.answer_cache_max_entries
+ANSWER_CACHE_TTL_SECONDS = settings.answer_cache_ttl_seconds
 DATABASE_URL = settings.database_url
+CHUNK_TOKENS = settings.chunk_tokens
+CHUNK_OVERLAP_TOKENS = settings.chunk_overlap_tokens
+VECTOR_INDEX_TYPE = settings.vector_index_type
+HNSW_M = settings.hnsw_m
+HNSW_EF_CONSTRUCTION = settings.hnsw_ef_construction
+HNSW_EF_SEARCH = settings.hnsw_ef_search
+IVFFLAT_PROBES = settings.ivfflat_probes
+RETRIEVAL_BACKEND = settings.retrieval_backend
+ANN_MMAP_DIR = settings.ann_mmap_dir
+ANN_MMAP_MAX_ROWS = settings.ann_mmap_max_rows
+ANN_MMAP_DTYPE = settings.ann_mmap_dtype
+CONTEXT_TOKEN_BUDGET = settings.context_token_budget
+CONTEXT_DEDUP_THRESHOLD = settings.context_dedup_threshold
+CONTEXT_NEIGHBOR_RADIUS = settings.context_neighbor_radius
+CONTEXT_NEIGHBOR_TOP_HITS = settings.context_neighbor_top_hits
+CONTEXT_NEIGHBOR_MAX_DISTANCE = settings.context_neighbor_max_distance
+CHAT_HISTORY_MAX_TURNS = settings.chat_history_max_turns
+CHAT_HISTORY_TOKEN_BUDGET = settings.chat_history_token_budget
+CHAT_SUMMARY_ENABLED = settings.chat_summary_enabled
+CHAT_SUMMARY_MODEL = settings.chat_summary_model
+CHAT_SUMMARY_MAX_TOKENS = settings.chat_summary_max_tokens
+CHAT_SUMMARY_FOLD_TURNS = settings.chat_summary_fold_turns
+CHAT_WRITE_BEHIND_ENABLED = settings.chat_write_behind_enabled
+CHAT_WRITE_BEHIND_INTERVAL_SECONDS = settings.chat_write_behind_interval_seconds
+CHAT_WRITE_BEHIND_MAX_TURNS = settings.chat_write_behind_max_turns
+CHAT_WRITE_BEHIND_MAX_QUEUED_TURNS = settings.chat_write_behind_max_queued_turns
+CHAT_WRITE_BEHIND_MAX_RETRIES = settings.chat_write_behind_max_retries
+MMR_POOL_SIZE = settings.mmr_pool_size
+MMR_LAMBDA = settings.mmr_lambda
+BATCH_QUERY_LLM_CONCURRENCY = settings.batch_query_llm_concurrency
+ASYNC_DB_POOL_SIZE = settings.async_db_pool_size
+ASYNC_DB_MAX_OVERFLOW = settings.async_db_max_overflow
+OPENAI_MAX_CONNECTIONS = settings.openai_max_connections
+HYBRID_CANDIDATES = settings.hybrid_candidates
+HYBRID_RRF_K = settings.hybrid_rrf_k
+INGEST_WINDOW_CHUNKS = settings.ingest_window_chunks
+PDF_EXTRACT_WORKERS = settings.pdf_extract_workers
+PDF_EXTRACT_SHARD_PAGES = settings.pdf_extract_shard_pages
+UPLOAD_DIR = settings.upload_dir
+INGEST_WORKER_CONCURRENCY = settings.ingest_worker_concurrency
+INGEST_WORKER_POLL_SECONDS = settings.ingest_worker_poll_seconds
+INGEST_JOB_STALE_SECONDS = settings.ingest_job_stale_seconds
+INGEST_JOB_MAX_ATTEMPTS = settings.ingest_job_max_attempts
+INGEST_PROGRESS_INTERVAL_SECONDS = settings.ingest_progress_interval_seconds
+INGEST_JOB_STALL_SECONDS = settings.ingest_job_stall_seconds
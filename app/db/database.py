@@ -1,7 +1,8 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from app.core.config import DATABASE_URL
+from app.core.config import ASYNC_DB_MAX_OVERFLOW, ASYNC_DB_POOL_SIZE, DATABASE_URL
 
 # Convert postgresql:// to postgresql+psycopg:// for psycopg3
 db_url = DATABASE_URL
@@ -11,6 +12,10 @@ if db_url.startswith("postgresql://"):
 engine = create_engine(db_url)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# psycopg 3 serves asyncio through the same postgresql+psycopg dialect
+async_engine = create_async_engine(db_url, pool_size=ASYNC_DB_POOL_SIZE, max_overflow=ASYNC_DB_MAX_OVERFLOW)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 
@@ -21,3 +26,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """Dependency to get an asyncio database session (async routes)"""
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, Text, DateTime, Boolean, ForeignKey, Integer, Index
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Text, DateTime, Boolean, ForeignKey, Integer, Index, Computed
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import uuid
@@ -26,6 +26,10 @@ class ChatSession(Base):
         server_default=func.now(),
         onupdate=func.now()
     )
+    # Rolling summary of every message created at or before summary_until;
+    # newer messages are sent verbatim (see chat_memory.get_chat_memory)
+    summary = Column(Text, nullable=True)
+    summary_until = Column(DateTime(timezone=True), nullable=True)
 
     # Relationship to messages
     messages = relationship(
@@ -67,6 +71,11 @@ class Collection(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String(100), unique=True, nullable=False, index=True)
     description = Column(Text, nullable=True)
+    # Per-collection query-time index defaults (NULL = use global settings)
+    hnsw_ef_search = Column(Integer, nullable=True)
+    ivfflat_probes = Column(Integer, nullable=True)
+    # Bumped whenever documents are added, changed or deleted; invalidates cached answers
+    content_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
@@ -79,6 +88,9 @@ class Collection(Base):
 class Document(Base):
     """Model to store uploaded documents metadata - organized by collection"""
     __tablename__ = "documents"
+    __table_args__ = (
+        Index("ix_documents_collection_id_content_hash", "collection_id", "content_hash"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     collection_id = Column(
@@ -91,6 +103,7 @@ class Document(Base):
     document_type = Column(String(50), default="pdf")  # pdf, webpage, etc.
     source_url = Column(String(500), nullable=True)
     title = Column(String(255), nullable=True)
+    content_hash = Column(String(64), nullable=True)  # sha256 of the uploaded file
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
@@ -104,6 +117,9 @@ class Document(Base):
 class Chunk(Base):
     """Model to store text chunks from documents"""
     __tablename__ = "chunks"
+    __table_args__ = (
+        Index("ix_chunks_content_tsv", "content_tsv", postgresql_using="gin"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     document_id = Column(
@@ -114,6 +130,9 @@ class Chunk(Base):
     )
     content = Column(Text, nullable=False)
     chunk_index = Column(Integer, nullable=False)
+    token_count = Column(Integer, nullable=True)  # tokens in the embedding model's encoding
+    # Full-text search vector, maintained by Postgres (GIN-indexed for hybrid search)
+    content_tsv = Column(TSVECTOR, Computed("to_tsvector('english', content)", persisted=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
@@ -144,6 +163,14 @@ class Embedding(Base):
         nullable=False,
         index=True
     )
+    # Denormalized from documents so searches filter without a join;
+    # each collection also gets a partial vector index (services/vector_index.py)
+    collection_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("collections.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True
+    )
     # Vector column for pgvector (1536 dimensions for text-embedding-3-small)
     embedding = Column(Vector(1536), nullable=False)
     embedding_model = Column(String(100), default="text-embedding-3-small")
@@ -156,3 +183,44 @@ class Embedding(Base):
     def __repr__(self):
         return f"<Embedding(id={self.id}, chunk_id={self.chunk_id})>"
 
+
+class EmbeddingCacheEntry(Base):
+    """Content-addressed cache of embeddings, keyed by hash(normalized text, model, dimensions)"""
+    __tablename__ = "embedding_cache"
+
+    content_hash = Column(String(64), primary_key=True)
+    embedding_model = Column(String(100), nullable=False)
+    dimensions = Column(Integer, nullable=False)
+    embedding = Column(Vector(1536), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_used_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    def __repr__(self):
+        return f"<EmbeddingCacheEntry(content_hash={self.content_hash}, model={self.embedding_model})>"
+
+
+class IngestJob(Base):
+    """Durable ingest job, claimed by workers with SELECT ... FOR UPDATE SKIP LOCKED"""
+    __tablename__ = "ingest_jobs"
+    __table_args__ = (
+        Index("ix_ingest_jobs_status_created_at", "status", "created_at"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    collection_name = Column(String(100), nullable=False)
+    filename = Column(String(255), nullable=False)
+    file_path = Column(String(500), nullable=False)
+    content_hash = Column(String(64), nullable=True)
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, completed, failed
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    worker_id = Column(String(100), nullable=True)
+    # Counters and per-stage timings, see services/status.py JobProgress
+    progress = Column(JSONB, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<IngestJob(id={self.id}, filename={self.filename}, status={self.status})>"
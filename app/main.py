@@ -4,8 +4,11 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import router
 from app.logging_config import configure_logging
 from app.core.config import settings
-from app.db.database import engine, Base
+from app.db.database import async_engine, engine, Base
 from app.db.models import ChatMessage, ChatSession  # Import to register models
+from app.services.embedding_cache import flush_writes
+from app.services.pdf_extract import shutdown_extract_pool
+from app.services.turn_buffer import shutdown_turn_buffer
 
 configure_logging()
 
@@ -26,6 +29,18 @@ app.add_middleware(
 app.include_router(router, prefix="/api")
 
 
+@app.on_event("shutdown")
+def shutdown_pools():
+    shutdown_turn_buffer()
+    shutdown_extract_pool()
+    flush_writes()
+
+
+@app.on_event("shutdown")
+async def shutdown_async_engine():
+    await async_engine.dispose()
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field, model_validator
+from typing import Dict, List, Literal, Optional
 from datetime import datetime
 from uuid import UUID
 
@@ -9,13 +9,53 @@ class UploadResponse(BaseModel):
     collection: str
     status: str
     job_id: Optional[str] = None
+    document_id: Optional[UUID] = None  # Set when the upload duplicates an existing document
+
+
+class StageTiming(BaseModel):
+    seconds: float = 0.0
+    items: int = 0
+    items_per_second: float = 0.0
+
+
+class JobProgress(BaseModel):
+    pages_read: int = 0
+    chunks_produced: int = 0
+    chunks_embedded: int = 0
+    rows_written: int = 0
+    chunks_reused: int = 0
+    chunks_deleted: int = 0
+    stages: Dict[str, StageTiming] = {}
+
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str
+    filename: Optional[str] = None
+    collection: Optional[str] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    stalled: bool = False  # running but no progress for INGEST_JOB_STALL_SECONDS
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    progress: Optional[JobProgress] = None
 
 
 class QueryRequest(BaseModel):
     query: str
     collection: str = "default"
-    k: int = 4
+    k: int = Field(default=4, ge=1, le=100)
     session_id: Optional[UUID] = None  # Optional session ID for chat memory
+    # Vector index recall/latency knobs (default: collection setting, then global)
+    ef_search: Optional[int] = Field(default=None, ge=1, le=1000)
+    probes: Optional[int] = Field(default=None, ge=1, le=10000)
+    # "hybrid" fuses full-text and vector rankings (better for part numbers, error codes)
+    search_mode: Literal["vector", "hybrid"] = "vector"
+    # Maximal-marginal-relevance rerank: trade relevance (lambda=1) for diversity (lambda=0)
+    mmr: bool = False
+    mmr_lambda: Optional[float] = Field(default=None, ge=0.0, le=1.0)
 
 
 class QueryResponse(BaseModel):
@@ -24,6 +64,61 @@ class QueryResponse(BaseModel):
     session_id: Optional[UUID] = None  # Return session_id if provided
 
 
+class BatchQueryRequest(BaseModel):
+    queries: List[str] = Field(min_length=1, max_length=1000)
+    collection: str = "default"
+    k: int = Field(default=4, ge=1, le=100)
+    ef_search: Optional[int] = Field(default=None, ge=1, le=1000)
+    probes: Optional[int] = Field(default=None, ge=1, le=10000)
+
+
+class BatchQueryItem(BaseModel):
+    query: str
+    answer: Optional[str] = None
+    sources: List[str] = []
+    error: Optional[str] = None  # Set when this item failed; other items are unaffected
+
+
+class BatchQueryResponse(BaseModel):
+    results: List[BatchQueryItem]
+
+
+class SearchRequest(BaseModel):
+    query: str
+    collection: str = "default"
+    limit: int = Field(default=10, ge=1, le=100)
+    offset: int = Field(default=0, ge=0, le=1000)
+    # Cosine distance cut-off (0 = identical, 2 = opposite); farther hits are dropped
+    max_distance: Optional[float] = Field(default=None, ge=0.0, le=2.0)
+    ef_search: Optional[int] = Field(default=None, ge=1, le=1000)
+    probes: Optional[int] = Field(default=None, ge=1, le=10000)
+
+    @model_validator(mode="after")
+    def check_window(self):
+        # offset + limit + 1 rows are fetched, and HNSW returns at most ef_search (<= 1000)
+        if self.offset + self.limit > 999:
+            raise ValueError("offset + limit must be at most 999")
+        return self
+
+
+class SearchHit(BaseModel):
+    chunk_id: UUID
+    document_id: UUID
+    filename: str
+    chunk_index: int
+    content: str
+    distance: float
+
+
+class SearchResponse(BaseModel):
+    query: str
+    collection: str
+    results: List[SearchHit]
+    limit: int
+    offset: int
+    has_more: bool
+
+
 class DeleteSessionRequest(BaseModel):
     session_id: str
 
@@ -130,4 +225,17 @@ class CollectionsListResponse(BaseModel):
 class DocumentsListResponse(BaseModel):
     collection_name: str
     total_documents: int
-    documents: List[DocumentResponse]
\ No newline at end of file
+    documents: List[DocumentResponse]
+
+
+class CollectionSearchSettings(BaseModel):
+    hnsw_ef_search: Optional[int] = Field(default=None, ge=1, le=1000)
+    ivfflat_probes: Optional[int] = Field(default=None, ge=1, le=10000)
+
+
+class RebuildIndexResponse(BaseModel):
+    index: str
+    rows: int
+    lists: int
+    collection_name: Optional[str] = None
+    message: str
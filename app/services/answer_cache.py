@@ -0,0 +1,175 @@
+# services/answer_cache.py
+import logging
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.core import config
+from app.db.models import Collection
+
+logger = logging.getLogger("app.answer_cache")
+
+
+class _CollectionAnswers:
+    """
+    Cached answers for one collection at one content version.
+    Query vectors live in a preallocated (capacity x dims) float32 matrix,
+    unit-normalized, so a lookup is a single matrix-vector product.
+    Slots are reused round-robin once the collection is full.
+    """
+
+    def __init__(self, version: int, capacity: int, dims: int):
+        self.version = version
+        self.vectors = np.zeros((capacity, dims), dtype=np.float32)
+        self.expires_at = np.zeros(capacity, dtype=np.float64)  # 0 = empty slot
+        self.variants = np.empty(capacity, dtype=object)  # retrieval parameters the answer was built with
+        self.answers: List[Optional[Tuple[str, List[str]]]] = [None] * capacity
+        self.next_slot = 0
+
+    def lookup(self, query: np.ndarray, variant: str, threshold: float, now: float) -> Optional[Tuple[Tuple[str, List[str]], float]]:
+        live = (self.expires_at > now) & (self.variants == variant)
+        if not live.any():
+            return None
+
+        scores = self.vectors @ query
+        scores[~live] = -1.0
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None
+        return self.answers[best], float(scores[best])
+
+    def store(self, query: np.ndarray, variant: str, answer: str, sources: List[str], expires_at: float) -> None:
+        slot = self.next_slot
+        self.vectors[slot] = query
+        self.expires_at[slot] = expires_at
+        self.variants[slot] = variant
+        self.answers[slot] = (answer, list(sources))
+        self.next_slot = (slot + 1) % len(self.answers)
+
+
+class SemanticAnswerCache:
+    """
+    Process-local cache of answers to stateless queries, matched by cosine
+    similarity of the query embedding within a collection. An answer is only
+    reused for the same variant (retrieval parameters such as k and search mode).
+
+    Entries are tagged with the collection's content_version. Ingest and
+    delete bump that version in the database (see bump_collection_version),
+    so entries written before a content change are never served, including
+    by API processes other than the one that made the change.
+    """
+
+    def __init__(self, threshold: float, max_entries: int, ttl_seconds: float):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._collections: Dict[uuid.UUID, _CollectionAnswers] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stored": 0, "invalidated": 0}
+
+    @staticmethod
+    def _normalize(query_embedding) -> Optional[np.ndarray]:
+        vector = np.asarray(query_embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return None
+        return vector / norm
+
+    def get(self, collection_id: uuid.UUID, version: int, query_embedding, variant: str) -> Optional[Tuple[str, List[str]]]:
+        query = self._normalize(query_embedding)
+
+        with self._lock:
+            entries = self._collections.get(collection_id)
+            if entries is not None and entries.version != version:
+                del self._collections[collection_id]
+                self._stats["invalidated"] += 1
+                entries = None
+
+            result = None
+            if entries is not None and query is not None:
+                result = entries.lookup(query, variant, self.threshold, time.monotonic())
+
+            self._stats["hits" if result else "misses"] += 1
+
+        if result is None:
+            return None
+
+        (answer, sources), score = result
+        logger.info(f"Answer cache hit in collection {collection_id} (similarity={score:.4f})")
+        return answer, list(sources)
+
+    def put(self, collection_id: uuid.UUID, version: int, query_embedding, variant: str, answer: str, sources: List[str]) -> None:
+        query = self._normalize(query_embedding)
+        if query is None:
+            return
+
+        with self._lock:
+            entries = self._collections.get(collection_id)
+            if entries is None or entries.version < version:
+                entries = _CollectionAnswers(version, self.max_entries, query.shape[0])
+                self._collections[collection_id] = entries
+            elif entries.version > version:
+                # Content changed while this answer was being generated
+                return
+
+            entries.store(query, variant, answer, sources, time.monotonic() + self.ttl_seconds)
+            self._stats["stored"] += 1
+
+    def invalidate(self, collection_id: uuid.UUID) -> None:
+        with self._lock:
+            if self._collections.pop(collection_id, None) is not None:
+                self._stats["invalidated"] += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["collections"] = len(self._collections)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+_cache: Optional[SemanticAnswerCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    global _cache
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticAnswerCache(
+                    threshold=config.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+                    max_entries=config.ANSWER_CACHE_MAX_ENTRIES,
+                    ttl_seconds=config.ANSWER_CACHE_TTL_SECONDS
+                )
+
+    return _cache
+
+
+def get_collection_version(db: Session, collection: str) -> Optional[Tuple[uuid.UUID, int]]:
+    """(id, content_version) for a collection name, or None if it does not exist"""
+    return db.query(Collection.id, Collection.content_version).filter(Collection.name == collection).first()
+
+
+def bump_collection_version(db: Session, collection_id: uuid.UUID) -> None:
+    """
+    Mark a collection's content as changed. Runs in the caller's transaction,
+    so cached answers stop being served exactly when the change commits.
+    """
+    db.execute(
+        update(Collection)
+        .where(Collection.id == collection_id)
+        .values(content_version=Collection.content_version + 1)
+    )
+    get_answer_cache().invalidate(collection_id)
+
+
+def get_answer_cache_stats() -> Dict[str, float]:
+    return get_answer_cache().stats()
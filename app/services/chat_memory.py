@@ -1,28 +1,68 @@
 # services/chat_memory.py
 import logging
+import threading
 import uuid
-from typing import List, Dict, Optional
+from datetime import timedelta
+from typing import List, Dict, Optional, Set, Tuple
 from uuid import UUID
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func, distinct
+from sqlalchemy import func, distinct, update
+from app.core import config
 from app.db.models import ChatMessage, ChatSession
+from app.services.turn_buffer import get_turn_buffer
 
 logger = logging.getLogger("app.chat_memory")
 
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and a document Q&A assistant.
+Update the summary with the new messages. Keep facts, names, numbers, open questions and what the user is trying to do; drop pleasantries.
+Write plain prose, no preamble."""
+
+_summarizing: Set[UUID] = set()
+_summarizing_lock = threading.Lock()
+
+
+def _newest_first(query):
+    # Both messages of a turn share created_at (one transaction); role breaks
+    # the tie so that, reversed, the user message precedes the assistant's
+    return query.order_by(ChatMessage.created_at.desc(), ChatMessage.role.asc())
+
+
+def _chronological(query):
+    return query.order_by(ChatMessage.created_at.asc(), ChatMessage.role.desc())
+
+
+def _with_unflushed(session_id: UUID, messages: list, limit: Optional[int] = None) -> list:
+    """
+    Chronological stored messages followed by the session's turns still
+    queued in the write-behind buffer, keeping the newest `limit`. Queued
+    messages get created_at from the database when flushed, so they come
+    after everything stored (and after the summary); they are matched by id,
+    so one flushed meanwhile is not repeated.
+    """
+    if not config.CHAT_WRITE_BEHIND_ENABLED:
+        return messages
+
+    stored = {m.id for m in messages}
+    pending = [m for m in get_turn_buffer().pending_for(session_id) if m.id not in stored]
+    if not pending:
+        return messages
+
+    merged = list(messages) + pending
+    return merged[-limit:] if limit is not None else merged
+
 
 def get_chat_history(db: Session, session_id: UUID, limit: int = 10) -> List[Dict[str, str]]:
     """
-    Retrieve chat history for a session.
+    Retrieve the most recent `limit` turns of a session.
     Returns list of messages in chronological order.
     """
     try:
-        messages = (
-            db.query(ChatMessage)
+        messages = _newest_first(
+            db.query(ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.created_at)
             .filter(ChatMessage.session_id == session_id)
-            .order_by(ChatMessage.created_at.asc())
-            .limit(limit * 2)
-            .all()
-        )  # *2 for user+assistant pairs
+        ).limit(limit * 2).all()  # *2 for user+assistant pairs
+        messages = _with_unflushed(session_id, list(reversed(messages)), limit=limit * 2)
 
         return [{"role": msg.role, "content": msg.content} for msg in messages]
     except Exception as e:
@@ -30,6 +70,199 @@ def get_chat_history(db: Session, session_id: UUID, limit: int = 10) -> List[Dic
         return []
 
 
+def _unsummarized_messages(db: Session, session_id: UUID, summary_until, limit: Optional[int] = None) -> list:
+    """Messages (id, role, content, created_at) newer than the summary, newest `limit`, chronological"""
+    query = db.query(ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.created_at).filter(
+        ChatMessage.session_id == session_id
+    )
+    if summary_until is not None:
+        query = query.filter(ChatMessage.created_at > summary_until)
+
+    query = _newest_first(query)
+    if limit is not None:
+        query = query.limit(limit)
+    return _with_unflushed(session_id, list(reversed(query.all())), limit=limit)
+
+
+def _verbatim_start(messages: list, max_turns: int, budget_tokens: int) -> int:
+    """
+    Index of the first message kept verbatim: the newest whole turns (a user
+    message and the replies after it), at most max_turns, within budget_tokens.
+    Everything before it belongs in the summary.
+    """
+    from app.services.context_builder import count_prompt_tokens
+
+    start = turn_end = len(messages)
+    turns = used = 0
+
+    for i in range(len(messages) - 1, -1, -1):
+        if messages[i].role != "user" and i > 0:
+            continue
+        cost = sum(count_prompt_tokens(m.content) for m in messages[i:turn_end])
+        if turns >= max_turns or used + cost > budget_tokens:
+            break
+        used += cost
+        turns += 1
+        start = turn_end = i
+
+    return start
+
+
+def get_chat_memory(db: Session, session_id: UUID) -> Tuple[Optional[str], List[Dict[str, str]]]:
+    """
+    Conversation memory for a prompt: (rolling summary or None, recent
+    messages in chronological order). The recent messages are the last
+    CHAT_HISTORY_MAX_TURNS turns that fit CHAT_HISTORY_TOKEN_BUDGET, so the
+    prompt stays the same size however long the session gets.
+    Older turns not yet in the summary are folded into it in the background.
+    """
+    try:
+        state = db.query(ChatSession.summary, ChatSession.summary_until).filter(
+            ChatSession.session_id == session_id
+        ).first()
+        summary, summary_until = state if state is not None else (None, None)
+
+        # One message past a full window tells whether older turns are waiting
+        messages = _unsummarized_messages(db, session_id, summary_until, limit=config.CHAT_HISTORY_MAX_TURNS * 2 + 1)
+        start = _verbatim_start(messages, config.CHAT_HISTORY_MAX_TURNS, config.CHAT_HISTORY_TOKEN_BUDGET)
+
+        if start > 0 and config.CHAT_SUMMARY_ENABLED:
+            summarize_session_async(session_id)
+
+        return summary, [{"role": m.role, "content": m.content} for m in messages[start:]]
+    except Exception as e:
+        logger.error(f"Failed to get chat memory: {e}")
+        return None, []
+
+
+def _summarize(summary: Optional[str], messages: list) -> str:
+    from app.services.pg_vector_client import get_openai_client
+
+    transcript = "\n".join(
+        f"{'User' if m.role == 'user' else 'Assistant'}: {m.content}" for m in messages
+    )
+    response = get_openai_client().chat.completions.create(
+        model=config.CHAT_SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"}
+        ],
+        temperature=0,
+        max_tokens=config.CHAT_SUMMARY_MAX_TOKENS
+    )
+    return response.choices[0].message.content.strip()
+
+
+def _oldest_unsummarized(db: Session, session_id: UUID, summary_until, before, limit: int) -> list:
+    """
+    Oldest stored messages newer than the summary and older than `before`
+    (None: no upper bound), chronological, at most `limit` and never ending
+    halfway through a turn. Unflushed messages are folded once stored.
+    """
+    query = db.query(ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.created_at).filter(
+        ChatMessage.session_id == session_id
+    )
+    if before is not None:
+        query = query.filter(ChatMessage.created_at < before)
+    if summary_until is not None:
+        query = query.filter(ChatMessage.created_at > summary_until)
+
+    # One past the limit tells whether the last turn is cut off
+    messages = _chronological(query).limit(limit + 1).all()
+    if len(messages) <= limit:
+        return messages
+
+    # Messages of a turn share created_at; stop before the turn the limit splits
+    end = limit
+    while end > 0 and messages[end - 1].created_at == messages[end].created_at:
+        end -= 1
+    return messages[:end or limit]
+
+
+def summarize_session(session_id: UUID) -> bool:
+    """
+    Fold the turns that fell out of the verbatim window into the session's
+    rolling summary, CHAT_SUMMARY_FOLD_TURNS turns per LLM call (previous
+    summary plus only the newly folded messages). summary_until advances after
+    every call, so a long backlog is folded in bounded steps and a failure
+    resumes from the last committed one. Returns True if the summary advanced.
+    """
+    from app.db.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        state = db.query(ChatSession.summary, ChatSession.summary_until).filter(
+            ChatSession.session_id == session_id
+        ).first()
+        if state is None:
+            return False
+        summary, summary_until = state
+
+        # Everything older than the verbatim window is due; only that window is loaded here
+        recent = _unsummarized_messages(db, session_id, summary_until, limit=config.CHAT_HISTORY_MAX_TURNS * 2 + 1)
+        start = _verbatim_start(recent, config.CHAT_HISTORY_MAX_TURNS, config.CHAT_HISTORY_TOKEN_BUDGET)
+        if start == 0:
+            return False
+        # Unflushed messages have no created_at yet and come after every
+        # stored one, so a boundary among them makes every stored message due
+        if start < len(recent):
+            before = recent[start].created_at
+        else:
+            last = recent[-1].created_at
+            before = last + timedelta(microseconds=1) if last is not None else None
+
+        advanced = False
+        while True:
+            folded = _oldest_unsummarized(
+                db, session_id, summary_until, before, limit=config.CHAT_SUMMARY_FOLD_TURNS * 2
+            )
+            if not folded:
+                return advanced
+
+            new_summary = _summarize(summary, folded)
+
+            # Only advance from the state we read; a concurrent summarizer wins otherwise
+            result = db.execute(
+                update(ChatSession)
+                .where(
+                    ChatSession.session_id == session_id,
+                    ChatSession.summary_until.is_not_distinct_from(summary_until)
+                )
+                .values(summary=new_summary, summary_until=folded[-1].created_at, last_activity=ChatSession.last_activity)
+            )
+            db.commit()
+            if not result.rowcount:
+                return advanced
+
+            logger.info(f"Folded {len(folded)} messages into the summary of session {session_id}")
+            summary, summary_until = new_summary, folded[-1].created_at
+            advanced = True
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def summarize_session_async(session_id: UUID) -> None:
+    """Summarize in a background thread; at most one summarizer per session per process"""
+    with _summarizing_lock:
+        if session_id in _summarizing:
+            return
+        _summarizing.add(session_id)
+
+    def _run():
+        try:
+            summarize_session(session_id)
+        except Exception as e:
+            logger.error(f"Failed to summarize session {session_id}: {e}", exc_info=True)
+        finally:
+            with _summarizing_lock:
+                _summarizing.discard(session_id)
+
+    threading.Thread(target=_run, name="chat-summary", daemon=True).start()
+
+
 def save_message(db: Session, session_id: UUID, role: str, content: str) -> bool:
     """
     Save a single message to the chat history.
@@ -49,11 +282,20 @@ def save_message(db: Session, session_id: UUID, role: str, content: str) -> bool
         return False
 
 
-def save_conversation_turn(db: Session, session_id: UUID, user_query: str, assistant_response: str) -> bool:
-    """
-    Save both user query and assistant response as a conversation turn.
-    Also updates the session's last_activity timestamp.
-    """
+def _queue_turn(session_id: UUID, user_query: str, assistant_response: str) -> bool:
+    """Queue a turn for write-behind; False when it has to be saved synchronously"""
+    if not config.CHAT_WRITE_BEHIND_ENABLED:
+        return False
+    try:
+        if get_turn_buffer().add(session_id, user_query, assistant_response):
+            return True
+        logger.warning(f"Chat write-behind buffer full, saving turn of session {session_id} synchronously")
+    except Exception as e:
+        logger.error(f"Failed to queue conversation turn, saving it synchronously: {e}")
+    return False
+
+
+def _insert_conversation_turn(db: Session, session_id: UUID, user_query: str, assistant_response: str) -> bool:
     try:
         user_msg = ChatMessage(session_id=session_id, role="user", content=user_query)
         assistant_msg = ChatMessage(session_id=session_id, role="assistant", content=assistant_response)
@@ -73,6 +315,19 @@ def save_conversation_turn(db: Session, session_id: UUID, user_query: str, assis
         return False
 
 
+def save_conversation_turn(db: Session, session_id: UUID, user_query: str, assistant_response: str) -> bool:
+    """
+    Save both user query and assistant response as a conversation turn.
+    Also updates the session's last_activity timestamp.
+    With CHAT_WRITE_BEHIND_ENABLED the turn is queued in the write-behind
+    buffer (turn_buffer) and inserted in the next batch instead, unless the
+    buffer is full.
+    """
+    if _queue_turn(session_id, user_query, assistant_response):
+        return True
+    return _insert_conversation_turn(db, session_id, user_query, assistant_response)
+
+
 def delete_session_history(db: Session, session_id: UUID) -> int:
     """
     Delete session and ALL related data via CASCADE:
@@ -83,6 +338,9 @@ def delete_session_history(db: Session, session_id: UUID) -> int:
     
     Returns number of deleted messages (for backward compatibility).
     """
+    if config.CHAT_WRITE_BEHIND_ENABLED:
+        get_turn_buffer().discard(session_id)
+
     try:
         # Count messages before deletion (for return value)
         deleted_count = (
@@ -117,37 +375,60 @@ def delete_session_history(db: Session, session_id: UUID) -> int:
         return 0
 
 
-def format_chat_history_for_prompt(chat_history: List[Dict[str, str]]) -> str:
+def format_chat_history_for_prompt(chat_history: List[Dict[str, str]], summary: Optional[str] = None) -> str:
     """
-    Format chat history into a string for inclusion in the prompt.
+    Format chat history (and the rolling summary of earlier turns, if any)
+    into a string for inclusion in the prompt.
     """
-    if not chat_history:
+    if not chat_history and not summary:
         return ""
 
-    formatted = "Previous conversation:\n"
-    for msg in chat_history:
-        role_label = "User" if msg["role"] == "user" else "Assistant"
-        formatted += f"{role_label}: {msg['content']}\n"
+    formatted = ""
+    if summary:
+        formatted += f"Summary of earlier conversation:\n{summary}\n\n"
+
+    if chat_history:
+        formatted += "Previous conversation:\n"
+        for msg in chat_history:
+            role_label = "User" if msg["role"] == "user" else "Assistant"
+            formatted += f"{role_label}: {msg['content']}\n"
 
     return formatted
 
 
 def get_session_messages(db: Session, session_id: UUID) -> List[ChatMessage]:
     """
-    Get all messages for a specific session with full details.
+    Get all messages for a specific session with full details,
+    including turns still queued in the write-behind buffer.
     """
     try:
-        return (
+        return _with_unflushed(session_id, _chronological(
             db.query(ChatMessage)
             .filter(ChatMessage.session_id == session_id)
-            .order_by(ChatMessage.created_at.asc())
-            .all()
-        )
+        ).all())
     except Exception as e:
         logger.error(f"Failed to get session messages: {e}")
         return []
 
 
+def _unflushed_counts(db: Session, session_ids: List[UUID]) -> Dict[UUID, int]:
+    """
+    Buffered messages per session that are not stored yet. Messages of a
+    flush in progress may already be committed, so they are matched by id.
+    """
+    buffer = get_turn_buffer()
+    unflushed = {session_id: buffer.pending_for(session_id) for session_id in session_ids}
+    ids = [m.id for messages in unflushed.values() for m in messages]
+    if not ids:
+        return {}
+
+    stored = {row[0] for row in db.query(ChatMessage.id).filter(ChatMessage.id.in_(ids))}
+    return {
+        session_id: sum(1 for m in messages if m.id not in stored)
+        for session_id, messages in unflushed.items()
+    }
+
+
 def get_all_sessions(db: Session) -> List[Dict]:
     """
     Get all sessions with their message counts and activity info.
@@ -156,12 +437,20 @@ def get_all_sessions(db: Session) -> List[Dict]:
         sessions = db.query(ChatSession).all()
         result = []
 
-        for session in sessions:
-            message_count = (
+        counts = {
+            session.session_id: (
                 db.query(func.count(ChatMessage.id))
                 .filter(ChatMessage.session_id == session.session_id)
                 .scalar()
             )
+            for session in sessions
+        }
+        if config.CHAT_WRITE_BEHIND_ENABLED:
+            for session_id, n in _unflushed_counts(db, list(counts)).items():
+                counts[session_id] += n
+
+        for session in sessions:
+            message_count = counts[session.session_id]
 
             result.append({
                 "session_id": session.session_id,
@@ -258,3 +547,23 @@ def deactivate_session(db: Session, session_id: UUID) -> bool:
         db.rollback()
         return False
         return []
+
+
+# ===== ASYNCIO VARIANTS (async query path) =====
+
+async def aget_chat_memory(db: AsyncSession, session_id: UUID) -> Tuple[Optional[str], List[Dict[str, str]]]:
+    """asyncio get_chat_memory"""
+    return await db.run_sync(get_chat_memory, session_id)
+
+
+async def asave_conversation_turn(db: AsyncSession, session_id: UUID, user_query: str, assistant_response: str) -> bool:
+    """asyncio save_conversation_turn"""
+    # Queueing is in memory only; no database round trip to wait for
+    if _queue_turn(session_id, user_query, assistant_response):
+        return True
+    return await db.run_sync(_insert_conversation_turn, session_id, user_query, assistant_response)
+
+
+async def aget_session_messages(db: AsyncSession, session_id: UUID) -> List[ChatMessage]:
+    """asyncio get_session_messages"""
+    return await db.run_sync(get_session_messages, session_id)
@@ -0,0 +1,170 @@
+# services/chunking.py
+import re
+from collections import deque
+from typing import Deque, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from app.core import config
+from app.services.pg_vector_client import get_tokenizer
+
+# Boundaries tried in order when a piece of text is larger than a chunk:
+# paragraphs, then sentences, then lines; anything still too big is cut by tokens.
+_SPLITTERS = [
+    (re.compile(r"\n\s*\n"), "\n\n"),
+    (re.compile(r"(?<=[.!?])\s+"), " "),
+    (re.compile(r"\n"), "\n"),
+]
+
+
+class TextChunk(NamedTuple):
+    text: str
+    token_count: int
+
+
+class _Unit(NamedTuple):
+    text: str
+    tokens: int
+    sep: str  # joiner placed before this unit when it follows another
+
+
+def _split_units(text: str, max_tokens: int, sep: str, level: int = 0) -> Iterator[_Unit]:
+    """
+    Break text into units of at most max_tokens, splitting on the coarsest
+    boundary that works. Fast path: text that already fits is encoded once
+    and never regex-split.
+    """
+    encoder = get_tokenizer()
+    n_tokens = len(encoder.encode_ordinary(text))
+
+    if n_tokens <= max_tokens:
+        yield _Unit(text, n_tokens, sep)
+        return
+
+    while level < len(_SPLITTERS):
+        pattern, joiner = _SPLITTERS[level]
+        parts = [p.strip() for p in pattern.split(text)]
+        parts = [p for p in parts if p]
+        level += 1
+        if len(parts) > 1:
+            for i, part in enumerate(parts):
+                yield from _split_units(part, max_tokens, sep if i == 0 else joiner, level)
+            return
+
+    # No natural boundary left: cut by tokens
+    ids = encoder.encode_ordinary(text)
+    for i in range(0, len(ids), max_tokens):
+        piece = ids[i:i + max_tokens]
+        yield _Unit(encoder.decode(piece), len(piece), sep if i == 0 else "")
+
+
+def _join(units: List[_Unit]) -> str:
+    return units[0].text + "".join(u.sep + u.text for u in units[1:])
+
+
+def _overlap_tail(units: List[_Unit], overlap_tokens: int) -> List[_Unit]:
+    """Trailing whole units totalling at most overlap_tokens, else the last unit's token tail"""
+    if overlap_tokens <= 0:
+        return []
+
+    # Never carry the whole previous chunk, or the next one would contain it entirely
+    tail: List[_Unit] = []
+    total = 0
+    for unit in reversed(units[1:]):
+        if total + unit.tokens > overlap_tokens:
+            break
+        tail.insert(0, unit)
+        total += unit.tokens
+
+    if tail:
+        return tail
+
+    last = units[-1]
+    if last.tokens <= overlap_tokens:
+        return []
+
+    encoder = get_tokenizer()
+    ids = encoder.encode_ordinary(last.text)[-overlap_tokens:]
+    return [_Unit(encoder.decode(ids), len(ids), "")]
+
+
+def _sep_tokens(sep: str) -> int:
+    return len(get_tokenizer().encode_ordinary(sep)) if sep else 0
+
+
+def _units_tokens(units: List[_Unit]) -> int:
+    return sum(u.tokens for u in units) + sum(_sep_tokens(u.sep) for u in units[1:])
+
+
+def _fit(units: List[_Unit], first_fresh: int, max_tokens: int) -> Tuple[int, int, TextChunk]:
+    """
+    units[start:end] whose joined text (separators included) is at most
+    max_tokens, as (start, end, chunk). Trailing units are dropped first,
+    then leading overlap units; the first fresh unit is always kept.
+    """
+    encoder = get_tokenizer()
+    start, end = 0, len(units)
+    while True:
+        text = _join(units[start:end])
+        count = len(encoder.encode_ordinary(text))
+        if count <= max_tokens or end - start == 1:
+            return start, end, TextChunk(text, count)
+        if end > first_fresh + 1:
+            end -= 1
+        else:
+            start += 1
+
+
+def _iter_units(pages: Iterable[str], max_tokens: int) -> Iterator[_Unit]:
+    for page in pages:
+        page = page.strip()
+        if page:
+            yield from _split_units(page, max_tokens, "\n")
+
+
+def iter_token_chunks(
+    pages: Iterable[str],
+    chunk_tokens: Optional[int] = None,
+    overlap_tokens: Optional[int] = None
+) -> Iterator[TextChunk]:
+    """
+    Chunk a stream of page texts into pieces of at most chunk_tokens tokens,
+    counted on the joined text (separators included).
+    Chunks end on paragraph/sentence/line boundaries where possible, and each
+    chunk starts with up to overlap_tokens of the previous chunk's tail.
+    Only the current chunk is held in memory.
+    """
+    chunk_tokens = chunk_tokens or config.CHUNK_TOKENS
+    overlap_tokens = config.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    overlap_tokens = min(overlap_tokens, chunk_tokens // 2)
+
+    units = _iter_units(pages, chunk_tokens)
+    # Units cut from the end of a chunk that did not fit, processed before new ones
+    carried: Deque[_Unit] = deque()
+
+    current: List[_Unit] = []
+    current_tokens = 0  # estimate: unit tokens plus separator tokens
+    fresh = 0  # units added since the last emitted chunk
+
+    while True:
+        unit = carried.popleft() if carried else next(units, None)
+        if unit is None and not fresh:
+            return
+
+        if unit is not None:
+            cost = unit.tokens + (_sep_tokens(unit.sep) if current else 0)
+            if not fresh or current_tokens + cost <= chunk_tokens:
+                current.append(unit)
+                current_tokens += cost
+                fresh += 1
+                continue
+
+        # Token merges across separators make the estimate inexact, so the
+        # emitted text is measured and trimmed to fit
+        start, end, chunk = _fit(current, len(current) - fresh, chunk_tokens)
+        yield chunk
+
+        carried.extendleft(reversed(current[end:] + ([unit] if unit is not None else [])))
+        current = _overlap_tail(current[start:end], overlap_tokens)
+        current_tokens = _units_tokens(current)
+        fresh = 0
+        if carried and current_tokens + carried[0].tokens + _sep_tokens(carried[0].sep) > chunk_tokens:
+            current, current_tokens = [], 0
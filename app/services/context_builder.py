@@ -0,0 +1,179 @@
+# services/context_builder.py
+import logging
+import re
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import tiktoken
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from app.core import config
+from app.db.models import Chunk
+
+logger = logging.getLogger("app.context_builder")
+
+CHUNK_SEPARATOR = "\n\n"
+
+_WORD_RE = re.compile(r"\w+")
+_SHINGLE_SIZE = 5
+
+_llm_tokenizer = None
+
+
+def _get_llm_tokenizer():
+    """tiktoken encoding of the chat model (prompt budget is in LLM tokens)"""
+    global _llm_tokenizer
+
+    if _llm_tokenizer is None:
+        try:
+            _llm_tokenizer = tiktoken.encoding_for_model(config.LLM_MODEL)
+        except KeyError:
+            _llm_tokenizer = tiktoken.get_encoding("cl100k_base")
+
+    return _llm_tokenizer
+
+
+def count_prompt_tokens(text: str) -> int:
+    return len(_get_llm_tokenizer().encode(text, disallowed_special=()))
+
+
+def _shingles(text: str) -> Set[Tuple[str, ...]]:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= _SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i:i + _SHINGLE_SIZE]) for i in range(len(words) - _SHINGLE_SIZE + 1)}
+
+
+def _is_near_duplicate(shingles: Set[Tuple[str, ...]], kept: List[Set[Tuple[str, ...]]], threshold: float) -> bool:
+    for other in kept:
+        union = len(shingles | other)
+        if union and len(shingles & other) / union >= threshold:
+            return True
+    return False
+
+
+def fetch_neighbors(db: Session, hits: List[Dict], radius: int) -> Dict[Tuple, Dict]:
+    """
+    Chunks within `radius` positions of each hit in the same document, in one
+    query. Returns {(document_id, chunk_index): {"content", "filename", ...}}.
+    """
+    wanted = set()
+    for hit in hits:
+        for offset in range(-radius, radius + 1):
+            if offset and hit["chunk_index"] + offset >= 0:
+                wanted.add((hit["document_id"], hit["chunk_index"] + offset))
+
+    if not wanted:
+        return {}
+
+    filenames = {hit["document_id"]: hit["filename"] for hit in hits}
+    rows = db.query(Chunk.id, Chunk.document_id, Chunk.chunk_index, Chunk.content).filter(
+        tuple_(Chunk.document_id, Chunk.chunk_index).in_(list(wanted))
+    ).all()
+
+    return {
+        (r[1], r[2]): {
+            "chunk_id": r[0],
+            "document_id": r[1],
+            "chunk_index": r[2],
+            "content": r[3],
+            "filename": filenames[r[1]],
+        }
+        for r in rows
+    }
+
+
+def build_context(
+    hits: List[Dict],
+    db: Optional[Session] = None,
+    budget_tokens: Optional[int] = None,
+    neighbor_radius: Optional[int] = None,
+    neighbor_fetcher: Optional[Callable[[List[Dict], int], Dict[Tuple, Dict]]] = None
+) -> Tuple[str, List[str]]:
+    """
+    Assemble the document context for a prompt from ranked hits (dicts with
+    content and filename; document_id/chunk_index enable neighbor expansion).
+
+    1. Near-duplicate hits (word-shingle Jaccard >= CONTEXT_DEDUP_THRESHOLD) are dropped.
+    2. Hits are packed in rank order while they fit in budget_tokens
+       (LLM tokens, counted with tiktoken); a hit that does not fit is
+       skipped in favour of smaller ones further down.
+    3. With budget left, chunks adjacent (by chunk_index) to the strongest
+       hits are added, all fetched in one query (fetch_neighbors on db, or
+       neighbor_fetcher(hits, radius) when given, e.g. to run the query on
+       an AsyncSession while packing runs in a worker thread).
+
+    Selected chunks are grouped per document in reading order.
+    Returns (context, sources).
+    """
+    budget = config.CONTEXT_TOKEN_BUDGET if budget_tokens is None else budget_tokens
+    radius = config.CONTEXT_NEIGHBOR_RADIUS if neighbor_radius is None else neighbor_radius
+    separator_tokens = count_prompt_tokens(CHUNK_SEPARATOR)
+
+    used = 0
+    selected: List[Dict] = []
+    kept_shingles: List[Set[Tuple[str, ...]]] = []
+    duplicates = 0
+
+    def _try_add(chunk: Dict) -> bool:
+        nonlocal used
+        cost = count_prompt_tokens(chunk["content"]) + (separator_tokens if selected else 0)
+        if used + cost > budget:
+            return False
+        selected.append(chunk)
+        used += cost
+        return True
+
+    for rank, hit in enumerate(hits):
+        shingles = _shingles(hit["content"])
+        if _is_near_duplicate(shingles, kept_shingles, config.CONTEXT_DEDUP_THRESHOLD):
+            duplicates += 1
+            continue
+        if _try_add(dict(hit, rank=rank)):
+            kept_shingles.append(shingles)
+
+    strong = [
+        hit for hit in selected[:config.CONTEXT_NEIGHBOR_TOP_HITS]
+        if hit.get("document_id") is not None
+        # Only hits with a vector distance (lexical-only hybrid hits have none) are gated in
+        and hit.get("distance") is not None
+        and hit["distance"] <= config.CONTEXT_NEIGHBOR_MAX_DISTANCE
+    ]
+    neighbors_added = 0
+
+    if neighbor_fetcher is None and db is not None:
+        neighbor_fetcher = lambda strong_hits, r: fetch_neighbors(db, strong_hits, r)
+
+    if neighbor_fetcher is not None and radius > 0 and strong and used < budget:
+        present = {(c.get("document_id"), c.get("chunk_index")) for c in selected}
+        neighbors = neighbor_fetcher(strong, radius)
+
+        # Closest neighbors of the best hits first
+        for distance in range(1, radius + 1):
+            for hit in strong:
+                for index in (hit["chunk_index"] - distance, hit["chunk_index"] + distance):
+                    key = (hit["document_id"], index)
+                    if key in present or key not in neighbors:
+                        continue
+                    if _try_add(dict(neighbors[key], rank=hit["rank"])):
+                        present.add(key)
+                        neighbors_added += 1
+
+    # Group by the best rank in each document, then reading order within it
+    doc_rank: Dict = {}
+    for chunk in selected:
+        doc = chunk.get("document_id") or chunk["filename"]
+        doc_rank[doc] = min(doc_rank.get(doc, chunk["rank"]), chunk["rank"])
+    selected.sort(key=lambda c: (
+        doc_rank[c.get("document_id") or c["filename"]],
+        c.get("chunk_index") if c.get("chunk_index") is not None else c["rank"]
+    ))
+
+    logger.info(
+        f"Context: {len(selected)} chunks ({neighbors_added} neighbors), {used}/{budget} tokens, "
+        f"{duplicates} near-duplicates dropped"
+    )
+
+    context = CHUNK_SEPARATOR.join(c["content"] for c in selected)
+    sources = list(dict.fromkeys(c["filename"] for c in selected))
+    return context, sources
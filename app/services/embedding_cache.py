@@ -0,0 +1,267 @@
+# services/embedding_cache.py
+import hashlib
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core import config
+from app.db.models import EmbeddingCacheEntry
+
+logger = logging.getLogger("app.embedding_cache")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+_lock = threading.Lock()
+_STATS: Dict[str, int] = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+
+# Cache writes (new entries, last_used_at touches, eviction) run on one
+# background thread with its own sessions, off the caller's transaction
+_writer: Optional[ThreadPoolExecutor] = None
+_writer_lock = threading.Lock()
+_last_evict_check = float("-inf")
+
+
+def _record(**deltas: int) -> None:
+    with _lock:
+        for key, value in deltas.items():
+            _STATS[key] += value
+
+
+def get_cache_stats() -> Dict[str, float]:
+    """Process-local hit/miss counters since startup"""
+    with _lock:
+        stats = dict(_STATS)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so cosmetic re-flows of the same text share a cache entry"""
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def cache_key(text: str) -> str:
+    """sha256 over (normalized text, embedding model, dimensions)"""
+    material = f"{config.EMBED_MODEL}\x00{config.EMBED_DIMENSIONS}\x00{normalize_text(text)}"
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def lookup_many(db: Session, keys: List[str]) -> Dict[str, list]:
+    """
+    Resolve many cache keys in a single read-only query.
+    Hits not used for EMBED_CACHE_TOUCH_INTERVAL_SECONDS have their
+    last_used_at bumped in the background, so eviction stays LRU-ish without
+    a write per hit.
+    """
+    if not keys:
+        return {}
+
+    unique_keys = list(set(keys))
+    rows = db.execute(
+        select(EmbeddingCacheEntry.content_hash, EmbeddingCacheEntry.embedding, EmbeddingCacheEntry.last_used_at)
+        .where(EmbeddingCacheEntry.content_hash.in_(unique_keys))
+    ).all()
+
+    found = {row[0]: row[1] for row in rows}
+
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=config.EMBED_CACHE_TOUCH_INTERVAL_SECONDS)
+    stale = [row[0] for row in rows if row[2] is None or row[2] < cutoff]
+    if stale:
+        _submit_write(touch_many, stale)
+
+    return found
+
+
+def touch_many(db: Session, keys: List[str]) -> None:
+    db.execute(
+        update(EmbeddingCacheEntry)
+        .where(EmbeddingCacheEntry.content_hash.in_(keys))
+        .values(last_used_at=func.now())
+    )
+
+
+def store_many(db: Session, entries: Dict[str, list]) -> int:
+    """Insert new cache entries, ignoring keys that another writer stored first"""
+    if not entries:
+        return 0
+
+    stmt = insert(EmbeddingCacheEntry).values([
+        {
+            "content_hash": key,
+            "embedding_model": config.EMBED_MODEL,
+            "dimensions": config.EMBED_DIMENSIONS,
+            "embedding": vector,
+        }
+        for key, vector in entries.items()
+    ]).on_conflict_do_nothing(index_elements=["content_hash"])
+
+    db.execute(stmt)
+    _record(stored=len(entries))
+    return len(entries)
+
+
+def estimated_rows(db: Session) -> int:
+    """Planner estimate of the cache size (pg_class.reltuples), kept current by autovacuum"""
+    estimate = db.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+        {"table": EmbeddingCacheEntry.__tablename__}
+    ).scalar()
+    if estimate is None or estimate < 0:
+        # Never analyzed yet: the table is young, so an exact count is cheap
+        return db.execute(select(func.count()).select_from(EmbeddingCacheEntry)).scalar() or 0
+    return int(estimate)
+
+
+def evict(db: Session, max_rows: Optional[int] = None) -> int:
+    """Trim the cache to about max_rows by deleting the least recently used entries"""
+    max_rows = config.EMBED_CACHE_MAX_ROWS if max_rows is None else max_rows
+
+    excess = estimated_rows(db) - max_rows
+    if excess <= 0:
+        return 0
+
+    oldest = (
+        select(EmbeddingCacheEntry.content_hash)
+        .order_by(EmbeddingCacheEntry.last_used_at.asc())
+        .limit(excess)
+        .scalar_subquery()
+    )
+    db.execute(delete(EmbeddingCacheEntry).where(EmbeddingCacheEntry.content_hash.in_(oldest)))
+
+    _record(evicted=excess)
+    logger.info("Evicted %d embedding cache entries (max_rows=%d)", excess, max_rows)
+    return excess
+
+
+def _get_writer() -> ThreadPoolExecutor:
+    global _writer
+
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed-cache-writer")
+
+    return _writer
+
+
+def _run_write(write, *args) -> None:
+    global _last_evict_check
+    from app.db.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        write(db, *args)
+        db.commit()
+
+        # Only the writer thread touches this, so no lock is needed
+        now = time.monotonic()
+        if now - _last_evict_check >= config.EMBED_CACHE_EVICT_INTERVAL_SECONDS:
+            _last_evict_check = now
+            evict(db)
+            db.commit()
+    except Exception as e:
+        logger.warning(f"Embedding cache write failed: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def _submit_write(write, *args) -> None:
+    _get_writer().submit(_run_write, write, *args)
+
+
+def store_many_async(entries: Dict[str, list]) -> None:
+    """Store new entries in the background; the caller does not wait for the insert"""
+    if entries:
+        _submit_write(store_many, entries)
+
+
+def flush_writes() -> None:
+    """Wait for queued cache writes (shutdown, benchmarks)"""
+    global _writer
+
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.shutdown(wait=True)
+
+
+def _collect_misses(keys: List[str], texts: List[str], found: Dict[str, list]) -> Dict[str, str]:
+    """Texts to embed (key -> text, each unique miss once); records the hit/miss counts"""
+    missing: Dict[str, str] = {}
+    for key, text in zip(keys, texts):
+        if key not in found and key not in missing:
+            missing[key] = text
+
+    hits = sum(1 for k in keys if k in found)
+    _record(hits=hits, misses=len(keys) - hits)
+    return missing
+
+
+def _merge_embedded(keys: List[str], found: Dict[str, list], missing: Dict[str, str], new_vectors: List[list]) -> List[list]:
+    """Queue the new vectors for storage and return every embedding in key order"""
+    computed = dict(zip(missing.keys(), new_vectors))
+    found.update(computed)
+    store_many_async(computed)
+
+    hits = sum(1 for k in keys if k not in missing)
+    logger.info("Embedding cache: %d/%d hits, %d embedded", hits, len(keys), len(missing))
+    return [found[k] for k in keys]
+
+
+def get_embeddings_cached(db: Session, texts: List[str]) -> List[list]:
+    """
+    Return embeddings for texts, resolving as many as possible from the cache
+    in one query and embedding only the misses (each unique miss once).
+    The lookup runs in a savepoint of db and nothing is committed on it;
+    new entries are stored in the background (store_many_async).
+    Cache failures fall back to embedding everything.
+    """
+    from app.services.pg_vector_client import get_embeddings_batch
+
+    if not config.EMBED_CACHE_ENABLED or not texts:
+        return get_embeddings_batch(texts)
+
+    keys = [cache_key(t) for t in texts]
+
+    try:
+        with db.begin_nested():
+            found = lookup_many(db, keys)
+    except Exception as e:
+        logger.warning(f"Embedding cache lookup failed, embedding without cache: {e}")
+        return get_embeddings_batch(texts)
+
+    missing = _collect_misses(keys, texts, found)
+    new_vectors = get_embeddings_batch(list(missing.values())) if missing else []
+    return _merge_embedded(keys, found, missing, new_vectors)
+
+
+async def aget_embeddings_cached(db: AsyncSession, texts: List[str]) -> List[list]:
+    """asyncio get_embeddings_cached; misses are embedded with the async OpenAI client"""
+    from app.services.pg_vector_client import aget_embeddings_batch
+
+    if not config.EMBED_CACHE_ENABLED or not texts:
+        return await aget_embeddings_batch(texts)
+
+    keys = [cache_key(t) for t in texts]
+
+    try:
+        async with db.begin_nested():
+            found = await db.run_sync(lookup_many, keys)
+    except Exception as e:
+        logger.warning(f"Embedding cache lookup failed, embedding without cache: {e}")
+        return await aget_embeddings_batch(texts)
+
+    missing = _collect_misses(keys, texts, found)
+    new_vectors = await aget_embeddings_batch(list(missing.values())) if missing else []
+    return _merge_embedded(keys, found, missing, new_vectors)
@@ -0,0 +1,361 @@
+# services/embedding_executor.py
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Iterable, Iterator, List, Optional, Tuple
+
+import openai
+from tenacity import AsyncRetrying, Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+from app.core import config
+from app.services.pg_vector_client import get_async_openai_client, get_openai_client, iter_embedding_batches
+
+logger = logging.getLogger("app.embedding_executor")
+
+# Fraction of the remaining rate-limit budget below which we stop ramping up
+_LOW_REMAINING_RATIO = 0.1
+# The limit is halved at most once per window: a burst of 429s from requests
+# that were already in flight is one congestion signal, not N
+_DECREASE_COOLDOWN_SECONDS = 2.0
+
+_executor = None
+_query_executor = None
+_executor_lock = threading.Lock()
+
+
+def _parse_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Parse OpenAI rate-limit durations into seconds.
+    Handles plain seconds ("2", "0.5") and Go-style durations ("1s", "6m0s", "20ms").
+    """
+    if not value:
+        return None
+
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    total = 0.0
+    number = ""
+    i = 0
+    while i < len(value):
+        ch = value[i]
+        if ch.isdigit() or ch == ".":
+            number += ch
+            i += 1
+            continue
+        if value.startswith("ms", i):
+            unit, i = 0.001, i + 2
+        elif ch == "s":
+            unit, i = 1.0, i + 1
+        elif ch == "m":
+            unit, i = 60.0, i + 1
+        elif ch == "h":
+            unit, i = 3600.0, i + 1
+        else:
+            return None
+        if not number:
+            return None
+        total += float(number) * unit
+        number = ""
+
+    return total if not number else None
+
+
+def _retry_after_seconds(headers) -> Optional[float]:
+    """Extract the server-requested delay from Retry-After / rate-limit reset headers"""
+    if headers is None:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+
+    retry_after = _parse_duration(headers.get("retry-after"))
+    if retry_after is not None:
+        return retry_after
+
+    resets = [
+        _parse_duration(headers.get("x-ratelimit-reset-requests")),
+        _parse_duration(headers.get("x-ratelimit-reset-tokens")),
+    ]
+    resets = [r for r in resets if r is not None]
+    return max(resets) if resets else None
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code == 429 or exc.status_code >= 500
+    return False
+
+
+class _RateLimitAwareWait:
+    """tenacity wait strategy: honor server-provided delays, else jittered exponential backoff"""
+
+    def __init__(self, max_wait: float = 60.0):
+        self._fallback = wait_random_exponential(multiplier=0.5, max=max_wait)
+        self._max_wait = max_wait
+
+    def __call__(self, retry_state) -> float:
+        exc = retry_state.outcome.exception() if retry_state.outcome else None
+        response = getattr(exc, "response", None)
+        delay = _retry_after_seconds(getattr(response, "headers", None))
+
+        if delay is not None:
+            # Small jitter so parallel workers don't retry in lockstep
+            return min(delay + random.uniform(0, 0.25), self._max_wait)
+
+        return self._fallback(retry_state)
+
+
+class EmbeddingExecutor:
+    """
+    Runs embedding batches on a thread pool, keeping up to `concurrency`
+    requests in flight. 429/5xx responses are retried with backoff that
+    honors Retry-After, and the in-flight limit adapts to the rate-limit
+    headers: halved on 429 or low remaining budget (at most once per
+    cooldown window), +1 only when the headers report remaining capacity.
+
+    The asyncio methods (aembed, aembed_batch) share the same in-flight limit
+    and retry policy, so requests from the event loop and from the pool are
+    throttled together.
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None, max_retries: Optional[int] = None):
+        self.max_concurrency = max(1, max_concurrency or config.EMBED_MAX_CONCURRENCY)
+        self.max_retries = max(1, max_retries or config.EMBED_MAX_RETRIES)
+        self._limit = self.max_concurrency
+        self._last_decrease = float("-inf")
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        # (loop, future) of coroutines waiting for a slot; woken like _cond.notify_all
+        self._async_waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix="embed"
+        )
+
+    @property
+    def concurrency(self) -> int:
+        with self._cond:
+            return self._limit
+
+    def _acquire(self) -> None:
+        with self._cond:
+            while self._in_flight >= self._limit:
+                self._cond.wait()
+            self._in_flight += 1
+
+    async def _acquire_async(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self._in_flight < self._limit:
+                    self._in_flight += 1
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+
+    def _notify_all(self) -> None:
+        """Wake threads and coroutines waiting for a slot; call with _cond held"""
+        self._cond.notify_all()
+        waiters, self._async_waiters = self._async_waiters, deque()
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+    def _release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._notify_all()
+
+    def _set_limit(self, limit: int, reason: str) -> None:
+        with self._cond:
+            limit = max(1, min(self.max_concurrency, limit))
+            if limit != self._limit:
+                logger.info("Embedding concurrency %d -> %d (%s)", self._limit, limit, reason)
+                self._limit = limit
+                self._notify_all()
+
+    def _decrease(self, reason: str) -> None:
+        with self._cond:
+            now = time.monotonic()
+            if now - self._last_decrease < _DECREASE_COOLDOWN_SECONDS:
+                return
+            self._last_decrease = now
+            self._set_limit(self._limit // 2, reason)
+
+    def _increase(self, reason: str) -> None:
+        with self._cond:
+            if time.monotonic() - self._last_decrease < _DECREASE_COOLDOWN_SECONDS:
+                return
+            if self._limit < self.max_concurrency:
+                self._set_limit(self._limit + 1, reason)
+
+    def _adjust_from_headers(self, headers) -> None:
+        """Additive increase while the rate-limit budget is healthy, halve when it runs low"""
+        ratios = []
+        for kind in ("requests", "tokens"):
+            try:
+                limit = float(headers.get(f"x-ratelimit-limit-{kind}"))
+                remaining = float(headers.get(f"x-ratelimit-remaining-{kind}"))
+            except (TypeError, ValueError):
+                continue
+            if limit > 0:
+                ratios.append(remaining / limit)
+
+        # No rate-limit headers: no evidence either way, keep the limit
+        if not ratios:
+            return
+        if min(ratios) < _LOW_REMAINING_RATIO:
+            self._decrease("rate-limit budget low")
+        else:
+            self._increase("rate-limit budget healthy")
+
+    def _request(self, texts: List[str]) -> List[list]:
+        client = get_openai_client().with_options(max_retries=0)
+
+        self._acquire()
+        try:
+            raw = client.embeddings.with_raw_response.create(
+                model=config.EMBED_MODEL,
+                input=texts
+            )
+        except openai.APIStatusError as e:
+            if e.status_code == 429:
+                self._decrease("429 from embeddings API")
+            raise
+        finally:
+            self._release()
+
+        self._adjust_from_headers(raw.headers)
+        response = raw.parse()
+        return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+    async def _arequest(self, texts: List[str]) -> List[list]:
+        client = get_async_openai_client().with_options(max_retries=0)
+
+        await self._acquire_async()
+        try:
+            raw = await client.embeddings.with_raw_response.create(
+                model=config.EMBED_MODEL,
+                input=texts
+            )
+        except openai.APIStatusError as e:
+            if e.status_code == 429:
+                self._decrease("429 from embeddings API")
+            raise
+        finally:
+            self._release()
+
+        self._adjust_from_headers(raw.headers)
+        response = raw.parse()
+        return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+    def _retry_options(self, texts: List[str]) -> dict:
+        return dict(
+            retry=retry_if_exception(_is_retryable),
+            wait=_RateLimitAwareWait(),
+            stop=stop_after_attempt(self.max_retries),
+            before_sleep=lambda rs: logger.warning(
+                "Embedding batch of %d failed (attempt %d): %s",
+                len(texts), rs.attempt_number, rs.outcome.exception()
+            ),
+            reraise=True,
+        )
+
+    def _embed_with_retry(self, texts: List[str]) -> List[list]:
+        return Retrying(**self._retry_options(texts))(self._request, texts)
+
+    async def aembed_batch(self, texts: List[str]) -> List[list]:
+        """Embed one pre-sized batch from the event loop, with the shared limit and retries"""
+        return await AsyncRetrying(**self._retry_options(texts))(self._arequest, texts)
+
+    def map(self, batches: Iterable[List[str]]) -> Iterator[List[list]]:
+        """
+        Embed batches concurrently, yielding results in input order.
+        At most 2 * max_concurrency batches are queued at once, so callers can
+        feed a lazy iterator without materializing it.
+        """
+        window = 2 * self.max_concurrency
+        pending = deque()
+
+        for batch in batches:
+            pending.append(self._pool.submit(self._embed_with_retry, batch))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+    def embed(self, texts: List[str]) -> List[list]:
+        """Embed texts using token-aware batches, preserving order"""
+        start = time.perf_counter()
+        embeddings: List[list] = []
+        n_batches = 0
+
+        for result in self.map(iter_embedding_batches(texts)):
+            embeddings.extend(result)
+            n_batches += 1
+
+        logger.info(
+            "Embedded %d texts in %d batches in %.2fs (concurrency=%d)",
+            len(texts), n_batches, time.perf_counter() - start, self.concurrency
+        )
+        return embeddings
+
+    async def aembed(self, texts: List[str]) -> List[list]:
+        """
+        asyncio embed: batches are requested concurrently on the event loop,
+        at most `concurrency` at a time across the whole process.
+        """
+        batches = await asyncio.gather(*(self.aembed_batch(batch) for batch in iter_embedding_batches(texts)))
+        return [embedding for batch in batches for embedding in batch]
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
+
+
+def _wake(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def get_embedding_executor() -> EmbeddingExecutor:
+    """Process-wide executor so concurrency adapts across concurrent ingests"""
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = EmbeddingExecutor()
+
+    return _executor
+
+
+def get_query_embedding_executor() -> EmbeddingExecutor:
+    """
+    Process-wide executor for the async query path, allowing up to
+    OPENAI_MAX_CONNECTIONS requests in flight. Kept apart from the ingest
+    executor so query embeddings do not queue for EMBED_MAX_CONCURRENCY slots
+    behind ingest batches.
+    """
+    global _query_executor
+
+    if _query_executor is None:
+        with _executor_lock:
+            if _query_executor is None:
+                _query_executor = EmbeddingExecutor(max_concurrency=config.OPENAI_MAX_CONNECTIONS)
+
+    return _query_executor
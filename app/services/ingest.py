@@ -1,58 +1,250 @@
 # services/ingest.py
 import os
+import hashlib
 import logging
 import uuid
-from typing import List, Optional
-from pypdf import PdfReader
+from collections import defaultdict, deque
+from typing import Dict, Iterable, Iterator, List, Optional, TypeVar
+from sqlalchemy import func, select, update
 from sqlalchemy.orm import Session
+from app.core import config
 from app.services import status as job_status
-from app.services.pg_vector_client import get_embedding, store_embeddings_batch
-from app.db.models import Document, Collection
+from app.services import answer_cache
+from app.services import mmap_index
+from app.services import vector_index
+from app.services.pdf_extract import iter_pdf_pages
+from app.services.chunking import TextChunk, iter_token_chunks
+from app.services.pg_vector_client import store_embeddings_batch
+from app.services.embedding_cache import get_embeddings_cached
+from app.db.models import Document, Collection, Chunk
 from app.db.database import SessionLocal
 
 logger = logging.getLogger("app.ingest")
 
+T = TypeVar("T")
+
+
+def _iter_pdf_pages(file_path: str) -> Iterator[str]:
+    """Yield the extracted text of each page, one page at a time"""
+    return iter_pdf_pages(file_path)
+
 
 def _read_pdf_text(file_path: str) -> str:
-    reader = PdfReader(file_path)
-    return "\n".join([p.extract_text() or "" for p in reader.pages])
+    return "\n".join(_iter_pdf_pages(file_path))
+
+
+def _iter_chunks(pages: Iterable[str]) -> Iterator[TextChunk]:
+    """Token-sized chunks with real overlap, streamed from page texts"""
+    return iter_token_chunks(pages)
+
+
+def _iter_windows(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Group a stream into lists of at most size items"""
+    window: List[T] = []
+    for item in items:
+        window.append(item)
+        if len(window) >= size:
+            yield window
+            window = []
+    if window:
+        yield window
+
 
+def compute_file_hash(file_path: str) -> str:
+    """sha256 of a file's bytes, read in 1 MiB blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_new_document(
+    db: Session,
+    cache_db: Session,
+    document: Document,
+    file_path: str,
+    progress: job_status.JobProgress
+) -> int:
+    """Stream pages -> chunks -> embeddings -> rows for a brand new document"""
+    # Pages are read lazily and at most INGEST_WINDOW_CHUNKS chunks (with their
+    # vectors) are held at once, so memory stays flat regardless of PDF size.
+    pages = progress.timed_iter(_iter_pdf_pages(file_path), "read", "pages_read")
+    chunks = progress.timed_iter(_iter_chunks(pages), "chunk", "chunks_produced")
+    stored_count = 0
+
+    for window in _iter_windows(chunks, config.INGEST_WINDOW_CHUNKS):
+        texts = [c.text for c in window]
+
+        with progress.stage("embed"):
+            embeddings = get_embeddings_cached(cache_db, texts)
+        progress.incr("chunks_embedded", len(window))
+
+        with progress.stage("store"):
+            written = store_embeddings_batch(
+                db=db,
+                chunks=texts,
+                embeddings=embeddings,
+                document_id=str(document.id),
+                start_index=stored_count,
+                commit=False,
+                token_counts=[c.token_count for c in window],
+                collection_id=document.collection_id
+            )
+        stored_count += written
+        progress.incr("rows_written", written)
 
-def _chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 100) -> List[str]:
-    chunks = []
-    start = 0
+    return stored_count
 
-    while start < len(text):
-        end = start + chunk_size
-        chunks.append(text[start:end].strip())
-        start = max(end - chunk_overlap, end)
 
-    return [c for c in chunks if c]
+def _content_digest(text: str) -> str:
+    """md5 of chunk text, matching Postgres md5(content) on a UTF-8 database"""
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def _update_changed_document(
+    db: Session,
+    cache_db: Session,
+    document: Document,
+    file_path: str,
+    progress: job_status.JobProgress
+) -> int:
+    """
+    Re-ingest a changed version of an existing document in place.
+    Chunks whose text is unchanged are kept (re-indexed if they moved),
+    chunks no longer present are deleted, and only new chunks are embedded.
+
+    Only (id, index, md5) of the stored chunks is loaded; the new version is
+    streamed and diffed INGEST_WINDOW_CHUNKS chunks at a time, so memory
+    stays flat as in _write_new_document.
+    """
+    existing: Dict[str, deque] = defaultdict(deque)
+    for chunk_id, digest, chunk_index in (
+        db.query(Chunk.id, func.md5(Chunk.content), Chunk.chunk_index)
+        .filter(Chunk.document_id == document.id)
+        .order_by(Chunk.chunk_index.asc())
+    ):
+        existing[digest].append((chunk_id, chunk_index))
+
+    pages = progress.timed_iter(_iter_pdf_pages(file_path), "read", "pages_read")
+    chunks = progress.timed_iter(_iter_chunks(pages), "chunk", "chunks_produced")
+
+    stored_count = 0
+    reused = 0
+    moved_count = 0
+    added_count = 0
+    idx = 0
+    for window in _iter_windows(chunks, config.INGEST_WINDOW_CHUNKS):
+        moved: List[Dict] = []
+        added: List[tuple] = []
+        for chunk in window:
+            entries = existing.get(_content_digest(chunk.text))
+            if entries:
+                chunk_id, old_index = entries.popleft()
+                if old_index != idx:
+                    moved.append({"id": chunk_id, "chunk_index": idx})
+            else:
+                added.append((idx, chunk))
+            idx += 1
+
+        reused += len(window) - len(added)
+        moved_count += len(moved)
+        added_count += len(added)
+
+        if moved:
+            with progress.stage("store"):
+                db.execute(update(Chunk), moved)
+
+        if not added:
+            continue
+
+        texts = [chunk.text for _, chunk in added]
+        with progress.stage("embed"):
+            embeddings = get_embeddings_cached(cache_db, texts)
+        progress.incr("chunks_embedded", len(added))
+
+        with progress.stage("store"):
+            written = store_embeddings_batch(
+                db=db,
+                chunks=texts,
+                embeddings=embeddings,
+                document_id=str(document.id),
+                chunk_indexes=[i for i, _ in added],
+                commit=False,
+                token_counts=[chunk.token_count for _, chunk in added],
+                collection_id=document.collection_id
+            )
+        stored_count += written
+        progress.incr("rows_written", written)
+
+    removed_ids = [chunk_id for entries in existing.values() for chunk_id, _ in entries]
+    if removed_ids:
+        with progress.stage("store"):
+            # Embeddings go with their chunks via ON DELETE CASCADE
+            db.query(Chunk).filter(Chunk.id.in_(removed_ids)).delete(synchronize_session=False)
+
+    progress.incr("chunks_deleted", len(removed_ids))
+    progress.incr("chunks_reused", reused)
+
+    logger.info(
+        f"Incremental re-ingest of {document.filename}: {added_count} new, "
+        f"{len(removed_ids)} removed, {moved_count} re-indexed chunks"
+    )
+    return stored_count
+
+
+def lock_content_hash(db: Session, collection_id: uuid.UUID, content_hash: str) -> None:
+    """
+    Serialize ingests of the same file content into one collection.
+
+    Takes a transaction-scoped advisory lock, so a concurrent upload of an
+    identical file waits until this transaction commits (and then finds the
+    document via find_duplicate_document) instead of inserting a second copy.
+    """
+    digest = hashlib.sha256(f"{collection_id}:{content_hash}".encode("utf-8")).digest()
+    key = int.from_bytes(digest[:8], "big", signed=True)
+    db.execute(select(func.pg_advisory_xact_lock(key)))
+
+
+def find_duplicate_document(db: Session, collection_id: uuid.UUID, content_hash: str) -> Optional[Document]:
+    """Return a document in the collection with identical file content, if any"""
+    return (
+        db.query(Document)
+        .filter(Document.collection_id == collection_id, Document.content_hash == content_hash)
+        .first()
+    )
 
 
 def ingest_pdf_file(
     file_path: str,
     collection_name: str = "default",
-    job_id: Optional[str] = None
+    job_id: Optional[str] = None,
+    filename: Optional[str] = None,
+    content_hash: Optional[str] = None
 ):
     """
     Ingest PDF file into pgvector database.
     Documents are shared across all sessions - no session_id required.
+    filename defaults to the basename of file_path.
+
+    An identical file already in the collection (same content_hash) is
+    skipped. A changed file with the same filename as an existing document
+    updates that document incrementally instead of creating a duplicate.
     """
     db = SessionLocal()
+    # Cache lookups commit on their own session so the document stays one transaction
+    cache_db = SessionLocal()
+    progress = job_status.JobProgress(job_id)
     
     try:
         if job_id:
             job_status.set_status(job_id, "running")
 
-        logger.info("--- STEP 1: Reading PDF ---")
-        text = _read_pdf_text(file_path)
-        chunks = _chunk_text(text)
-
-        filename = os.path.basename(file_path)
+        filename = filename or os.path.basename(file_path)
+        content_hash = content_hash or compute_file_hash(file_path)
 
         # ===== PGVECTOR INGESTION =====
-        logger.info("--- STEP 2: Getting or creating Collection ---")
+        logger.info("--- STEP 1: Getting or creating Collection ---")
         
         # Get or create collection
         collection = db.query(Collection).filter(Collection.name == collection_name).first()
@@ -66,37 +258,64 @@ def ingest_pdf_file(
             db.commit()
             db.refresh(collection)
             logger.info(f"Created new collection: {collection_name}")
+            vector_index.ensure_collection_index_async(collection.id)
         else:
             logger.info(f"Using existing collection: {collection_name}")
-        
-        logger.info("--- STEP 3: Creating Document record ---")
-        document = Document(
-            id=uuid.uuid4(),
-            collection_id=collection.id,
-            filename=filename,
-            document_type="pdf",
-            title=filename
-        )
-        db.add(document)
-        db.commit()
-        db.refresh(document)
-        
-        logger.info(f"Created document with ID: {document.id} in collection '{collection_name}'")
-        
-        logger.info("--- STEP 4: Computing embeddings and storing in pgvector ---")
-        embeddings = [get_embedding(chunk) for chunk in chunks]
-        
-        stored_count = store_embeddings_batch(
-            db=db,
-            chunks=chunks,
-            embeddings=embeddings,
-            document_id=str(document.id)
+
+        # Held until the document is committed (or the transaction rolls back)
+        lock_content_hash(db, collection.id, content_hash)
+        duplicate = find_duplicate_document(db, collection.id, content_hash)
+        if duplicate:
+            logger.info(f"Skipping {filename}: identical to document {duplicate.id} in '{collection_name}'")
+            progress.maybe_save(force=True)
+            if job_id:
+                job_status.set_status(job_id, "completed")
+            return
+
+        document = (
+            db.query(Document)
+            .filter(Document.collection_id == collection.id, Document.filename == filename)
+            .order_by(Document.created_at.desc())
+            .first()
         )
+
+        if document:
+            logger.info("--- STEP 2: Updating changed Document %s ---", document.id)
+            # Lock the row so concurrent re-uploads of the same file serialize
+            db.query(Document).filter(Document.id == document.id).with_for_update().one()
+            stored_count = _update_changed_document(db, cache_db, document, file_path, progress)
+            document.content_hash = content_hash
+        else:
+            logger.info("--- STEP 2: Creating Document record ---")
+            document = Document(
+                id=uuid.uuid4(),
+                collection_id=collection.id,
+                filename=filename,
+                document_type="pdf",
+                title=filename,
+                content_hash=content_hash
+            )
+            db.add(document)
+            # Flushed only: the document and its chunks are committed together below
+            db.flush()
+
+            logger.info(f"Created document with ID: {document.id} in collection '{collection_name}'")
+
+            logger.info("--- STEP 3: Streaming pages -> chunks -> embeddings -> pgvector ---")
+            stored_count = _write_new_document(db, cache_db, document, file_path, progress)
+
+        with progress.stage("store"):
+            answer_cache.bump_collection_version(db, collection.id)
+            db.commit()
+
+        mmap_index.sync_collection_async(collection.id)
         
         logger.info(f"Stored {stored_count} embeddings in pgvector")
+        logger.info("Ingest stage timings for %s: %s", filename, progress.to_dict()["stages"])
         # ===== END PGVECTOR =====
 
-        logger.info("--- STEP 5: Finalizing ---")
+        logger.info("--- STEP 4: Finalizing ---")
+        progress.maybe_save(force=True)
         if job_id:
             job_status.set_status(job_id, "completed")
 
@@ -106,9 +325,11 @@ def ingest_pdf_file(
         logger.error("!!! INGEST CRASHED: %s", str(e), exc_info=True)
 
         if job_id:
-            job_status.set_status(job_id, "failed")
+            progress.maybe_save(force=True)
+            job_status.set_status(job_id, "failed", error=str(e))
 
     finally:
         db.close()
+        cache_db.close()
         if os.path.exists(file_path):
             os.remove(file_path)
@@ -0,0 +1,106 @@
+# services/job_queue.py
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core import config
+from app.db.models import IngestJob
+
+logger = logging.getLogger("app.job_queue")
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def enqueue_ingest_job(
+    db: Session,
+    file_path: str,
+    filename: str,
+    collection_name: str,
+    content_hash: Optional[str] = None
+) -> IngestJob:
+    """Record a queued ingest job; the upload must already be on shared storage"""
+    job = IngestJob(
+        id=uuid.uuid4(),
+        collection_name=collection_name,
+        filename=filename,
+        file_path=file_path,
+        content_hash=content_hash,
+        status="queued",
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    logger.info(f"Queued ingest job {job.id} for {filename} in collection '{collection_name}'")
+    return job
+
+
+def claim_next_job(db: Session, worker_id: str) -> Optional[IngestJob]:
+    """
+    Atomically claim the oldest queued job.
+    SKIP LOCKED lets any number of workers poll the table without blocking
+    on, or double-claiming, a job another worker is taking.
+    """
+    job = (
+        db.query(IngestJob)
+        .filter(IngestJob.status == "queued")
+        .order_by(IngestJob.created_at.asc())
+        .with_for_update(skip_locked=True)
+        .limit(1)
+        .first()
+    )
+
+    if job is None:
+        db.rollback()
+        return None
+
+    job.status = "running"
+    job.worker_id = worker_id
+    job.attempts = (job.attempts or 0) + 1
+    job.started_at = func.now()
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def requeue_stale_jobs(db: Session, stale_seconds: Optional[int] = None) -> int:
+    """
+    Return jobs stuck in 'running' (e.g. their worker was killed) to the queue,
+    or fail them once they have used up INGEST_JOB_MAX_ATTEMPTS.
+    """
+    stale_seconds = stale_seconds or config.INGEST_JOB_STALE_SECONDS
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=stale_seconds)
+
+    stale = (
+        db.query(IngestJob)
+        .filter(IngestJob.status == "running", IngestJob.updated_at < cutoff)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+    for job in stale:
+        if job.attempts >= config.INGEST_JOB_MAX_ATTEMPTS:
+            job.status = "failed"
+            job.error = "Worker stopped responding; max attempts reached"
+            job.finished_at = func.now()
+        else:
+            job.status = "queued"
+            job.worker_id = None
+
+    db.commit()
+
+    if stale:
+        logger.warning(f"Recovered {len(stale)} stale ingest jobs")
+    return len(stale)
+
+
+def get_job(db: Session, job_id: uuid.UUID) -> Optional[IngestJob]:
+    return db.query(IngestJob).filter(IngestJob.id == job_id).first()
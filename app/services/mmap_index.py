@@ -0,0 +1,313 @@
+# services/mmap_index.py
+"""
+In-process brute-force ANN backend for small and medium collections.
+
+Each collection's embeddings are kept as unit-normalized vectors in a
+memory-mapped .npy file under ANN_MMAP_DIR/<collection_id>/, next to the
+matching chunk ids and a meta.json naming the files and the collection
+content_version they were built from. Every uvicorn worker maps the same
+files read-only, so the vectors live once in the OS page cache.
+
+Files are rebuilt incrementally (rows of deleted chunks dropped, only new
+chunks fetched from Postgres) under a per-collection file lock and swapped
+in by atomically replacing meta.json. A search against a stale or missing
+index returns None so the caller falls back to Postgres, and schedules a
+sync in the background.
+"""
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from app.core import config
+
+logger = logging.getLogger("app.mmap_index")
+
+# Rows scored per block; float16 rows are widened to float32 block by block
+_SCORE_BLOCK_ROWS = 65536
+_FETCH_BATCH = 1000
+
+
+class _LoadedIndex:
+    def __init__(self, version: int, count: int, vectors: Optional[np.ndarray], chunk_ids: Optional[np.ndarray]):
+        self.version = version
+        self.count = count
+        self.vectors = vectors
+        self.chunk_ids = chunk_ids
+
+
+_loaded: Dict[uuid.UUID, _LoadedIndex] = {}
+_loaded_lock = threading.Lock()
+_syncing: Set[uuid.UUID] = set()
+
+
+def _collection_dir(collection_id: Union[str, uuid.UUID]) -> str:
+    return os.path.join(config.ANN_MMAP_DIR, uuid.UUID(str(collection_id)).hex)
+
+
+def _read_meta(directory: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(directory, "meta.json")) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_meta(directory: str, meta: Dict) -> None:
+    tmp_path = os.path.join(directory, "meta.json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(directory, "meta.json"))
+
+
+@contextmanager
+def _file_lock(directory: str) -> Iterator[None]:
+    """Cross-process lock so only one worker rebuilds a collection at a time"""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _load(collection_id: uuid.UUID) -> Optional[_LoadedIndex]:
+    directory = _collection_dir(collection_id)
+    meta = _read_meta(directory)
+    if meta is None:
+        return None
+
+    vectors = chunk_ids = None
+    if meta.get("vectors"):
+        vectors = np.load(os.path.join(directory, meta["vectors"]), mmap_mode="r")
+        chunk_ids = np.load(os.path.join(directory, meta["chunk_ids"]))
+
+    return _LoadedIndex(meta["content_version"], meta["count"], vectors, chunk_ids)
+
+
+def _get_loaded(collection_id: uuid.UUID, version: int) -> Optional[_LoadedIndex]:
+    """The mapped index at `version`, re-reading meta.json if another process synced it"""
+    with _loaded_lock:
+        index = _loaded.get(collection_id)
+        if index is not None and index.version == version:
+            return index
+
+        index = _load(collection_id)
+        if index is None:
+            _loaded.pop(collection_id, None)
+            return None
+
+        _loaded[collection_id] = index
+        return index if index.version == version else None
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(vectors: np.ndarray, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exact top-k rows of `vectors` by dot product with `query`.
+    Scores are computed block by block (bounded float32 temporaries), then
+    argpartition picks the k best without sorting all n scores.
+    """
+    n = vectors.shape[0]
+    scores = np.empty(n, dtype=np.float32)
+    for start in range(0, n, _SCORE_BLOCK_ROWS):
+        block = vectors[start:start + _SCORE_BLOCK_ROWS]
+        scores[start:start + len(block)] = block.astype(np.float32, copy=False) @ query
+
+    k = min(k, n)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    order = candidates[np.argsort(-scores[candidates])]
+    return order, scores[order]
+
+
+def search(
+    collection_id: uuid.UUID,
+    content_version: int,
+    query_embedding,
+    k: int,
+    with_vectors: bool = False
+) -> Optional[List[Tuple]]:
+    """
+    Top-k (chunk_id, cosine similarity) for a collection, or None when this
+    backend should not serve it (disabled, too large, stale or not built yet).
+    with_vectors appends each hit's normalized float32 vector to its tuple.
+    """
+    if config.RETRIEVAL_BACKEND != "auto":
+        return None
+
+    index = _get_loaded(collection_id, content_version)
+    if index is None:
+        sync_collection_async(collection_id)
+        return None
+
+    if index.vectors is None or index.count > config.ANN_MMAP_MAX_ROWS:
+        return None
+    if index.count == 0:
+        return []
+
+    query = np.asarray(query_embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(query))
+    if norm == 0.0:
+        return None
+
+    rows, scores = top_k(index.vectors, query / norm, k)
+    hits = [(uuid.UUID(bytes=index.chunk_ids[row].tobytes()), float(score)) for row, score in zip(rows, scores)]
+    if with_vectors:
+        vectors = np.asarray(index.vectors[rows], dtype=np.float32)
+        hits = [hit + (vector,) for hit, vector in zip(hits, vectors)]
+    return hits
+
+
+def _fetch_vectors(db, chunk_ids: List[uuid.UUID]) -> Iterator[Tuple[List[uuid.UUID], np.ndarray]]:
+    from app.db.models import Embedding
+
+    for start in range(0, len(chunk_ids), _FETCH_BATCH):
+        batch = chunk_ids[start:start + _FETCH_BATCH]
+        rows = db.query(Embedding.chunk_id, Embedding.embedding).filter(Embedding.chunk_id.in_(batch)).all()
+        if rows:
+            yield [r[0] for r in rows], _normalize_rows(np.stack([np.asarray(r[1]) for r in rows]))
+
+
+def sync_collection(collection_id: Union[str, uuid.UUID]) -> None:
+    """
+    Bring a collection's mapped index up to its current content_version.
+    Keeps rows whose chunks still exist and fetches vectors only for new chunks.
+    """
+    from app.db.database import SessionLocal
+    from app.db.models import Collection, Embedding
+
+    collection_id = uuid.UUID(str(collection_id))
+    directory = _collection_dir(collection_id)
+    db = SessionLocal()
+
+    try:
+        with _file_lock(directory):
+            version = db.query(Collection.content_version).filter(Collection.id == collection_id).scalar()
+            if version is None:
+                drop_collection(collection_id)
+                return
+
+            meta = _read_meta(directory)
+            if meta is not None and meta["content_version"] == version:
+                return
+
+            current = [r[0] for r in db.query(Embedding.chunk_id).filter(Embedding.collection_id == collection_id)]
+            new_meta = {"content_version": version, "count": len(current), "vectors": None, "chunk_ids": None}
+
+            if len(current) > config.ANN_MMAP_MAX_ROWS:
+                # Too large for brute force; Postgres serves it
+                _write_meta(directory, new_meta)
+                _remove_stale_files(directory, new_meta)
+                logger.info(f"Collection {collection_id} has {len(current)} vectors; using Postgres ANN")
+                return
+
+            old = _load(collection_id)
+            keep_rows: List[int] = []
+            known: Set[bytes] = set()
+            if old is not None and old.vectors is not None:
+                current_bytes = {c.bytes for c in current}
+                for row, raw in enumerate(old.chunk_ids):
+                    raw = raw.tobytes()
+                    if raw in current_bytes:
+                        keep_rows.append(row)
+                        known.add(raw)
+            added = [c for c in current if c.bytes not in known]
+
+            dims = config.EMBED_DIMENSIONS
+            dtype = np.dtype(config.ANN_MMAP_DTYPE)
+            vectors_name = f"vectors.{version}.npy"
+            ids_name = f"chunk_ids.{version}.npy"
+
+            vectors = np.lib.format.open_memmap(
+                os.path.join(directory, vectors_name), mode="w+", dtype=dtype, shape=(len(current), dims)
+            )
+            chunk_ids = np.empty((len(current), 16), dtype=np.uint8)
+
+            if keep_rows:
+                keep = np.asarray(keep_rows)
+                for start in range(0, len(keep), _SCORE_BLOCK_ROWS):
+                    rows = keep[start:start + _SCORE_BLOCK_ROWS]
+                    vectors[start:start + len(rows)] = old.vectors[rows]
+                    chunk_ids[start:start + len(rows)] = old.chunk_ids[rows]
+
+            position = len(keep_rows)
+            for batch_ids, batch_vectors in _fetch_vectors(db, added):
+                end = position + len(batch_ids)
+                vectors[position:end] = batch_vectors.astype(dtype)
+                chunk_ids[position:end] = np.frombuffer(b"".join(c.bytes for c in batch_ids), dtype=np.uint8).reshape(-1, 16)
+                position = end
+
+            # Chunks deleted between listing and fetching are simply left out
+            vectors.flush()
+            del vectors
+            if position < len(current):
+                trimmed = np.load(os.path.join(directory, vectors_name), mmap_mode="r")[:position]
+                np.save(os.path.join(directory, f"trim.{vectors_name}"), trimmed)
+                os.replace(os.path.join(directory, f"trim.{vectors_name}"), os.path.join(directory, vectors_name))
+            np.save(os.path.join(directory, ids_name), chunk_ids[:position])
+
+            new_meta.update(count=position, vectors=vectors_name, chunk_ids=ids_name)
+            _write_meta(directory, new_meta)
+            _remove_stale_files(directory, new_meta)
+
+            logger.info(
+                f"Synced mmap index for collection {collection_id} to version {version}: "
+                f"{position} vectors ({len(keep_rows)} kept, {position - len(keep_rows)} fetched)"
+            )
+    finally:
+        db.close()
+
+
+def _remove_stale_files(directory: str, meta: Dict) -> None:
+    """Delete superseded data files; processes still mapping them keep their open inode"""
+    live = {meta.get("vectors"), meta.get("chunk_ids")}
+    for name in os.listdir(directory):
+        if name.endswith(".npy") and name not in live:
+            os.remove(os.path.join(directory, name))
+
+
+def sync_collection_async(collection_id: Union[str, uuid.UUID]) -> None:
+    """Sync in a background thread; at most one sync per collection per process"""
+    if config.RETRIEVAL_BACKEND != "auto":
+        return
+
+    collection_id = uuid.UUID(str(collection_id))
+
+    with _loaded_lock:
+        if collection_id in _syncing:
+            return
+        _syncing.add(collection_id)
+
+    def _run():
+        try:
+            sync_collection(collection_id)
+        except Exception as e:
+            logger.error(f"Failed to sync mmap index for collection {collection_id}: {e}", exc_info=True)
+        finally:
+            with _loaded_lock:
+                _syncing.discard(collection_id)
+
+    threading.Thread(target=_run, name="mmap-index-sync", daemon=True).start()
+
+
+def drop_collection(collection_id: Union[str, uuid.UUID]) -> None:
+    collection_id = uuid.UUID(str(collection_id))
+    with _loaded_lock:
+        _loaded.pop(collection_id, None)
+    shutil.rmtree(_collection_dir(collection_id), ignore_errors=True)
@@ -0,0 +1,100 @@
+# services/mmr.py
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core import config
+
+logger = logging.getLogger("app.mmr")
+
+
+def mmr_select(query: np.ndarray, candidates: np.ndarray, k: int, lambda_mult: float = 0.5) -> List[int]:
+    """
+    Maximal marginal relevance over a candidate pool.
+    Picks k row indexes of `candidates` (n x d), each maximizing
+        lambda * sim(query, c) - (1 - lambda) * max(sim(c, already picked)).
+    Costs one matrix-vector product for relevance plus one per pick to update
+    every candidate's max similarity to the picked set (no n x n matrix).
+    Cosine similarities are obtained by scaling the dot products with the
+    row norms, so the n x d matrix is never normalized or copied.
+    """
+    n = candidates.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return []
+
+    candidates = np.asarray(candidates, dtype=np.float32)
+    query = np.asarray(query, dtype=np.float32)
+
+    norms = np.sqrt(np.einsum("ij,ij->i", candidates, candidates))
+    norms[norms == 0] = 1.0
+    query_norm = float(np.linalg.norm(query)) or 1.0
+
+    relevance = (candidates @ query) / (norms * query_norm)
+    max_similarity = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+
+    picked = [int(np.argmax(relevance))]
+    available[picked[0]] = False
+
+    while len(picked) < k:
+        last = picked[-1]
+        similarity = (candidates @ candidates[last]) / (norms * norms[last])
+        np.maximum(max_similarity, similarity, out=max_similarity)
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+
+    return picked
+
+
+def attach_vectors(db: Session, hits: List[Dict]) -> None:
+    """Fill in "embedding" for hits that came back without one, in one query"""
+    from app.db.models import Embedding
+
+    missing = [h["chunk_id"] for h in hits if h.get("embedding") is None]
+    if not missing:
+        return
+
+    rows = db.query(Embedding.chunk_id, Embedding.embedding).filter(Embedding.chunk_id.in_(missing)).all()
+    vectors = {r[0]: r[1] for r in rows}
+    for hit in hits:
+        if hit.get("embedding") is None:
+            hit["embedding"] = vectors.get(hit["chunk_id"])
+
+
+def rerank_mmr(
+    query_embedding,
+    hits: List[Dict],
+    k: int,
+    lambda_mult: Optional[float] = None,
+    db: Optional[Session] = None
+) -> List[Dict]:
+    """
+    Diversify ranked hits with MMR and return k of them in MMR order.
+    Hits need an "embedding"; missing ones are fetched with db. Hits still
+    without one are left out, and if none has one the first k are returned
+    in their original order.
+    """
+    lambda_mult = config.MMR_LAMBDA if lambda_mult is None else lambda_mult
+
+    if len(hits) <= k:
+        return hits
+
+    if db is not None:
+        attach_vectors(db, hits)
+
+    with_vectors = [h for h in hits if h.get("embedding") is not None]
+    if not with_vectors:
+        logger.warning(f"No embeddings for {len(hits)} hits, skipping MMR")
+        return hits[:k]
+
+    hits = with_vectors
+    candidates = np.stack([np.asarray(h["embedding"], dtype=np.float32) for h in hits])
+    picked = mmr_select(np.asarray(query_embedding, dtype=np.float32), candidates, k, lambda_mult)
+
+    return [hits[i] for i in picked]
@@ -0,0 +1,87 @@
+# services/pdf_extract.py
+import logging
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional
+
+from pypdf import PdfReader
+
+from app.core import config
+
+logger = logging.getLogger("app.pdf_extract")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _extract_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """Worker entry point: extract text for pages [start, end) of one PDF"""
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def get_extract_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Process pool shared by every ingest in this process.
+    Returns None when PDF_EXTRACT_WORKERS is 0 (serial extraction).
+    """
+    global _pool
+
+    if config.PDF_EXTRACT_WORKERS <= 0:
+        return None
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: forking a multi-threaded server process is unsafe
+                _pool = ProcessPoolExecutor(
+                    max_workers=config.PDF_EXTRACT_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+                logger.info("Started PDF extraction pool with %d workers", config.PDF_EXTRACT_WORKERS)
+
+    return _pool
+
+
+def shutdown_extract_pool() -> None:
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def iter_pdf_pages(file_path: str, pages_per_shard: Optional[int] = None) -> Iterator[str]:
+    """
+    Yield page texts in document order.
+    Documents with more than two shards' worth of pages are split into page
+    ranges extracted on the shared process pool; shards are reassembled in
+    order and at most 2 * workers shards are outstanding at once.
+    """
+    pages_per_shard = pages_per_shard or config.PDF_EXTRACT_SHARD_PAGES
+    reader = PdfReader(file_path)
+    n_pages = len(reader.pages)
+    pool = get_extract_pool()
+
+    if pool is None or n_pages <= 2 * pages_per_shard:
+        for page in reader.pages:
+            yield page.extract_text() or ""
+        return
+
+    del reader
+    shards = ((start, min(start + pages_per_shard, n_pages)) for start in range(0, n_pages, pages_per_shard))
+    window = 2 * config.PDF_EXTRACT_WORKERS
+    pending = deque()
+
+    logger.info("Extracting %d pages in shards of %d across the process pool", n_pages, pages_per_shard)
+
+    for start, end in shards:
+        pending.append(pool.submit(_extract_page_range, file_path, start, end))
+        if len(pending) >= window:
+            yield from pending.popleft().result()
+
+    while pending:
+        yield from pending.popleft().result()
@@ -1,11 +1,15 @@
 # services/pg_vector_client.py
 import httpx
-from openai import OpenAI
+import tiktoken
+from openai import AsyncOpenAI, OpenAI
 from app.core import config
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Iterator, List, Optional
 
 _openai_client = None
+_async_openai_client = None
+_tokenizer = None
 
 
 def _get_openai_client():
@@ -21,6 +25,7 @@ def _get_openai_client():
 
             _openai_client = OpenAI(
                 api_key=config.OPENAI_API_KEY,
+                base_url=config.OPENAI_BASE_URL or None,
                 http_client=http_client
             )
         except Exception as e:
@@ -37,8 +42,52 @@ def get_openai_client():
     return _get_openai_client()
 
 
-def get_embedding(text: str) -> list:
-    """Get embedding for text using OpenAI"""
+def get_async_openai_client() -> AsyncOpenAI:
+    """
+    Lazy initialize the asyncio OpenAI client (async query path).
+    Requests wait on the event loop instead of holding a threadpool thread,
+    so concurrency is bounded by OPENAI_MAX_CONNECTIONS instead.
+    """
+    global _async_openai_client
+
+    if _async_openai_client is None:
+        http_client = httpx.AsyncClient(
+            timeout=60.0,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=config.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=config.OPENAI_MAX_CONNECTIONS
+            )
+        )
+
+        _async_openai_client = AsyncOpenAI(
+            api_key=config.OPENAI_API_KEY,
+            base_url=config.OPENAI_BASE_URL or None,
+            http_client=http_client
+        )
+
+    return _async_openai_client
+
+
+def get_embedding(text: str, db: Optional[Session] = None) -> list:
+    """
+    Get embedding for text, consulting the persistent embedding cache first.
+    Uses db if given, otherwise a short-lived session.
+    """
+    if config.EMBED_CACHE_ENABLED:
+        from app.services.embedding_cache import get_embeddings_cached
+
+        if db is not None:
+            return get_embeddings_cached(db, [text])[0]
+
+        from app.db.database import SessionLocal
+
+        cache_db = SessionLocal()
+        try:
+            return get_embeddings_cached(cache_db, [text])[0]
+        finally:
+            cache_db.close()
+
     client = _get_openai_client()
 
     response = client.embeddings.create(
@@ -49,50 +98,252 @@ def get_embedding(text: str) -> list:
     return response.data[0].embedding
 
 
+async def aget_embedding(text: str, db: Optional[AsyncSession] = None) -> list:
+    """asyncio get_embedding, consulting the persistent embedding cache through db"""
+    if config.EMBED_CACHE_ENABLED and db is not None:
+        from app.services.embedding_cache import aget_embeddings_cached
+
+        return (await aget_embeddings_cached(db, [text]))[0]
+
+    return (await aembed_batch([text]))[0]
+
+
+def _get_tokenizer():
+    """Lazy load the tiktoken encoding that matches the embedding model"""
+    global _tokenizer
+
+    if _tokenizer is None:
+        try:
+            _tokenizer = tiktoken.encoding_for_model(config.EMBED_MODEL)
+        except KeyError:
+            _tokenizer = tiktoken.get_encoding("cl100k_base")
+
+    return _tokenizer
+
+
+def get_tokenizer():
+    """Public function to get the embedding model's tiktoken encoding"""
+    return _get_tokenizer()
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens in text using the embedding model's encoding"""
+    return len(_get_tokenizer().encode(text, disallowed_special=()))
+
+
+def _truncate_to_token_limit(text: str, max_tokens: int) -> tuple[str, int]:
+    """Truncate text to at most max_tokens tokens. Returns (text, token_count)."""
+    tokens = _get_tokenizer().encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text, len(tokens)
+    return _get_tokenizer().decode(tokens[:max_tokens]), max_tokens
+
+
+def iter_embedding_batches(texts: List[str]) -> Iterator[List[str]]:
+    """
+    Group texts into batches that fit a single embeddings.create request.
+    Each batch respects EMBED_BATCH_MAX_INPUTS and EMBED_BATCH_MAX_TOKENS,
+    and inputs longer than EMBED_MAX_INPUT_TOKENS are truncated.
+    Input order is preserved across batches.
+    """
+    batch: List[str] = []
+    batch_tokens = 0
+
+    for text in texts:
+        text, n_tokens = _truncate_to_token_limit(text, config.EMBED_MAX_INPUT_TOKENS)
+
+        if batch and (
+            len(batch) >= config.EMBED_BATCH_MAX_INPUTS
+            or batch_tokens + n_tokens > config.EMBED_BATCH_MAX_TOKENS
+        ):
+            yield batch
+            batch = []
+            batch_tokens = 0
+
+        batch.append(text)
+        batch_tokens += n_tokens
+
+    if batch:
+        yield batch
+
+
+def embed_batch(texts: List[str]) -> List[list]:
+    """Embed a single pre-sized batch of texts in one embeddings.create call"""
+    client = _get_openai_client()
+
+    response = client.embeddings.create(
+        model=config.EMBED_MODEL,
+        input=texts
+    )
+
+    # The API does not guarantee response order, so sort by index
+    return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+
+async def aembed_batch(texts: List[str]) -> List[list]:
+    """asyncio embed_batch, throttled and retried by the query embedding executor"""
+    from app.services.embedding_executor import get_query_embedding_executor
+
+    return await get_query_embedding_executor().aembed_batch(texts)
+
+
+async def aget_embeddings_batch(texts: List[str]) -> List[list]:
+    """
+    asyncio get_embeddings_batch: batches are requested concurrently on the
+    event loop, with the same retries as get_embeddings_batch but under the
+    query executor's OPENAI_MAX_CONNECTIONS limit, not the ingest limit
+    """
+    from app.services.embedding_executor import get_query_embedding_executor
+
+    return await get_query_embedding_executor().aembed(texts)
+
+
+def get_embeddings_batch(texts: List[str]) -> List[list]:
+    """
+    Get embeddings for many texts using as few embeddings.create calls as
+    the per-request token and input limits allow. Batches are sent through
+    the shared concurrent embedding executor.
+    Returns embeddings in the same order as texts.
+    """
+    from app.services.embedding_executor import get_embedding_executor
+
+    return get_embedding_executor().embed(texts)
+
+
 # ===== PGVECTOR HELPER FUNCTIONS =====
 
+def _build_rows(
+    chunks: List[str],
+    embeddings: List[List[float]],
+    document_id: str,
+    collection_id,
+    chunk_indexes: List[int],
+    token_counts: List[Optional[int]]
+) -> tuple[list, list]:
+    """Build chunk and embedding rows with client-side generated IDs"""
+    import uuid
+
+    doc_uuid = uuid.UUID(document_id)
+    collection_uuid = uuid.UUID(str(collection_id))
+    chunk_rows = []
+    embedding_rows = []
+
+    for idx, chunk_text, embedding_vector, n_tokens in zip(chunk_indexes, chunks, embeddings, token_counts):
+        chunk_id = uuid.uuid4()
+        chunk_rows.append({
+            "id": chunk_id,
+            "document_id": doc_uuid,
+            "content": chunk_text,
+            "chunk_index": idx,
+            "token_count": n_tokens,
+        })
+        embedding_rows.append({
+            "id": uuid.uuid4(),
+            "chunk_id": chunk_id,
+            "document_id": doc_uuid,
+            "collection_id": collection_uuid,
+            "embedding": embedding_vector,
+            "embedding_model": config.EMBED_MODEL,
+            "text_preview": chunk_text[:200],
+        })
+
+    return chunk_rows, embedding_rows
+
+
+def _copy_rows(driver_conn, table: str, rows: list, types: List[str]) -> None:
+    """Stream rows into table with binary COPY on a raw psycopg connection"""
+    columns = list(rows[0].keys())
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN (FORMAT BINARY)"
+
+    with driver_conn.cursor() as cur:
+        with cur.copy(sql) as copy:
+            copy.set_types(types)
+            for row in rows:
+                copy.write_row([row[c] for c in columns])
+
+
+def _get_psycopg_connection(db: Session):
+    """
+    Return the psycopg connection behind db's current transaction (with the
+    pgvector type registered), or None if the driver is not psycopg 3.
+    """
+    try:
+        import psycopg
+        from pgvector.psycopg import register_vector
+    except ImportError:
+        return None
+
+    driver_conn = db.connection().connection.driver_connection
+    if not isinstance(driver_conn, psycopg.Connection):
+        return None
+
+    if driver_conn.adapters.types.get("vector") is None:
+        register_vector(driver_conn)
+
+    return driver_conn
+
+
 def store_embeddings_batch(
     db: Session,
     chunks: List[str],
     embeddings: List[List[float]],
-    document_id: str
+    document_id: str,
+    start_index: int = 0,
+    commit: bool = True,
+    chunk_indexes: Optional[List[int]] = None,
+    token_counts: Optional[List[Optional[int]]] = None,
+    collection_id=None
 ) -> int:
     """
-    Store embeddings in PostgreSQL using pgvector.
+    Store chunks and embeddings in PostgreSQL using pgvector.
     Documents are shared across all sessions.
+    Rows are written with binary COPY (one round trip per table) when the
+    driver is psycopg 3, otherwise with multi-row INSERTs. IDs are generated
+    client-side. start_index offsets chunk_index so a document can be written
+    in windows (or pass explicit chunk_indexes); with commit=False the rows
+    stay in the caller's transaction. collection_id is denormalized onto
+    embeddings and looked up from the document when not given.
     Returns the number of embeddings stored.
     """
-    from app.db.models import Chunk, Embedding
+    from app.db.models import Chunk, Document, Embedding
+    from sqlalchemy import insert
     import uuid
-    
+
+    if not chunks:
+        return 0
+
     try:
-        stored_count = 0
-        
-        for idx, (chunk_text, embedding_vector) in enumerate(zip(chunks, embeddings)):
-            # Create chunk
-            chunk = Chunk(
-                id=uuid.uuid4(),
-                document_id=uuid.UUID(document_id),
-                content=chunk_text,
-                chunk_index=idx
+        if chunk_indexes is None:
+            chunk_indexes = list(range(start_index, start_index + len(chunks)))
+        if token_counts is None:
+            token_counts = [None] * len(chunks)
+        if collection_id is None:
+            collection_id = (
+                db.query(Document.collection_id)
+                .filter(Document.id == uuid.UUID(document_id))
+                .scalar()
             )
-            db.add(chunk)
-            db.flush()  # Get the chunk ID
-            
-            # Create embedding
-            text_preview = chunk_text[:200] if len(chunk_text) > 200 else chunk_text
-            embedding_obj = Embedding(
-                chunk_id=chunk.id,
-                document_id=uuid.UUID(document_id),
-                embedding=embedding_vector,
-                embedding_model=config.EMBED_MODEL,
-                text_preview=text_preview
+        chunk_rows, embedding_rows = _build_rows(
+            chunks, embeddings, document_id, collection_id, chunk_indexes, token_counts
+        )
+
+        # Make sure the parent Document row is written before bypassing the ORM
+        db.flush()
+        driver_conn = _get_psycopg_connection(db)
+
+        if driver_conn is not None:
+            _copy_rows(driver_conn, "chunks", chunk_rows, ["uuid", "uuid", "text", "int4", "int4"])
+            _copy_rows(
+                driver_conn, "embeddings", embedding_rows,
+                ["uuid", "uuid", "uuid", "uuid", "vector", "varchar", "text"]
             )
-            db.add(embedding_obj)
-            stored_count += 1
-        
-        db.commit()
-        return stored_count
+        else:
+            db.execute(insert(Chunk).values(chunk_rows))
+            db.execute(insert(Embedding).values(embedding_rows))
+
+        if commit:
+            db.commit()
+        return len(chunk_rows)
     except Exception as e:
         import logging
         logger = logging.getLogger("app.pg_vector_client")
@@ -101,22 +352,104 @@ def store_embeddings_batch(
         raise
 
 
+def resolve_collection(db: Session, collection: Optional[str]):
+    """Return (id, hnsw_ef_search, ivfflat_probes, content_version) for a collection name, or None"""
+    from app.db.models import Collection
+
+    if collection is None:
+        return None
+    return db.query(
+        Collection.id, Collection.hnsw_ef_search, Collection.ivfflat_probes, Collection.content_version
+    ).filter(Collection.name == collection).first()
+
+
+def collection_filter(collection_id):
+    """
+    WHERE clause restricting embeddings to one collection.
+    The id is rendered as a literal (not a bind parameter) so the planner can
+    match the collection's partial vector index even with prepared statements.
+    """
+    from app.db.models import Embedding
+    from sqlalchemy import bindparam
+    from sqlalchemy.dialects.postgresql import UUID
+
+    return Embedding.collection_id == bindparam(
+        "collection_id", collection_id, type_=UUID(as_uuid=True), literal_execute=True
+    )
+
+
+def _apply_search_scope(
+    db: Session,
+    resolved,
+    k: int,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None
+) -> None:
+    """
+    Set the index knobs for this transaction: request values, then the
+    resolved collection's defaults, then the global settings.
+    """
+    from app.services.vector_index import apply_search_settings
+
+    if resolved is not None:
+        ef_search = ef_search or resolved.hnsw_ef_search
+        probes = probes or resolved.ivfflat_probes
+
+    apply_search_settings(db, ef_search=ef_search, probes=probes, k=k)
+
+
+def _fetch_chunk_rows(db: Session, chunk_ids: List) -> list:
+    """(id, content, filename, document_id, chunk_index) rows for chunk ids, in the given order"""
+    from app.db.models import Chunk, Document
+
+    if not chunk_ids:
+        return []
+
+    rows = db.query(Chunk.id, Chunk.content, Document.filename, Chunk.document_id, Chunk.chunk_index).join(
+        Document, Chunk.document_id == Document.id
+    ).filter(Chunk.id.in_(chunk_ids)).all()
+    by_id = {r[0]: r for r in rows}
+    # A chunk deleted since the index was built is simply skipped
+    return [by_id[c] for c in chunk_ids if c in by_id]
+
+
+def _fetch_chunk_hits(db: Session, chunk_ids: List) -> tuple[List[str], List[str]]:
+    """(documents, sources) for chunk ids, in the given order"""
+    hits = _fetch_chunk_rows(db, chunk_ids)
+    return [r[1] for r in hits], [r[2] for r in hits]
+
+
 def similarity_search(
     db: Session,
     query_embedding: List[float],
-    k: int = 4
+    k: int = 4,
+    collection: Optional[str] = None,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None
 ) -> tuple[List[str], List[str]]:
     """
     Perform similarity search using pgvector cosine distance.
-    Searches across ALL documents (not session-specific).
+    Scoped to one collection when collection is given (served by that
+    collection's partial index), otherwise searches ALL documents.
+    ef_search/probes override the collection's defaults (then the global
+    settings) for this transaction only.
+    Collections small enough for brute force are served from the
+    memory-mapped in-process index (mmap_index) once it is in sync.
     Returns (documents, sources) tuple.
     """
     from app.db.models import Embedding, Chunk, Document
-    from sqlalchemy import text
-    import uuid
+    from app.services import mmap_index
     
     try:
-        # Build the query - search ALL documents
+        resolved = resolve_collection(db, collection)
+        if collection is not None and resolved is None:
+            return [], []
+
+        if resolved is not None:
+            hits = mmap_index.search(resolved.id, resolved.content_version, query_embedding, k)
+            if hits is not None:
+                return _fetch_chunk_hits(db, [chunk_id for chunk_id, _ in hits])
+
         query = db.query(
             Chunk.content,
             Document.filename,
@@ -126,6 +459,10 @@ def similarity_search(
         ).join(
             Document, Chunk.document_id == Document.id
         )
+
+        _apply_search_scope(db, resolved, k, ef_search, probes)
+        if resolved is not None:
+            query = query.filter(collection_filter(resolved.id))
         
         # Order by similarity and limit
         results = query.order_by('distance').limit(k).all()
@@ -139,3 +476,366 @@ def similarity_search(
         logger = logging.getLogger("app.pg_vector_client")
         logger.error(f"Similarity search failed: {e}", exc_info=True)
         return [], []
+
+
+def batch_similarity_search(
+    db: Session,
+    query_embeddings: List[List[float]],
+    k: int = 4,
+    collection: Optional[str] = None,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None
+) -> List[tuple[List[str], List[str]]]:
+    """
+    Top-k retrieval for many query vectors in one SQL statement:
+    a LATERAL ANN subquery (ORDER BY distance LIMIT k, so the index is used)
+    per row of a VALUES list of query vectors.
+    Returns one (documents, sources) tuple per query, in order.
+    """
+    from sqlalchemy import Integer, cast, column, select, true, values
+    from pgvector.sqlalchemy import Vector
+    from app.db.models import Embedding, Chunk, Document
+    from app.services import mmap_index
+
+    results: List[tuple[List[str], List[str]]] = [([], []) for _ in query_embeddings]
+    if not query_embeddings:
+        return results
+
+    resolved = resolve_collection(db, collection)
+    if collection is not None and resolved is None:
+        return results
+
+    if resolved is not None:
+        per_query = [mmap_index.search(resolved.id, resolved.content_version, q, k) for q in query_embeddings]
+        if all(hits is not None for hits in per_query):
+            chunk_ids = list(dict.fromkeys(chunk_id for hits in per_query for chunk_id, _ in hits))
+            # Keyed by the returned ids: chunks deleted since the index was built are absent
+            by_id = {r[0]: (r[1], r[2]) for r in _fetch_chunk_rows(db, chunk_ids)}
+            for i, hits in enumerate(per_query):
+                found = [by_id[chunk_id] for chunk_id, _ in hits if chunk_id in by_id]
+                results[i] = ([d for d, _ in found], [s for _, s in found])
+            return results
+
+    _apply_search_scope(db, resolved, k, ef_search, probes)
+
+    queries = values(
+        column("idx", Integer),
+        column("embedding", Vector(config.EMBED_DIMENSIONS)),
+        name="q"
+    ).data([(i, q) for i, q in enumerate(query_embeddings)])
+
+    # VALUES rows arrive untyped; cast so the lateral ORDER BY matches the vector index
+    distance = Embedding.embedding.cosine_distance(cast(queries.c.embedding, Vector(config.EMBED_DIMENSIONS)))
+    ann = select(Embedding.chunk_id, distance.label("distance"))
+    if resolved is not None:
+        ann = ann.where(collection_filter(resolved.id))
+    ann = ann.order_by(distance).limit(k).lateral("hit")
+
+    rows = db.execute(
+        select(queries.c.idx, Chunk.content, Document.filename)
+        .select_from(queries.join(ann, true()))
+        .join(Chunk, Chunk.id == ann.c.chunk_id)
+        .join(Document, Chunk.document_id == Document.id)
+        .order_by(queries.c.idx, ann.c.distance)
+    ).all()
+
+    for idx, content, filename in rows:
+        results[idx][0].append(content)
+        results[idx][1].append(filename)
+
+    return results
+
+
+def search_chunks(
+    db: Session,
+    query_embedding: List[float],
+    collection: Optional[str] = None,
+    limit: int = 10,
+    offset: int = 0,
+    max_distance: Optional[float] = None,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    include_vectors: bool = False
+) -> List[dict]:
+    """
+    Ranked chunks with metadata for retrieval-only clients.
+    Returns up to `limit` hits after skipping `offset`, each a dict with
+    chunk_id, document_id, filename, chunk_index, content and cosine distance
+    (plus "embedding" when include_vectors, e.g. for MMR reranking).
+    Hits farther than max_distance are dropped.
+    """
+    from app.services import mmap_index
+
+    resolved = resolve_collection(db, collection)
+    if collection is not None and resolved is None:
+        return []
+
+    if resolved is not None:
+        hits = mmap_index.search(
+            resolved.id, resolved.content_version, query_embedding, offset + limit, with_vectors=include_vectors
+        )
+        if hits is not None:
+            return _mmap_search_results(db, hits, offset, max_distance, include_vectors)
+
+    return _sql_search_chunks(db, resolved, query_embedding, limit, offset, max_distance, ef_search, probes, include_vectors)
+
+
+def _mmap_search_results(
+    db: Session,
+    hits: List[tuple],
+    offset: int,
+    max_distance: Optional[float],
+    include_vectors: bool
+) -> List[dict]:
+    """search_chunks hits from an mmap_index.search result (top offset + limit)"""
+    hits = [h for h in hits[offset:] if max_distance is None or 1.0 - h[1] <= max_distance]
+    by_id = {h[0]: h for h in hits}
+    rows = _fetch_chunk_rows(db, list(by_id))
+    results = []
+    for r in rows:
+        hit = {
+            "chunk_id": r[0],
+            "document_id": r[3],
+            "filename": r[2],
+            "chunk_index": r[4],
+            "content": r[1],
+            "distance": 1.0 - by_id[r[0]][1],
+        }
+        if include_vectors:
+            hit["embedding"] = by_id[r[0]][2]
+        results.append(hit)
+    return results
+
+
+def _sql_search_chunks(
+    db: Session,
+    resolved,
+    query_embedding: List[float],
+    limit: int,
+    offset: int,
+    max_distance: Optional[float],
+    ef_search: Optional[int],
+    probes: Optional[int],
+    include_vectors: bool
+) -> List[dict]:
+    """search_chunks through the pgvector index"""
+    from app.db.models import Embedding, Chunk, Document
+
+    _apply_search_scope(db, resolved, offset + limit, ef_search, probes)
+
+    distance = Embedding.embedding.cosine_distance(query_embedding)
+    query = db.query(
+        Chunk.id,
+        Chunk.document_id,
+        Document.filename,
+        Chunk.chunk_index,
+        Chunk.content,
+        distance.label('distance')
+    ).join(
+        Embedding, Chunk.id == Embedding.chunk_id
+    ).join(
+        Document, Chunk.document_id == Document.id
+    )
+
+    if include_vectors:
+        query = query.add_columns(Embedding.embedding)
+    if resolved is not None:
+        query = query.filter(collection_filter(resolved.id))
+    if max_distance is not None:
+        query = query.filter(distance <= max_distance)
+
+    results = query.order_by('distance').offset(offset).limit(limit).all()
+
+    hits = []
+    for r in results:
+        hit = {
+            "chunk_id": r[0],
+            "document_id": r[1],
+            "filename": r[2],
+            "chunk_index": r[3],
+            "content": r[4],
+            "distance": float(r[5]),
+        }
+        if include_vectors:
+            hit["embedding"] = r[6]
+        hits.append(hit)
+
+    return hits
+
+
+def lexical_tsquery(query_text: str):
+    """
+    OR-tsquery over the query's terms (stop words dropped, stemmed with the
+    same 'english' config as chunks.content_tsv), so a chunk matching only
+    a part number or error code from a longer question still ranks.
+    """
+    from sqlalchemy import Text, cast, func, literal_column
+    from sqlalchemy.dialects.postgresql import TSQUERY
+
+    terms = cast(func.plainto_tsquery(literal_column("'english'::regconfig"), query_text), Text)
+    return cast(func.replace(terms, "&", "|"), TSQUERY)
+
+
+def hybrid_search_chunks(
+    db: Session,
+    query_text: str,
+    query_embedding: List[float],
+    k: int = 4,
+    collection: Optional[str] = None,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    candidates: Optional[int] = None
+) -> List[dict]:
+    """
+    Hybrid lexical + vector search in a single SQL statement.
+    The top `candidates` chunks by cosine distance (ANN index) and by
+    full-text rank (GIN index on chunks.content_tsv) are fused with
+    reciprocal-rank fusion: score = sum(1 / (HYBRID_RRF_K + rank)).
+    Returns hits like search_chunks plus the fused "score"; "distance" is the
+    vector arm's cosine distance, None for chunks found only by full-text search.
+    """
+    from sqlalchemy import Float, func, null, select, union_all
+    from app.db.models import Embedding, Chunk, Document
+
+    resolved = resolve_collection(db, collection)
+    if collection is not None and resolved is None:
+        return []
+    collection_id = resolved.id if resolved is not None else None
+
+    n = max(k, candidates or config.HYBRID_CANDIDATES)
+    # The ANN arm has to return n candidates, not k
+    _apply_search_scope(db, resolved, n, ef_search, probes)
+
+    # Vector arm: ORDER BY distance LIMIT n so the ANN index is used
+    distance = Embedding.embedding.cosine_distance(query_embedding)
+    ann = select(Embedding.chunk_id, distance.label("distance"))
+    if collection_id is not None:
+        ann = ann.where(collection_filter(collection_id))
+    ann = ann.order_by(distance).limit(n).subquery("ann")
+
+    # Lexical arm
+    tsquery = lexical_tsquery(query_text)
+    lex_rank = func.ts_rank_cd(Chunk.content_tsv, tsquery)
+    lex = select(Chunk.id.label("chunk_id"), lex_rank.label("score")).where(Chunk.content_tsv.op("@@")(tsquery))
+    if collection_id is not None:
+        lex = lex.join(Document, Chunk.document_id == Document.id).where(Document.collection_id == collection_id)
+    lex = lex.order_by(lex_rank.desc()).limit(n).subquery("lex")
+
+    fused = union_all(
+        select(
+            ann.c.chunk_id,
+            func.row_number().over(order_by=ann.c.distance).label("rank"),
+            ann.c.distance
+        ),
+        select(
+            lex.c.chunk_id,
+            func.row_number().over(order_by=lex.c.score.desc()).label("rank"),
+            null().cast(Float).label("distance")
+        ),
+    ).subquery("fused")
+
+    rrf_score = func.sum(1.0 / (config.HYBRID_RRF_K + fused.c.rank)).label("rrf_score")
+    results = db.execute(
+        select(
+            Chunk.id, Chunk.document_id, Document.filename, Chunk.chunk_index, Chunk.content,
+            rrf_score, func.min(fused.c.distance)
+        )
+        .select_from(fused)
+        .join(Chunk, Chunk.id == fused.c.chunk_id)
+        .join(Document, Chunk.document_id == Document.id)
+        .group_by(Chunk.id, Document.filename)
+        .order_by(rrf_score.desc())
+        .limit(k)
+    ).all()
+
+    return [
+        {
+            "chunk_id": r[0],
+            "document_id": r[1],
+            "filename": r[2],
+            "chunk_index": r[3],
+            "content": r[4],
+            "score": float(r[5]),
+            "distance": float(r[6]) if r[6] is not None else None,
+        }
+        for r in results
+    ]
+
+
+def hybrid_search(
+    db: Session,
+    query_text: str,
+    query_embedding: List[float],
+    k: int = 4,
+    collection: Optional[str] = None,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    candidates: Optional[int] = None
+) -> tuple[List[str], List[str]]:
+    """
+    Hybrid search (see hybrid_search_chunks).
+    Returns (documents, sources) tuple, like similarity_search.
+    """
+    try:
+        hits = hybrid_search_chunks(db, query_text, query_embedding, k, collection, ef_search, probes, candidates)
+        return [h["content"] for h in hits], [h["filename"] for h in hits]
+    except Exception as e:
+        import logging
+        logger = logging.getLogger("app.pg_vector_client")
+        logger.error(f"Hybrid search failed: {e}", exc_info=True)
+        return [], []
+
+
+# ===== ASYNCIO VARIANTS =====
+# The async query path runs the same statements on an AsyncSession:
+# run_sync drives the sync ORM code over the async psycopg connection, so
+# waiting on Postgres yields to the event loop instead of blocking a thread.
+
+async def asearch_chunks(
+    db: AsyncSession,
+    query_embedding: List[float],
+    collection: Optional[str] = None,
+    limit: int = 10,
+    offset: int = 0,
+    max_distance: Optional[float] = None,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    include_vectors: bool = False
+) -> List[dict]:
+    """
+    asyncio search_chunks. SQL runs on the AsyncSession; the brute-force
+    mmap_index scan runs in a worker thread so it does not block the event loop.
+    """
+    import asyncio
+    from app.services import mmap_index
+
+    resolved = await db.run_sync(resolve_collection, collection)
+    if collection is not None and resolved is None:
+        return []
+
+    if resolved is not None:
+        hits = await asyncio.to_thread(
+            mmap_index.search, resolved.id, resolved.content_version, query_embedding, offset + limit, include_vectors
+        )
+        if hits is not None:
+            return await db.run_sync(_mmap_search_results, hits, offset, max_distance, include_vectors)
+
+    return await db.run_sync(
+        _sql_search_chunks, resolved, query_embedding, limit, offset, max_distance, ef_search, probes, include_vectors
+    )
+
+
+async def ahybrid_search_chunks(
+    db: AsyncSession,
+    query_text: str,
+    query_embedding: List[float],
+    k: int = 4,
+    collection: Optional[str] = None,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    candidates: Optional[int] = None
+) -> List[dict]:
+    """asyncio hybrid_search_chunks"""
+    return await db.run_sync(
+        hybrid_search_chunks, query_text, query_embedding, k, collection, ef_search, probes, candidates
+    )
@@ -1,18 +1,41 @@
 # services/qa.py
+import asyncio
 import logging
-from typing import List, Tuple, Optional, Dict
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
 from uuid import UUID
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.core import config
-from app.services.pg_vector_client import get_embedding, get_openai_client, similarity_search
+from app.db.database import AsyncSessionLocal, SessionLocal
+from app.services.pg_vector_client import (
+    ahybrid_search_chunks,
+    asearch_chunks,
+    batch_similarity_search,
+    get_async_openai_client,
+    get_openai_client,
+    hybrid_search_chunks,
+    search_chunks
+)
+from app.services.context_builder import build_context, fetch_neighbors
+from app.services.mmr import attach_vectors, rerank_mmr
+from app.services.query_embedding_cache import aget_query_embedding, get_query_embedding, get_query_embeddings
+from app.services.answer_cache import get_answer_cache, get_collection_version
 from app.services.chat_memory import (
-    get_chat_history,
+    aget_chat_memory,
+    asave_conversation_turn,
+    get_chat_memory,
     save_conversation_turn,
     format_chat_history_for_prompt
 )
 
 logger = logging.getLogger("app.qa")
 
+NO_CONTEXT_ANSWER = "I couldn't find any relevant information in the documents."
+ERROR_ANSWER = "I encountered an error processing your search."
+
 SYSTEM_PROMPT = """You are a helpful Q&A assistant for a knowledge base. Your role is to answer questions based on the provided context from documents.
 
 Guidelines:
@@ -23,67 +46,509 @@ Guidelines:
 5. When referencing information, be clear about what you're basing your answer on."""
 
 
-def answer_query(
+def build_prompt(query: str, context: str, chat_history_text: str = "") -> str:
+    if chat_history_text:
+        return (
+            f"{chat_history_text}\n\nDocument Context:\n{context}"
+            f"\n\nCurrent Question: {query}"
+        )
+    return f"Document Context:\n{context}\n\nQuestion: {query}"
+
+
+def _completion_request(prompt: str) -> Dict:
+    return {
+        "model": "gpt-4o",
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.7,
+        "max_tokens": 1024
+    }
+
+
+def generate_answer(prompt: str) -> str:
+    client = get_openai_client()
+
+    response = client.chat.completions.create(**_completion_request(prompt))
+
+    return response.choices[0].message.content
+
+
+async def agenerate_answer(prompt: str) -> str:
+    """asyncio generate_answer"""
+    response = await get_async_openai_client().chat.completions.create(**_completion_request(prompt))
+
+    return response.choices[0].message.content
+
+
+class _StageTimer:
+    """Wall-clock time per query stage, logged as one line per query"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = (time.perf_counter() - start) * 1000
+
+    async def timed(self, name: str, awaitable):
+        with self.stage(name):
+            return await awaitable
+
+    def log(self, label: str) -> None:
+        total = (time.perf_counter() - self.started) * 1000
+        stages = ", ".join(f"{name}={ms:.0f}ms" for name, ms in self.stages.items())
+        logger.info(f"{label} stages: {stages}, total={total:.0f}ms")
+
+
+class PreparedQuery(NamedTuple):
+    """Retrieval result for a query: the context to answer from, or a ready answer"""
+    context: Optional[str]
+    sources: List[str]
+    answer: Optional[str]  # set when no LLM call is needed (cache hit, no context)
+    query_embedding: object
+    cache_key: Optional[Tuple]
+    cache_variant: str
+
+
+def _cache_variant(k: int, search_mode: str, mmr: bool, mmr_lambda: Optional[float]) -> str:
+    mmr_variant = (config.MMR_LAMBDA if mmr_lambda is None else mmr_lambda) if mmr else "off"
+    return f"k={k};mode={search_mode};mmr={mmr_variant}"
+
+
+def prepare_query(
     query: str,
     collection: str = "default",
     k: int = 4,
     session_id: Optional[UUID] = None,
-    db: Optional[Session] = None
-) -> Tuple[str, List[str]]:
+    db: Optional[Session] = None,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    search_mode: str = "vector",
+    mmr: bool = False,
+    mmr_lambda: Optional[float] = None,
+    query_embedding=None
+) -> PreparedQuery:
     """
-    Answer query using pgvector similarity search.
+    Embed (unless query_embedding is given), check the answer cache, retrieve
+    and pack the context for a query. Chat history is a separate stage
+    (load_history) so callers can run it concurrently.
+    Shared by answer_query, aanswer_query and stream_answer_query.
     """
-    try:
-        # ===== PGVECTOR QUERY =====
-        query_embedding = get_embedding(query)
-        
-        # Perform similarity search using pgvector (searches ALL documents)
-        docs, sources = similarity_search(
-            db=db,
+    # ===== PGVECTOR QUERY =====
+    if query_embedding is None:
+        query_embedding = get_query_embedding(query, db=db)
+
+    cache_key = None
+    cache_variant = _cache_variant(k, search_mode, mmr, mmr_lambda)
+    if config.ANSWER_CACHE_ENABLED and session_id is None and db is not None:
+        cache_key = get_collection_version(db, collection)
+        if cache_key is not None:
+            cached = get_answer_cache().get(cache_key.id, cache_key.content_version, query_embedding, cache_variant)
+            if cached is not None:
+                answer, sources = cached
+                return PreparedQuery(None, sources, answer, query_embedding, None, cache_variant)
+
+    # Retrieve ranked chunks (vector or hybrid), scoped to the collection
+    pool = max(k, config.MMR_POOL_SIZE) if mmr else k
+    if search_mode == "hybrid":
+        hits = hybrid_search_chunks(
+            db,
+            query_text=query,
             query_embedding=query_embedding,
-            k=k
+            k=pool,
+            collection=collection,
+            ef_search=ef_search,
+            probes=probes
+        )
+    else:
+        hits = search_chunks(
+            db,
+            query_embedding,
+            collection=collection,
+            limit=pool,
+            ef_search=ef_search,
+            probes=probes,
+            include_vectors=mmr
         )
-        # ===== END PGVECTOR =====
 
-        context = "\n\n".join(docs)
+    if mmr:
+        hits = rerank_mmr(query_embedding, hits, k, lambda_mult=mmr_lambda, db=db)
+    # ===== END PGVECTOR =====
 
-        if not context:
-            return "I couldn't find any relevant information in the documents.", []
+    # Dedupe, expand strong hits with neighboring chunks, fit the token budget
+    context, sources = build_context(hits, db=db)
 
-        chat_history = []
-        chat_history_text = ""
+    if not context:
+        return PreparedQuery(None, [], NO_CONTEXT_ANSWER, query_embedding, None, cache_variant)
+
+    return PreparedQuery(context, sources, None, query_embedding, cache_key, cache_variant)
 
-        if session_id and db:
-            chat_history = get_chat_history(db, session_id, limit=10)
-            chat_history_text = format_chat_history_for_prompt(chat_history)
 
-        if chat_history_text:
-            prompt = (
-                f"{chat_history_text}\n\nDocument Context:\n{context}"
-                f"\n\nCurrent Question: {query}"
+async def aprepare_query(
+    query: str,
+    query_embedding,
+    collection: str = "default",
+    k: int = 4,
+    session_id: Optional[UUID] = None,
+    db: Optional[AsyncSession] = None,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    search_mode: str = "vector",
+    mmr: bool = False,
+    mmr_lambda: Optional[float] = None
+) -> PreparedQuery:
+    """
+    asyncio prepare_query for an already embedded query. Only SQL runs on the
+    event loop (db.run_sync); the answer-cache scan, the mmap top-k scan, MMR
+    and context packing (token counting, shingling) run in worker threads.
+    """
+    cache_key = None
+    cache_variant = _cache_variant(k, search_mode, mmr, mmr_lambda)
+    if config.ANSWER_CACHE_ENABLED and session_id is None:
+        cache_key = await db.run_sync(get_collection_version, collection)
+        if cache_key is not None:
+            cached = await asyncio.to_thread(
+                get_answer_cache().get, cache_key.id, cache_key.content_version, query_embedding, cache_variant
             )
-        else:
-            prompt = f"Document Context:\n{context}\n\nQuestion: {query}"
-
-        client = get_openai_client()
-
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1024
+            if cached is not None:
+                answer, sources = cached
+                return PreparedQuery(None, sources, answer, query_embedding, None, cache_variant)
+
+    pool = max(k, config.MMR_POOL_SIZE) if mmr else k
+    if search_mode == "hybrid":
+        hits = await ahybrid_search_chunks(
+            db,
+            query_text=query,
+            query_embedding=query_embedding,
+            k=pool,
+            collection=collection,
+            ef_search=ef_search,
+            probes=probes
+        )
+    else:
+        hits = await asearch_chunks(
+            db,
+            query_embedding,
+            collection=collection,
+            limit=pool,
+            ef_search=ef_search,
+            probes=probes,
+            include_vectors=mmr
         )
 
-        answer = response.choices[0].message.content
+    if mmr:
+        if len(hits) > k:
+            await db.run_sync(attach_vectors, hits)
+        hits = await asyncio.to_thread(rerank_mmr, query_embedding, hits, k, mmr_lambda)
+
+    # fetch_neighbors is SQL: hop back to the loop's session from the packing thread
+    loop = asyncio.get_running_loop()
+
+    def fetch_neighbors_on_loop(strong, radius):
+        return asyncio.run_coroutine_threadsafe(db.run_sync(fetch_neighbors, strong, radius), loop).result()
+
+    context, sources = await asyncio.to_thread(build_context, hits, neighbor_fetcher=fetch_neighbors_on_loop)
+
+    if not context:
+        return PreparedQuery(None, [], NO_CONTEXT_ANSWER, query_embedding, None, cache_variant)
+
+    return PreparedQuery(context, sources, None, query_embedding, cache_key, cache_variant)
+
+
+def load_history(db: Optional[Session], session_id: Optional[UUID]) -> str:
+    """
+    Chat memory of a session (rolling summary plus the recent turns),
+    formatted for the prompt ("" without a session)
+    """
+    if not session_id or db is None:
+        return ""
+    summary, messages = get_chat_memory(db, session_id)
+    return format_chat_history_for_prompt(messages, summary)
+
+
+async def aload_history(session_id: Optional[UUID]) -> str:
+    """
+    asyncio load_history on its own session, so it can run while the
+    request's session is busy with embedding and retrieval.
+    """
+    if not session_id:
+        return ""
+    async with AsyncSessionLocal() as history_db:
+        summary, messages = await aget_chat_memory(history_db, session_id)
+    return format_chat_history_for_prompt(messages, summary)
+
+
+def _cache_answer(prepared: PreparedQuery, answer: str) -> None:
+    if prepared.cache_key is not None:
+        get_answer_cache().put(
+            prepared.cache_key.id,
+            prepared.cache_key.content_version,
+            prepared.query_embedding,
+            prepared.cache_variant,
+            answer,
+            prepared.sources
+        )
+
+
+def answer_query(
+    query: str,
+    collection: str = "default",
+    k: int = 4,
+    session_id: Optional[UUID] = None,
+    db: Optional[Session] = None,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    search_mode: str = "vector",
+    mmr: bool = False,
+    mmr_lambda: Optional[float] = None
+) -> Tuple[str, List[str]]:
+    """
+    Answer query using pgvector similarity search.
+    ef_search/probes tune the vector index recall/latency for this query.
+    search_mode "hybrid" fuses full-text and vector rankings (hybrid_search).
+    mmr retrieves a larger pool and keeps k diverse chunks (rerank_mmr).
+    Stateless queries (no session_id) are served from the semantic answer
+    cache when a near-identical question was answered for the same
+    collection content.
+    """
+    timer = _StageTimer()
+
+    try:
+        with timer.stage("embed"):
+            query_embedding = get_query_embedding(query, db=db)
+
+        with timer.stage("retrieve"):
+            prepared = prepare_query(
+                query, collection, k, session_id, db, ef_search, probes, search_mode, mmr, mmr_lambda,
+                query_embedding=query_embedding
+            )
+        if prepared.answer is not None:
+            return prepared.answer, prepared.sources
+
+        with timer.stage("history"):
+            chat_history_text = load_history(db, session_id)
+
+        with timer.stage("generate"):
+            answer = generate_answer(build_prompt(query, prepared.context, chat_history_text))
+
+        with timer.stage("persist"):
+            if session_id and db:
+                save_conversation_turn(db, session_id, query, answer)
+            _cache_answer(prepared, answer)
+
+        timer.log("Query")
+        return answer, prepared.sources
+
+    except Exception as e:
+        logger.error("Query failed: %s", e, exc_info=True)
+        return ERROR_ANSWER, []
+
+
+async def aanswer_query(
+    query: str,
+    collection: str = "default",
+    k: int = 4,
+    session_id: Optional[UUID] = None,
+    db: Optional[AsyncSession] = None,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    search_mode: str = "vector",
+    mmr: bool = False,
+    mmr_lambda: Optional[float] = None
+) -> Tuple[str, List[str]]:
+    """
+    asyncio answer_query: the embedding and completion requests go through
+    AsyncOpenAI and the database work through an AsyncSession, so a query
+    waiting on OpenAI holds no thread. The read transaction is closed before
+    the completion so its pooled connection is not held for the LLM call.
+
+    Stages run concurrently where they are independent: the chat history
+    loads (on its own session) while the query is embedded and retrieved,
+    and retrieval starts as soon as the embedding returns. "history_wait"
+    in the stage log is how long the history held up the prompt.
+    """
+    timer = _StageTimer()
+    history = None
+
+    try:
+        if session_id:
+            history = asyncio.create_task(timer.timed("history", aload_history(session_id)))
+
+        query_embedding = await timer.timed("embed", aget_query_embedding(query, db=db))
+
+        prepared = await timer.timed("retrieve", aprepare_query(
+            query, query_embedding, collection, k, session_id, db, ef_search, probes, search_mode, mmr, mmr_lambda
+        ))
+        await db.commit()
+
+        if prepared.answer is not None:
+            return prepared.answer, prepared.sources
+
+        chat_history_text = ""
+        if history is not None:
+            chat_history_text = await timer.timed("history_wait", history)
+
+        answer = await timer.timed("generate", agenerate_answer(build_prompt(query, prepared.context, chat_history_text)))
 
-        if session_id and db:
-            save_conversation_turn(db, session_id, query, answer)
+        with timer.stage("persist"):
+            if session_id:
+                await asave_conversation_turn(db, session_id, query, answer)
+            _cache_answer(prepared, answer)
 
-        return answer, list(set(sources))
+        timer.log("Query")
+        return answer, prepared.sources
 
     except Exception as e:
         logger.error("Query failed: %s", e, exc_info=True)
-        return "I encountered an error processing your search.", []
+        return ERROR_ANSWER, []
+
+    finally:
+        if history is not None and not history.done():
+            history.cancel()
+
+
+def stream_answer_query(
+    query: str,
+    collection: str = "default",
+    k: int = 4,
+    session_id: Optional[UUID] = None,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    search_mode: str = "vector",
+    mmr: bool = False,
+    mmr_lambda: Optional[float] = None
+) -> Iterator[Tuple[str, Dict]]:
+    """
+    Streaming answer_query. Yields (event, data) pairs:
+        ("sources", {"sources": [...]})  as soon as retrieval finishes
+        ("token", {"text": "..."})       for each completion delta
+        ("done", {"session_id": ...})    after the turn has been persisted
+        ("error", {"message": "..."})    instead of the rest on failure
+    The generator owns its database session, since it outlives the request
+    handler. Closing it early (client disconnect) closes the upstream OpenAI
+    stream and nothing is persisted.
+    """
+    db = SessionLocal()
+    stream = None
+    timer = _StageTimer()
+
+    try:
+        try:
+            with timer.stage("embed"):
+                query_embedding = get_query_embedding(query, db=db)
+            with timer.stage("retrieve"):
+                prepared = prepare_query(
+                    query, collection, k, session_id, db, ef_search, probes, search_mode, mmr, mmr_lambda,
+                    query_embedding=query_embedding
+                )
+        except Exception as e:
+            logger.error("Query failed: %s", e, exc_info=True)
+            yield "error", {"message": ERROR_ANSWER}
+            return
+
+        yield "sources", {"sources": prepared.sources}
+
+        if prepared.answer is not None:
+            yield "token", {"text": prepared.answer}
+            yield "done", {"session_id": str(session_id) if session_id else None}
+            return
+
+        parts: List[str] = []
+        try:
+            # Sources are already on their way to the client; history is only needed for the prompt
+            with timer.stage("history"):
+                chat_history_text = load_history(db, session_id)
+
+            prompt = build_prompt(query, prepared.context, chat_history_text)
+            start = time.perf_counter()
+            stream = get_openai_client().chat.completions.create(**_completion_request(prompt), stream=True)
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if not parts:
+                        timer.stages["first_token"] = (time.perf_counter() - start) * 1000
+                    parts.append(delta)
+                    yield "token", {"text": delta}
+            timer.stages["generate"] = (time.perf_counter() - start) * 1000
+        except Exception as e:
+            logger.error("Streaming completion failed: %s", e, exc_info=True)
+            yield "error", {"message": ERROR_ANSWER}
+            return
+
+        answer = "".join(parts)
+        with timer.stage("persist"):
+            if session_id:
+                save_conversation_turn(db, session_id, query, answer)
+            _cache_answer(prepared, answer)
+        timer.log("Streaming query")
+        yield "done", {"session_id": str(session_id) if session_id else None}
+
+    finally:
+        if stream is not None:
+            stream.close()
+        db.close()
+
+
+def answer_queries_batch(
+    queries: List[str],
+    collection: str = "default",
+    k: int = 4,
+    db: Optional[Session] = None,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    max_concurrency: Optional[int] = None
+) -> List[Dict]:
+    """
+    Answer many stateless queries: one embeddings request, one retrieval
+    statement for all queries, then LLM completions on a bounded thread pool.
+    A failing item gets an error instead of failing the batch.
+    Returns one {"query", "answer", "sources", "error"} dict per query, in order.
+    """
+    results = [{"query": q, "answer": None, "sources": [], "error": None} for q in queries]
+
+    try:
+        query_embeddings = get_query_embeddings(queries, db=db)
+        retrieved = batch_similarity_search(
+            db=db,
+            query_embeddings=query_embeddings,
+            k=k,
+            collection=collection,
+            ef_search=ef_search,
+            probes=probes
+        )
+    except Exception as e:
+        logger.error("Batch retrieval failed: %s", e, exc_info=True)
+        for item in results:
+            item["error"] = "Retrieval failed"
+        return results
+
+    def _answer(i: int) -> None:
+        docs, sources = retrieved[i]
+        context, sources = build_context([{"content": d, "filename": f} for d, f in zip(docs, sources)])
+        if not context:
+            results[i]["answer"] = NO_CONTEXT_ANSWER
+            return
+        results[i]["answer"] = generate_answer(build_prompt(queries[i], context))
+        results[i]["sources"] = sources
+
+    workers = max(1, min(max_concurrency or config.BATCH_QUERY_LLM_CONCURRENCY, len(queries)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-llm") as pool:
+        futures = {pool.submit(_answer, i): i for i in range(len(queries))}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                logger.error("Batch item %d failed: %s", i, e, exc_info=True)
+                results[i]["error"] = str(e)
+
+    return results
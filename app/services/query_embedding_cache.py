@@ -0,0 +1,188 @@
+# services/query_embedding_cache.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core import config
+from app.services.embedding_cache import normalize_text
+
+logger = logging.getLogger("app.query_embedding_cache")
+
+# Rough per-entry overhead of the dict slot, key tuple and ndarray header
+_ENTRY_OVERHEAD_BYTES = 200
+
+
+class QueryEmbeddingCache:
+    """
+    Thread-safe LRU + TTL cache of query embeddings, stored as read-only
+    float32 arrays (6 KB for 1536 dims vs ~50 KB as a list of Python floats).
+    Least recently used entries are evicted once max_bytes is exceeded.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, int, str], Tuple[np.ndarray, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+
+    @staticmethod
+    def key(text: str) -> Tuple[str, int, str]:
+        return (config.EMBED_MODEL, config.EMBED_DIMENSIONS, normalize_text(text))
+
+    @staticmethod
+    def _entry_size(key: Tuple[str, int, str], vector: np.ndarray) -> int:
+        return vector.nbytes + len(key[2]) + _ENTRY_OVERHEAD_BYTES
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = self.key(text)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+
+            vector, expires_at = entry
+            if expires_at <= now:
+                self._remove(key)
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return vector
+
+    def put(self, text: str, embedding) -> np.ndarray:
+        key = self.key(text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector.setflags(write=False)
+        size = self._entry_size(key, vector)
+
+        if size > self.max_bytes:
+            return vector
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (vector, time.monotonic() + self.ttl_seconds)
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats["evicted"] += 1
+
+        return vector
+
+    def _remove(self, key: Tuple[str, int, str]) -> None:
+        vector, _ = self._entries.pop(key)
+        self._bytes -= self._entry_size(key, vector)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        stats["max_bytes"] = self.max_bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+_cache: Optional[QueryEmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_query_embedding_cache() -> QueryEmbeddingCache:
+    global _cache
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = QueryEmbeddingCache(
+                    max_bytes=config.QUERY_EMBED_CACHE_MAX_BYTES,
+                    ttl_seconds=config.QUERY_EMBED_CACHE_TTL_SECONDS
+                )
+
+    return _cache
+
+
+def get_query_embedding(text: str, db: Optional[Session] = None) -> np.ndarray:
+    """
+    Embedding for a search query as a float32 array. Served from the
+    in-process cache when possible; misses go through get_embedding (and so
+    the persistent embedding cache) before being cached here.
+    """
+    from app.services.pg_vector_client import get_embedding
+
+    if not config.QUERY_EMBED_CACHE_ENABLED:
+        return np.asarray(get_embedding(text, db=db), dtype=np.float32)
+
+    cache = get_query_embedding_cache()
+    vector = cache.get(text)
+    if vector is not None:
+        return vector
+
+    return cache.put(text, get_embedding(text, db=db))
+
+
+async def aget_query_embedding(text: str, db: Optional[AsyncSession] = None) -> np.ndarray:
+    """asyncio get_query_embedding"""
+    from app.services.pg_vector_client import aget_embedding
+
+    if not config.QUERY_EMBED_CACHE_ENABLED:
+        return np.asarray(await aget_embedding(text, db=db), dtype=np.float32)
+
+    cache = get_query_embedding_cache()
+    vector = cache.get(text)
+    if vector is not None:
+        return vector
+
+    return cache.put(text, await aget_embedding(text, db=db))
+
+
+def get_query_embeddings(texts: List[str], db: Optional[Session] = None) -> List[np.ndarray]:
+    """
+    Embeddings for many queries. Cache misses are embedded together (each
+    unique text once) in a single embeddings request.
+    """
+    from app.services.pg_vector_client import get_embeddings_batch
+
+    cache = get_query_embedding_cache() if config.QUERY_EMBED_CACHE_ENABLED else None
+    vectors: List[Optional[np.ndarray]] = [cache.get(t) if cache else None for t in texts]
+
+    missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+    if missing:
+        if config.EMBED_CACHE_ENABLED and db is not None:
+            from app.services.embedding_cache import get_embeddings_cached
+            embedded = get_embeddings_cached(db, missing)
+        else:
+            embedded = get_embeddings_batch(missing)
+
+        computed = {
+            text: cache.put(text, e) if cache else np.asarray(e, dtype=np.float32)
+            for text, e in zip(missing, embedded)
+        }
+        vectors = [v if v is not None else computed[t] for t, v in zip(texts, vectors)]
+
+    return vectors
+
+
+def get_query_cache_stats() -> Dict[str, float]:
+    return get_query_embedding_cache().stats()
@@ -1,16 +1,183 @@
 # services/status.py
-import threading
-from typing import Dict
+import logging
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, TypeVar
+from uuid import UUID
 
-_lock = threading.Lock()
-_STATUS_STORE: Dict[str, str] = {}
+from sqlalchemy import func
 
+from app.core import config
+from app.db.database import SessionLocal
+from app.db.models import IngestJob
 
-def set_status(job_id: str, status: str) -> None:
-    with _lock:
-        _STATUS_STORE[job_id] = status
+logger = logging.getLogger("app.status")
+
+_TERMINAL_STATUSES = {"completed", "failed"}
+
+# Which counter each stage's throughput is measured in
+_STAGE_COUNTERS = {
+    "read": "pages_read",
+    "chunk": "chunks_produced",
+    "embed": "chunks_embedded",
+    "store": "rows_written",
+}
+
+T = TypeVar("T")
+
+
+def _parse_job_id(job_id: str) -> Optional[UUID]:
+    try:
+        return UUID(str(job_id))
+    except ValueError:
+        return None
+
+
+def set_status(job_id: str, status: str, error: Optional[str] = None) -> None:
+    """Persist a job status change so every API process and worker sees it"""
+    job_uuid = _parse_job_id(job_id)
+    if job_uuid is None:
+        logger.warning(f"Ignoring status update for invalid job id: {job_id}")
+        return
+
+    values = {"status": status, "updated_at": func.now()}
+    if error is not None:
+        values["error"] = error
+    if status in _TERMINAL_STATUSES:
+        values["finished_at"] = func.now()
+
+    db = SessionLocal()
+    try:
+        db.query(IngestJob).filter(IngestJob.id == job_uuid).update(values, synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        logger.error(f"Failed to set status for job {job_id}: {e}")
+        db.rollback()
+    finally:
+        db.close()
 
 
 def get_status(job_id: str) -> str:
-    with _lock:
-        return _STATUS_STORE.get(job_id, "unknown")
+    job_uuid = _parse_job_id(job_id)
+    if job_uuid is None:
+        return "unknown"
+
+    db = SessionLocal()
+    try:
+        status = db.query(IngestJob.status).filter(IngestJob.id == job_uuid).scalar()
+        return status or "unknown"
+    finally:
+        db.close()
+
+
+def get_job(job_id: str) -> Optional[IngestJob]:
+    """Load the full job row (detached) or None"""
+    job_uuid = _parse_job_id(job_id)
+    if job_uuid is None:
+        return None
+
+    db = SessionLocal()
+    try:
+        job = db.query(IngestJob).filter(IngestJob.id == job_uuid).first()
+        if job is not None:
+            db.expunge(job)
+        return job
+    finally:
+        db.close()
+
+
+def is_stalled(job: IngestJob) -> bool:
+    """A running job whose progress hasn't been updated for INGEST_JOB_STALL_SECONDS"""
+    if job.status != "running" or job.updated_at is None:
+        return False
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=config.INGEST_JOB_STALL_SECONDS)
+    return job.updated_at < cutoff
+
+
+def save_progress(job_id: str, progress: Dict) -> None:
+    """Persist the progress snapshot; also acts as the job's heartbeat"""
+    job_uuid = _parse_job_id(job_id)
+    if job_uuid is None:
+        return
+
+    db = SessionLocal()
+    try:
+        db.query(IngestJob).filter(IngestJob.id == job_uuid).update(
+            {"progress": progress, "updated_at": func.now()},
+            synchronize_session=False
+        )
+        db.commit()
+    except Exception as e:
+        logger.error(f"Failed to save progress for job {job_id}: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+class JobProgress:
+    """
+    Counters and per-stage wall time for one ingest.
+    Stages nest (the chunk stage pulls from the read stage), so timing is
+    exclusive: entering a stage pauses the enclosing one. Snapshots are
+    written to the job row at most every INGEST_PROGRESS_INTERVAL_SECONDS.
+    """
+
+    def __init__(self, job_id: Optional[str] = None):
+        self.job_id = job_id
+        self.counters: Dict[str, int] = {name: 0 for name in _STAGE_COUNTERS.values()}
+        self.seconds: Dict[str, float] = {name: 0.0 for name in _STAGE_COUNTERS}
+        self._stack: List[List] = []  # [stage, mark]
+        self._last_saved = 0.0
+
+    def incr(self, counter: str, n: int = 1) -> None:
+        self.counters[counter] = self.counters.get(counter, 0) + n
+        self.maybe_save()
+
+    @contextmanager
+    def stage(self, name: str):
+        now = time.perf_counter()
+        if self._stack:
+            parent = self._stack[-1]
+            self.seconds[parent[0]] = self.seconds.get(parent[0], 0.0) + now - parent[1]
+        self._stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            stage, mark = self._stack.pop()
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + now - mark
+            if self._stack:
+                self._stack[-1][1] = now
+
+    def timed_iter(self, iterable: Iterable[T], stage: str, counter: str) -> Iterator[T]:
+        """Wrap a generator so time spent producing each item is billed to stage"""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(stage):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            self.incr(counter)
+            yield item
+
+    def to_dict(self) -> Dict:
+        stages = {}
+        for stage, counter in _STAGE_COUNTERS.items():
+            seconds = self.seconds.get(stage, 0.0)
+            items = self.counters.get(counter, 0)
+            stages[stage] = {
+                "seconds": round(seconds, 3),
+                "items": items,
+                "items_per_second": round(items / seconds, 2) if seconds > 0 else 0.0,
+            }
+        return {**self.counters, "stages": stages}
+
+    def maybe_save(self, force: bool = False) -> None:
+        if not self.job_id:
+            return
+        now = time.monotonic()
+        if force or now - self._last_saved >= config.INGEST_PROGRESS_INTERVAL_SECONDS:
+            self._last_saved = now
+            save_progress(self.job_id, self.to_dict())
@@ -0,0 +1,322 @@
+# services/turn_buffer.py
+import itertools
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import OperationalError
+
+from app.core import config
+from app.db.database import SessionLocal
+from app.db.models import ChatMessage, ChatSession
+
+logger = logging.getLogger("app.turn_buffer")
+
+# Upper bound on the flush interval while backing off from a failing database
+_MAX_RETRY_DELAY_SECONDS = 30.0
+# Upper bound on the pause between final flush attempts on shutdown
+_MAX_SHUTDOWN_RETRY_DELAY_SECONDS = 2.0
+
+
+class ConversationTurnBuffer:
+    """
+    Write-behind buffer for conversation turns.
+
+    add() only appends to an in-memory list, so answering a query does not
+    wait on the database. A background thread flushes the pending messages
+    every flush_interval seconds, or as soon as max_pending_turns are queued,
+    with one multi-row INSERT and one UPDATE of the sessions' last_activity.
+    created_at comes from the database clock at flush time, as with a
+    synchronous save: the turns of a batch get now() plus one microsecond per
+    turn in queue order, and both messages of a turn share the timestamp.
+    Messages get their id when queued, so readers can merge unflushed messages
+    (pending_for, in queue order, without created_at) with stored ones without
+    duplicates.
+
+    If the batch INSERT fails, the rows are inserted one by one and rows the
+    database rejects are dropped (and logged), so one bad message cannot block
+    the rest. When the database is unreachable the batch stays queued and is
+    retried with backoff, each message at most max_retries times. At most
+    max_queued_turns are held; add() returns False beyond that and the caller
+    saves the turn synchronously.
+    Unflushed turns are visible to this process only.
+    """
+
+    def __init__(self, flush_interval: float, max_pending_turns: int, max_queued_turns: int, max_retries: int):
+        self.flush_interval = flush_interval
+        self.max_pending_turns = max_pending_turns
+        self.max_queued_turns = max(max_queued_turns, max_pending_turns)
+        self.max_retries = max_retries
+        self._pending: List[Dict] = []
+        self._in_flight: List[Dict] = []
+        self._attempts: Dict[uuid.UUID, int] = {}  # failed flushes per queued message id
+        self._turns = itertools.count()  # queue order of turns
+        self._failures = 0  # consecutive flushes that had to retry messages
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {
+            "turns": 0, "flushes": 0, "flushed_messages": 0, "failed_flushes": 0,
+            "dropped_messages": 0, "overflow_turns": 0
+        }
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="turn-buffer-flush", daemon=True)
+            self._thread.start()
+
+    def add(self, session_id: uuid.UUID, user_query: str, assistant_response: str) -> bool:
+        """Queue a turn; False when the buffer is full and the turn was not queued"""
+        with self._lock:
+            if self._stopped.is_set():
+                raise RuntimeError("Conversation turn buffer is shut down")
+            self._ensure_thread()
+            if len(self._pending) + len(self._in_flight) >= self.max_queued_turns * 2:
+                self._stats["overflow_turns"] += 1
+                self._wake.set()
+                return False
+            turn = next(self._turns)
+            self._pending.extend([
+                {"id": uuid.uuid4(), "session_id": session_id, "role": "user", "content": user_query, "turn": turn},
+                {"id": uuid.uuid4(), "session_id": session_id, "role": "assistant", "content": assistant_response, "turn": turn},
+            ])
+            self._stats["turns"] += 1
+            full = len(self._pending) >= self.max_pending_turns * 2
+
+        if full:
+            self._wake.set()
+        return True
+
+    def pending_for(self, session_id: uuid.UUID) -> List[ChatMessage]:
+        """
+        Unflushed messages of one session (transient ChatMessage objects
+        without created_at), in queue order
+        """
+        with self._lock:
+            rows = [r for r in self._in_flight + self._pending if r["session_id"] == session_id]
+        rows.sort(key=lambda r: r["turn"])  # stable: user before assistant
+        return [
+            ChatMessage(id=r["id"], session_id=r["session_id"], role=r["role"], content=r["content"])
+            for r in rows
+        ]
+
+    def discard(self, session_id: uuid.UUID) -> None:
+        """Drop a session's unflushed messages (the session is being deleted)"""
+        with self._lock:
+            for row in self._pending:
+                if row["session_id"] == session_id:
+                    self._attempts.pop(row["id"], None)
+            self._pending = [r for r in self._pending if r["session_id"] != session_id]
+
+    @staticmethod
+    def _stamp(db, rows: List[Dict]) -> List[Dict]:
+        """Column values for rows, created_at from the database clock, one microsecond apart per turn"""
+        now = db.execute(select(func.now())).scalar()
+        offsets = {turn: i for i, turn in enumerate(sorted({r["turn"] for r in rows}))}
+        return [
+            {
+                "id": r["id"], "session_id": r["session_id"], "role": r["role"], "content": r["content"],
+                "created_at": now + timedelta(microseconds=offsets[r["turn"]])
+            }
+            for r in rows
+        ]
+
+    @staticmethod
+    def _touch_sessions(db, session_ids) -> None:
+        db.execute(
+            update(ChatSession)
+            .where(ChatSession.session_id.in_(list(session_ids)))
+            .values(last_activity=func.now())
+        )
+
+    def _insert_rows(self, db, rows: List[Dict], values: List[Dict]) -> Tuple[int, List[Dict]]:
+        """
+        Insert rows (with their stamped column values) one transaction each
+        after a failed batch. Rows the database rejects are dropped; returns
+        (stored, rows to retry).
+        """
+        stored = 0
+        retry: List[Dict] = []
+        sessions = set()
+
+        for row, value in zip(rows, values):
+            try:
+                db.execute(insert(ChatMessage).values(value))
+                db.commit()
+                stored += 1
+                sessions.add(row["session_id"])
+            except OperationalError:
+                db.rollback()
+                retry.append(row)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Dropped buffered {row['role']} message {row['id']} of session {row['session_id']}: {e}")
+                with self._lock:
+                    self._stats["dropped_messages"] += 1
+
+        if sessions:
+            try:
+                self._touch_sessions(db, sessions)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Failed to update last_activity of {len(sessions)} sessions: {e}")
+
+        return stored, retry
+
+    def _settle(self, batch: List[Dict], stored: int, retry: List[Dict]) -> None:
+        """Clear the in-flight batch, requeueing `retry` ahead of newer messages"""
+        retry_ids = {r["id"] for r in retry}
+        expired: List[Dict] = []
+
+        with self._lock:
+            requeue = []
+            for row in retry:
+                attempts = self._attempts.get(row["id"], 0) + 1
+                if attempts > self.max_retries:
+                    self._attempts.pop(row["id"], None)
+                    expired.append(row)
+                else:
+                    self._attempts[row["id"]] = attempts
+                    requeue.append(row)
+            for row in batch:
+                if row["id"] not in retry_ids:
+                    self._attempts.pop(row["id"], None)
+
+            self._pending = requeue + self._pending
+            self._in_flight = []
+            self._failures = self._failures + 1 if retry else 0
+            self._stats["flushes"] += 1
+            self._stats["flushed_messages"] += stored
+            self._stats["dropped_messages"] += len(expired)
+            if retry:
+                self._stats["failed_flushes"] += 1
+
+        if expired:
+            logger.error(f"Dropped {len(expired)} buffered chat messages after {self.max_retries} failed flushes")
+
+    def flush(self) -> int:
+        """Write all pending messages; returns how many were stored"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                self._in_flight, self._pending = self._pending, []
+                batch = self._in_flight
+
+            db = SessionLocal()
+            rows = batch
+            values: List[Dict] = []
+            stored = 0
+            retry: List[Dict] = []
+            try:
+                session_ids = list({r["session_id"] for r in batch})
+                existing = set(db.execute(
+                    select(ChatSession.session_id).where(ChatSession.session_id.in_(session_ids))
+                ).scalars())
+
+                rows = [r for r in batch if r["session_id"] in existing]
+                if len(rows) < len(batch):
+                    logger.warning(f"Dropped {len(batch) - len(rows)} buffered messages of deleted sessions")
+                    with self._lock:
+                        self._stats["dropped_messages"] += len(batch) - len(rows)
+
+                if rows:
+                    values = self._stamp(db, rows)
+                    db.execute(insert(ChatMessage).values(values))
+                    self._touch_sessions(db, existing)
+                db.commit()
+                stored = len(rows)
+            except OperationalError as e:
+                # The database is unreachable, not the rows at fault: keep them all queued
+                db.rollback()
+                logger.error(f"Failed to flush {len(batch)} buffered chat messages: {e}")
+                retry = rows
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Batch insert of {len(rows)} buffered chat messages failed, inserting one by one: {e}")
+                if values:
+                    stored, retry = self._insert_rows(db, rows, values)
+                else:
+                    # Failed before the rows were stamped; nothing points at a bad row
+                    retry = rows
+            finally:
+                db.close()
+
+            self._settle(batch, stored, retry)
+            return stored
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            with self._lock:
+                # Back off while the database keeps failing
+                delay = min(self.flush_interval * 2 ** self._failures, _MAX_RETRY_DELAY_SECONDS)
+            self._wake.wait(delay)
+            self._wake.clear()
+            self.flush()
+
+    def shutdown(self) -> None:
+        """
+        Stop the flush thread and write whatever is still queued, retrying
+        while the database is unreachable (up to max_retries attempts)
+        """
+        with self._lock:
+            self._stopped.set()
+            thread = self._thread
+        self._wake.set()
+        if thread is not None:
+            thread.join()
+
+        flushed = 0
+        for attempt in range(max(self.max_retries, 1)):
+            if attempt:
+                time.sleep(min(0.1 * 2 ** attempt, _MAX_SHUTDOWN_RETRY_DELAY_SECONDS))
+            flushed += self.flush()
+            with self._lock:
+                remaining = len(self._pending)
+            if not remaining:
+                break
+
+        if flushed:
+            logger.info(f"Flushed {flushed} buffered chat messages on shutdown")
+        if remaining:
+            logger.error(f"Lost {remaining} buffered chat messages on shutdown: the database stayed unreachable")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending_messages"] = len(self._pending) + len(self._in_flight)
+        return stats
+
+
+_buffer: Optional[ConversationTurnBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def get_turn_buffer() -> ConversationTurnBuffer:
+    global _buffer
+
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = ConversationTurnBuffer(
+                    flush_interval=config.CHAT_WRITE_BEHIND_INTERVAL_SECONDS,
+                    max_pending_turns=config.CHAT_WRITE_BEHIND_MAX_TURNS,
+                    max_queued_turns=config.CHAT_WRITE_BEHIND_MAX_QUEUED_TURNS,
+                    max_retries=config.CHAT_WRITE_BEHIND_MAX_RETRIES
+                )
+
+    return _buffer
+
+
+def shutdown_turn_buffer() -> None:
+    """Flush queued turns before the process exits"""
+    with _buffer_lock:
+        if _buffer is not None:
+            _buffer.shutdown()
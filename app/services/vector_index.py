@@ -0,0 +1,150 @@
+# services/vector_index.py
+import logging
+import math
+import threading
+import uuid
+from typing import Dict, Optional, Union
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core import config
+from app.db.database import engine
+
+logger = logging.getLogger("app.vector_index")
+
+GLOBAL_INDEX_NAMES = ("idx_embeddings_vector_hnsw", "idx_embeddings_vector_ivfflat")
+
+# pgvector's upper bound for hnsw.ef_search
+MAX_EF_SEARCH = 1000
+
+
+def collection_index_name(collection_id: Union[str, uuid.UUID]) -> str:
+    """Name of the partial vector index covering one collection's embeddings"""
+    return f"idx_embeddings_vec_{uuid.UUID(str(collection_id)).hex}"
+
+
+def create_collection_index(collection_id: Union[str, uuid.UUID]) -> None:
+    """
+    Build a partial HNSW index over embeddings WHERE collection_id = <id>.
+    HNSW needs no training data, so the index is useful from the first row
+    (use rebuild_ivfflat_index once a collection is loaded to switch it).
+    Built CONCURRENTLY on an autocommit connection so ingest keeps writing.
+    """
+    collection_uuid = uuid.UUID(str(collection_id))
+    name = collection_index_name(collection_uuid)
+
+    # The id is a parsed UUID, so inlining it is safe; it must be a literal
+    # for the planner to match the index predicate.
+    sql = (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+        f"ON embeddings USING hnsw (embedding vector_cosine_ops) "
+        f"WITH (m = {int(config.HNSW_M)}, ef_construction = {int(config.HNSW_EF_CONSTRUCTION)}) "
+        f"WHERE collection_id = '{collection_uuid}'"
+    )
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(sql))
+
+    logger.info(f"Created vector index {name} for collection {collection_uuid}")
+
+
+def drop_collection_index(collection_id: Union[str, uuid.UUID]) -> None:
+    name = collection_index_name(collection_id)
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+    logger.info(f"Dropped vector index {name}")
+
+
+def ivfflat_lists_for_rows(rows: int) -> int:
+    """pgvector guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond"""
+    if rows <= 1_000_000:
+        return max(1, rows // 1000)
+    return int(math.sqrt(rows))
+
+
+def count_index_rows(collection_id: Optional[Union[str, uuid.UUID]] = None) -> int:
+    with engine.connect() as conn:
+        if collection_id is None:
+            return conn.execute(text("SELECT count(*) FROM embeddings")).scalar() or 0
+        return conn.execute(
+            text("SELECT count(*) FROM embeddings WHERE collection_id = :cid"),
+            {"cid": uuid.UUID(str(collection_id))}
+        ).scalar() or 0
+
+
+def rebuild_ivfflat_index(collection_id: Optional[Union[str, uuid.UUID]] = None, lists: Optional[int] = None) -> Dict:
+    """
+    Rebuild the global (or one collection's partial) vector index as ivfflat
+    with lists sized to the current row count. The new index is built with
+    CREATE INDEX CONCURRENTLY under a temporary name, then swapped in, so
+    reads and writes continue throughout.
+    """
+    rows = count_index_rows(collection_id)
+    lists = lists or ivfflat_lists_for_rows(rows)
+
+    if collection_id is None:
+        final_name = "idx_embeddings_vector_ivfflat"
+        old_names = GLOBAL_INDEX_NAMES
+        predicate = ""
+    else:
+        collection_uuid = uuid.UUID(str(collection_id))
+        final_name = collection_index_name(collection_uuid)
+        old_names = (final_name,)
+        predicate = f" WHERE collection_id = '{collection_uuid}'"
+
+    tmp_name = f"{final_name[:55]}_rebuild"
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {tmp_name}"))
+        conn.execute(text(
+            f"CREATE INDEX CONCURRENTLY {tmp_name} ON embeddings "
+            f"USING ivfflat (embedding vector_cosine_ops) WITH (lists = {int(lists)}){predicate}"
+        ))
+        for name in old_names:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(text(f"ALTER INDEX {tmp_name} RENAME TO {final_name}"))
+
+    logger.info(f"Rebuilt {final_name} as ivfflat with lists={lists} over {rows} rows")
+    return {"index": final_name, "rows": rows, "lists": lists}
+
+
+def apply_search_settings(
+    db: Session,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    k: int = 0
+) -> None:
+    """
+    Set hnsw.ef_search / ivfflat.probes for the current transaction only.
+    ef_search is raised to at least k, otherwise HNSW can return fewer than k rows,
+    but never past MAX_EF_SEARCH, which pgvector rejects.
+    """
+    ef_search = min(max(int(ef_search or config.HNSW_EF_SEARCH), int(k)), MAX_EF_SEARCH)
+    probes = int(probes or config.IVFFLAT_PROBES)
+
+    db.execute(
+        text("SELECT set_config('hnsw.ef_search', :ef, true), set_config('ivfflat.probes', :probes, true)"),
+        {"ef": str(ef_search), "probes": str(probes)}
+    )
+
+
+def _run_in_background(target, collection_id, action: str) -> None:
+    def _run():
+        try:
+            target(collection_id)
+        except Exception as e:
+            logger.error(f"Failed to {action} vector index for collection {collection_id}: {e}", exc_info=True)
+
+    threading.Thread(target=_run, name=f"vector-index-{action}", daemon=True).start()
+
+
+def ensure_collection_index_async(collection_id: Union[str, uuid.UUID]) -> None:
+    """Create the collection's partial index without blocking the caller"""
+    _run_in_background(create_collection_index, collection_id, "create")
+
+
+def drop_collection_index_async(collection_id: Union[str, uuid.UUID]) -> None:
+    _run_in_background(drop_collection_index, collection_id, "drop")
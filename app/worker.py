@@ -0,0 +1,103 @@
+# app/worker.py
+"""
+Standalone ingest worker.
+
+    python -m app.worker --concurrency 2
+
+Each worker thread claims queued jobs from the ingest_jobs table and runs
+ingest_pdf_file on them. Run as many worker processes as needed; jobs are
+claimed with SELECT ... FOR UPDATE SKIP LOCKED so they never double-process.
+"""
+import argparse
+import logging
+import signal
+import threading
+
+from app.core import config
+from app.db.database import SessionLocal
+from app.logging_config import configure_logging
+from app.services.embedding_cache import flush_writes
+from app.services.ingest import ingest_pdf_file
+from app.services.job_queue import claim_next_job, default_worker_id, requeue_stale_jobs
+from app.services.pdf_extract import shutdown_extract_pool
+
+logger = logging.getLogger("app.worker")
+
+
+def _worker_loop(worker_id: str, stop: threading.Event, poll_seconds: float) -> None:
+    while not stop.is_set():
+        db = SessionLocal()
+        try:
+            job = claim_next_job(db, worker_id)
+            if job is not None:
+                job_id, file_path, filename, collection, content_hash = (
+                    str(job.id), job.file_path, job.filename, job.collection_name, job.content_hash
+                )
+        except Exception as e:
+            logger.error(f"[{worker_id}] Failed to claim job: {e}", exc_info=True)
+            db.rollback()
+            job = None
+        finally:
+            db.close()
+
+        if job is None:
+            stop.wait(poll_seconds)
+            continue
+
+        logger.info(f"[{worker_id}] Processing job {job_id} ({filename})")
+        ingest_pdf_file(file_path, collection, job_id, filename=filename, content_hash=content_hash)
+
+
+def _recover_loop(stop: threading.Event) -> None:
+    """Periodically requeue jobs whose worker died mid-ingest"""
+    interval = max(30, config.INGEST_JOB_STALE_SECONDS // 4)
+    while not stop.is_set():
+        db = SessionLocal()
+        try:
+            requeue_stale_jobs(db)
+        except Exception as e:
+            logger.error(f"Stale job recovery failed: {e}", exc_info=True)
+            db.rollback()
+        finally:
+            db.close()
+        stop.wait(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ingest worker")
+    parser.add_argument("--concurrency", type=int, default=config.INGEST_WORKER_CONCURRENCY)
+    parser.add_argument("--poll-seconds", type=float, default=config.INGEST_WORKER_POLL_SECONDS)
+    args = parser.parse_args()
+
+    configure_logging()
+    stop = threading.Event()
+
+    def _handle_signal(signum, frame):
+        logger.info("Received signal %s, finishing in-flight jobs...", signum)
+        stop.set()
+
+    signal.signal(signal.SIGTERM, _handle_signal)
+    signal.signal(signal.SIGINT, _handle_signal)
+
+    base_id = default_worker_id()
+    threads = [threading.Thread(target=_recover_loop, args=(stop,), name="recover", daemon=True)]
+    for i in range(max(1, args.concurrency)):
+        threads.append(threading.Thread(
+            target=_worker_loop,
+            args=(f"{base_id}-{i}", stop, args.poll_seconds),
+            name=f"ingest-{i}",
+        ))
+
+    logger.info("Ingest worker %s started with concurrency=%d", base_id, args.concurrency)
+    for t in threads:
+        t.start()
+    for t in threads[1:]:
+        t.join()
+
+    shutdown_extract_pool()
+    flush_writes()
+    logger.info("Ingest worker %s stopped", base_id)
+
+
+if __name__ == "__main__":
+    main()
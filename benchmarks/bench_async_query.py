@@ -0,0 +1,202 @@
+"""
+Concurrency of the sync vs asyncio /api/query path under load.
+
+Drives the real /api/query route (aanswer_query: AsyncOpenAI, the async DB
+pool, CPU-bound retrieval steps in worker threads) and, as the baseline, the
+same request through the sync handler it replaced (answer_query on the sync
+pool, run in Starlette's threadpool), in-process over ASGI with
+`--concurrency` simultaneous clients.
+
+Only OpenAI is faked (benchmarks/fake_embeddings_server.py, in its own
+process). Retrieval runs against the Postgres in DATABASE_URL (migrated with
+`alembic upgrade head`) on a throwaway collection seeded with --chunks
+synthetic chunks, removed afterwards. Every request asks a distinct question,
+so the answer and query-embedding caches miss and each request embeds,
+retrieves and generates.
+
+`--stage embed` needs no database: it drives only the query-embedding step
+of each route (get_embedding in Starlette's threadpool vs aget_embedding on
+the event loop), with the embedding cache off.
+
+    python -m benchmarks.bench_async_query --requests 600 --concurrency 200 --latency 2
+    python -m benchmarks.bench_async_query --stage embed --requests 400 --concurrency 200 --latency 0.5
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import time
+import uuid
+
+from benchmarks.fake_embeddings_server import _vector, start_server
+
+
+def _serve(port_queue, latency: float, dim: int) -> None:
+    server = start_server(latency=latency, dim=dim)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def _seed(collection: str, n_chunks: int) -> uuid.UUID:
+    from app.core import config
+    from app.db.database import SessionLocal
+    from app.db.models import Collection, Document
+    from app.services.pg_vector_client import store_embeddings_batch
+
+    db = SessionLocal()
+    try:
+        collection_row = Collection(id=uuid.uuid4(), name=collection)
+        document = Document(id=uuid.uuid4(), collection_id=collection_row.id, filename="bench.pdf")
+        db.add_all([collection_row, document])
+        db.flush()
+
+        texts = [f"Benchmark chunk {i}: " + " ".join(f"term{(i * 7 + j) % 997}" for j in range(120)) for i in range(n_chunks)]
+        embeddings = [_vector(t, config.EMBED_DIMENSIONS) for t in texts]
+        store_embeddings_batch(db, texts, embeddings, str(document.id), commit=False, collection_id=collection_row.id)
+        db.commit()
+        return collection_row.id
+    finally:
+        db.close()
+
+
+def _drop(collection_id: uuid.UUID) -> None:
+    from app.db.database import SessionLocal
+    from app.db.models import Collection, Document
+
+    db = SessionLocal()
+    try:
+        # Chunks and embeddings go with the document (ON DELETE CASCADE)
+        db.query(Document).filter(Document.collection_id == collection_id).delete(synchronize_session=False)
+        db.query(Collection).filter(Collection.id == collection_id).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def _drive(app, path: str, collection: str, requests: int, concurrency: int) -> float:
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300.0) as client:
+        async def _one(i: int):
+            async with semaphore:
+                response = await client.post(path, json={
+                    "query": f"What does the benchmark say about term{i % 997} ({path} #{i})?",
+                    "collection": collection,
+                })
+                response.raise_for_status()
+                if response.json()["answer"] != "A fake answer.":
+                    raise RuntimeError(f"{path} did not generate an answer: {response.json()['answer']!r}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(_one(i) for i in range(requests)))
+        return time.perf_counter() - start
+
+
+async def _drive_embed(mode: str, requests: int, concurrency: int) -> float:
+    import anyio
+    from app.services.pg_vector_client import aget_embedding, get_embedding
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _one(i: int):
+        async with semaphore:
+            text = f"What does the benchmark say about term{i % 997} ({mode} #{i})?"
+            if mode == "sync":
+                # Where a sync route runs: anyio's default thread limiter (40 threads)
+                await anyio.to_thread.run_sync(get_embedding, text)
+            else:
+                await aget_embedding(text)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(_one(i) for i in range(requests)))
+    return time.perf_counter() - start
+
+
+def _report(args, runs) -> None:
+    results = {}
+    for name, drive in runs:
+        elapsed = asyncio.run(drive())
+        results[name] = elapsed
+        throughput = args.requests / elapsed
+        print(f"{name:<18} {elapsed:7.2f}s  {throughput:8.1f} req/s")
+
+    (sync_name, _), (async_name, _) = runs
+    print(f"speedup: {results[sync_name] / results[async_name]:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=2.0)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--stage", choices=("query", "embed"), default="query")
+    args = parser.parse_args()
+
+    # Own process, so the fake server does not compete with the app for the GIL
+    dim = int(os.getenv("EMBED_DIMENSIONS", "1536"))
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve, args=(port_queue, args.latency, dim), daemon=True)
+    server.start()
+    port = port_queue.get(timeout=10)
+
+    # Config is read at import time, so point the app at the fake server first
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    os.environ.setdefault("OPENAI_MAX_CONNECTIONS", str(max(args.concurrency, 1)))
+    os.environ["ANSWER_CACHE_ENABLED"] = "false"
+
+    if args.stage == "embed":
+        os.environ["EMBED_CACHE_ENABLED"] = "false"
+        print(
+            f"{args.requests} query embeddings, {args.concurrency} concurrent clients, "
+            f"{args.latency * 1000:.0f} ms OpenAI latency"
+        )
+        print(f"ideal: {args.concurrency / args.latency:8.1f} req/s")
+        try:
+            _report(args, [
+                ("sync threadpool", lambda: _drive_embed("sync", args.requests, args.concurrency)),
+                ("async", lambda: _drive_embed("async", args.requests, args.concurrency)),
+            ])
+        finally:
+            server.terminate()
+        return
+
+    from fastapi import Depends
+    from sqlalchemy.orm import Session
+    from app.db.database import get_db
+    from app.main import app
+    from app.schemas.schemas import QueryRequest, QueryResponse
+    from app.services.qa import answer_query
+
+    @app.post("/bench/query-sync", response_model=QueryResponse)
+    def query_sync(payload: QueryRequest, db: Session = Depends(get_db)):
+        """The sync /api/query handler, for comparison"""
+        answer, sources = answer_query(payload.query, collection=payload.collection, k=payload.k, db=db)
+        return QueryResponse(answer=answer, sources=sources)
+
+    collection = f"bench-async-{uuid.uuid4().hex[:8]}"
+    collection_id = _seed(collection, args.chunks)
+
+    ideal = args.concurrency / args.latency
+    print(
+        f"{args.requests} requests, {args.concurrency} concurrent clients, "
+        f"{args.latency * 1000:.0f} ms OpenAI latency, {args.chunks} chunks"
+    )
+    print(f"ideal (2 OpenAI calls per request): {ideal / 2:8.1f} req/s")
+
+    try:
+        _report(args, [
+            (path, lambda path=path: _drive(app, path, collection, args.requests, args.concurrency))
+            for path in ("/bench/query-sync", "/api/query")
+        ])
+    finally:
+        _drop(collection_id)
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
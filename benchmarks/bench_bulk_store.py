@@ -0,0 +1,78 @@
+"""
+Compare the bulk COPY writer against the old per-chunk ORM add/flush loop.
+
+Needs a migrated database (DATABASE_URL). Every run happens inside a
+transaction that is rolled back, so nothing is left behind.
+
+    python -m benchmarks.bench_bulk_store --chunks 2000
+"""
+import argparse
+import random
+import time
+import uuid
+
+from app.core import config
+from app.db.database import SessionLocal
+from app.db.models import Chunk, Collection, Document, Embedding
+from app.services.pg_vector_client import store_embeddings_batch
+
+
+def orm_loop(db, chunks, embeddings, document_id):
+    """The previous store_embeddings_batch body: one flush per chunk"""
+    for idx, (chunk_text, embedding_vector) in enumerate(zip(chunks, embeddings)):
+        chunk = Chunk(id=uuid.uuid4(), document_id=uuid.UUID(document_id), content=chunk_text, chunk_index=idx)
+        db.add(chunk)
+        db.flush()
+        db.add(Embedding(
+            chunk_id=chunk.id,
+            document_id=uuid.UUID(document_id),
+            embedding=embedding_vector,
+            embedding_model=config.EMBED_MODEL,
+            text_preview=chunk_text[:200]
+        ))
+    db.flush()
+    return len(chunks)
+
+
+def bulk(db, chunks, embeddings, document_id):
+    return store_embeddings_batch(db, chunks, embeddings, document_id, commit=False)
+
+
+def run(writer, chunks, embeddings) -> float:
+    db = SessionLocal()
+    try:
+        collection = Collection(id=uuid.uuid4(), name=f"bench-{uuid.uuid4().hex[:8]}")
+        document = Document(id=uuid.uuid4(), collection_id=collection.id, filename="bench.pdf")
+        db.add_all([collection, document])
+        db.flush()
+
+        start = time.perf_counter()
+        stored = writer(db, chunks, embeddings, str(document.id))
+        elapsed = time.perf_counter() - start
+
+        assert stored == len(chunks)
+        return elapsed
+    finally:
+        db.rollback()
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=2000)
+    args = parser.parse_args()
+
+    chunks = [f"chunk {i} " + "lorem ipsum " * 80 for i in range(args.chunks)]
+    embeddings = [[random.random() for _ in range(1536)] for _ in range(args.chunks)]
+
+    orm_s = run(orm_loop, chunks, embeddings)
+    bulk_s = run(bulk, chunks, embeddings)
+
+    print(f"chunks={args.chunks}")
+    print(f"orm loop:    {orm_s:7.2f}s  {args.chunks / orm_s:8.0f} rows/s")
+    print(f"bulk writer: {bulk_s:7.2f}s  {args.chunks / bulk_s:8.0f} rows/s")
+    print(f"speedup:     {orm_s / bulk_s:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
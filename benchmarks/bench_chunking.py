@@ -0,0 +1,64 @@
+"""
+Micro-benchmark for the token chunker on a synthetic manual.
+
+Chunking must stay far below embedding time; for reference, embedding the
+same chunks costs roughly one API round trip (100-300 ms) per batch.
+
+    python -m benchmarks.bench_chunking --pages 400
+"""
+import argparse
+import random
+import time
+
+from app.services.chunking import iter_token_chunks
+
+_WORDS = (
+    "torque valve assembly bracket sensor calibrate replace inspect warning "
+    "caution error code E-1042 part BWM-55120 hydraulic pressure nominal "
+    "tolerance clockwise counter-clockwise mounting bolt gasket seal"
+).split()
+
+
+def make_pages(pages: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    out = []
+    for _ in range(pages):
+        paragraphs = []
+        for _ in range(rng.randint(3, 7)):
+            sentences = [
+                " ".join(rng.choice(_WORDS) for _ in range(rng.randint(6, 24))).capitalize() + "."
+                for _ in range(rng.randint(2, 8))
+            ]
+            # PDF extraction wraps lines at ~80 chars
+            text = " ".join(sentences)
+            paragraphs.append("\n".join(text[i:i + 80] for i in range(0, len(text), 80)))
+        out.append("\n\n".join(paragraphs))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--chunk-tokens", type=int, default=300)
+    parser.add_argument("--overlap-tokens", type=int, default=50)
+    args = parser.parse_args()
+
+    pages = make_pages(args.pages)
+    n_chars = sum(len(p) for p in pages)
+
+    # Warm up the encoder (loads BPE ranks)
+    list(iter_token_chunks(pages[:1], args.chunk_tokens, args.overlap_tokens))
+
+    start = time.perf_counter()
+    chunks = list(iter_token_chunks(pages, args.chunk_tokens, args.overlap_tokens))
+    elapsed = time.perf_counter() - start
+
+    tokens = [c.token_count for c in chunks]
+    print(f"pages={args.pages} chars={n_chars:,} chunks={len(chunks)}")
+    print(f"tokens/chunk: min={min(tokens)} avg={sum(tokens) / len(tokens):.0f} max={max(tokens)}")
+    print(f"chunking: {elapsed * 1000:8.1f} ms total, {elapsed * 1000 / args.pages:.2f} ms/page, "
+          f"{len(chunks) / elapsed:,.0f} chunks/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Compare serial vs concurrent embedding throughput against the fake server.
+
+    python -m benchmarks.bench_embedding_executor --chunks 2000 --concurrency 8
+"""
+import argparse
+import os
+import time
+
+from benchmarks.fake_embeddings_server import start_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--batch-inputs", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--throttle-every", type=int, default=0)
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency, throttle_every=args.throttle_every)
+
+    # Config is read at import time, so point the app at the fake server first
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    os.environ["EMBED_BATCH_MAX_INPUTS"] = str(args.batch_inputs)
+
+    from app.services.embedding_executor import EmbeddingExecutor
+
+    texts = [f"chunk {i}: " + "lorem ipsum dolor sit amet " * 30 for i in range(args.chunks)]
+
+    results = {}
+    for concurrency in (1, args.concurrency):
+        executor = EmbeddingExecutor(max_concurrency=concurrency)
+        start = time.perf_counter()
+        vectors = executor.embed(texts)
+        elapsed = time.perf_counter() - start
+        executor.shutdown()
+        assert len(vectors) == len(texts)
+        results[concurrency] = elapsed
+        print(f"concurrency={concurrency:<3} {elapsed:7.2f}s  {len(texts) / elapsed:8.1f} chunks/s")
+
+    print(f"speedup: {results[1] / results[args.concurrency]:.1f}x")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Serial vs process-pool PDF text extraction on a generated multi-hundred-page PDF.
+
+    python -m benchmarks.bench_pdf_extract --pages 400 --workers 4
+"""
+import argparse
+import os
+import tempfile
+import time
+
+
+def make_fixture(path: str, pages: int, lines_per_page: int = 45) -> None:
+    """Write a plain text-only PDF with `pages` pages (no external dependencies)"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+
+    for p in range(pages):
+        lines = [
+            f"({'Page %d line %d: torque spec 45 Nm, error code E-%04d, part BWM-%05d' % (p + 1, i, p * 7 + i, p * 13 + i)}) Tj 0 -14 Td"
+            for i in range(lines_per_page)
+        ]
+        stream = ("BT /F1 10 Tf 40 800 Td " + " ".join(lines) + " ET").encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+
+    kids = b" ".join(b"%d 0 R" % ref for ref in page_refs)
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % pages
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_at)
+
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--shard-pages", type=int, default=25)
+    args = parser.parse_args()
+
+    os.environ["PDF_EXTRACT_WORKERS"] = str(args.workers)
+    os.environ["PDF_EXTRACT_SHARD_PAGES"] = str(args.shard_pages)
+
+    from app.services import pdf_extract
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fixture.pdf")
+        make_fixture(path, args.pages)
+
+        start = time.perf_counter()
+        serial = list(pdf_extract._extract_page_range(path, 0, args.pages))
+        serial_s = time.perf_counter() - start
+
+        # Warm the pool so worker start-up isn't billed to the first ingest
+        pdf_extract.get_extract_pool().submit(pdf_extract._extract_page_range, path, 0, 1).result()
+
+        start = time.perf_counter()
+        parallel = list(pdf_extract.iter_pdf_pages(path))
+        parallel_s = time.perf_counter() - start
+
+        pdf_extract.shutdown_extract_pool()
+
+    assert serial == parallel, "parallel extraction must reassemble pages in order"
+    print(f"pages={args.pages} workers={args.workers} shard={args.shard_pages}")
+    print(f"serial:   {serial_s:6.2f}s")
+    print(f"parallel: {parallel_s:6.2f}s")
+    print(f"speedup:  {serial_s / parallel_s:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Minimal local stand-in for the OpenAI embeddings endpoint.
+
+Each request sleeps for a fixed latency and returns deterministic vectors,
+optionally answering every Nth request with a 429 + Retry-After so retry
+and concurrency adaptation can be exercised without hitting OpenAI.
+Chat completions requests get a fixed (non-streamed) answer after the same latency.
+
+    python -m benchmarks.fake_embeddings_server --port 8765 --latency 0.2
+"""
+import argparse
+import base64
+import hashlib
+import json
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _vector(text: str, dim: int) -> list:
+    seed = hashlib.sha256(text.encode("utf-8")).digest()
+    return [((seed[i % len(seed)] + i) % 255) / 255.0 for i in range(dim)]
+
+
+def make_handler(latency: float, dim: int, throttle_every: int, rpm_limit: int):
+    counter = {"n": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get("content-length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+
+            with lock:
+                counter["n"] += 1
+                n = counter["n"]
+
+            if throttle_every and n % throttle_every == 0:
+                self._send(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                           {"retry-after-ms": "200"})
+                return
+
+            time.sleep(latency)
+
+            if self.path.endswith("/chat/completions"):
+                self._send(200, {
+                    "id": f"chatcmpl-{n}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": payload.get("model", "fake"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "A fake answer."},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                }, {})
+                return
+
+            inputs = payload.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+
+            as_base64 = payload.get("encoding_format") == "base64"
+            data = []
+            for i, text in enumerate(inputs):
+                vec = _vector(str(text), dim)
+                if as_base64:
+                    vec = base64.b64encode(struct.pack(f"<{dim}f", *vec)).decode("ascii")
+                data.append({"object": "embedding", "index": i, "embedding": vec})
+
+            remaining = max(rpm_limit - n, 0) if rpm_limit else 0
+            headers = {}
+            if rpm_limit:
+                headers = {
+                    "x-ratelimit-limit-requests": str(rpm_limit),
+                    "x-ratelimit-remaining-requests": str(remaining),
+                    "x-ratelimit-reset-requests": "1s",
+                }
+
+            self._send(200, {
+                "object": "list",
+                "data": data,
+                "model": payload.get("model", "fake"),
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            }, headers)
+
+        def _send(self, code: int, body: dict, headers: dict):
+            raw = json.dumps(body).encode("utf-8")
+            self.send_response(code)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(raw)))
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(raw)
+
+    return Handler
+
+
+class _Server(ThreadingHTTPServer):
+    # Room for load benchmarks opening hundreds of connections at once
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def start_server(port: int = 0, latency: float = 0.2, dim: int = 1536,
+                 throttle_every: int = 0, rpm_limit: int = 0) -> ThreadingHTTPServer:
+    """Start the fake server on a background thread; returns the server (port in server_address)"""
+    server = _Server(
+        ("127.0.0.1", port),
+        make_handler(latency, dim, throttle_every, rpm_limit)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--throttle-every", type=int, default=0)
+    parser.add_argument("--rpm-limit", type=int, default=0)
+    args = parser.parse_args()
+
+    srv = start_server(args.port, args.latency, args.dim, args.throttle_every, args.rpm_limit)
+    print(f"Fake embeddings server on http://127.0.0.1:{srv.server_address[1]}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        srv.shutdown()
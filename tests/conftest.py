@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class WhitespaceTokenizer:
+    """Stand-in for tiktoken encodings: one token per whitespace-separated word"""
+
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+    def encode_ordinary(self, text):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+@pytest.fixture
+def whitespace_tokenizer(monkeypatch):
+    """Use WhitespaceTokenizer for both embedding and prompt token counts (no BPE download)"""
+    from app.services import context_builder, pg_vector_client
+
+    tokenizer = WhitespaceTokenizer()
+    monkeypatch.setattr(pg_vector_client, "_tokenizer", tokenizer)
+    monkeypatch.setattr(context_builder, "_llm_tokenizer", tokenizer)
+    return tokenizer
+
+
+@pytest.fixture
+def chat_db(monkeypatch):
+    """sessionmaker over an in-memory SQLite database with the chat tables, used as SessionLocal"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from app.db import database
+    from app.db.models import ChatMessage, ChatSession
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    ChatSession.__table__.create(engine)
+    ChatMessage.__table__.create(engine)
+    session_factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(database, "SessionLocal", session_factory)
+    yield session_factory
+    engine.dispose()
@@ -0,0 +1,63 @@
+import uuid
+
+import numpy as np
+
+from app.services import answer_cache
+from app.services.answer_cache import SemanticAnswerCache
+
+COLLECTION = uuid.uuid4()
+
+
+def _cache(**kwargs):
+    options = {"threshold": 0.95, "max_entries": 4, "ttl_seconds": 60.0}
+    options.update(kwargs)
+    return SemanticAnswerCache(**options)
+
+
+def test_similar_query_hits_dissimilar_misses():
+    cache = _cache()
+    cache.put(COLLECTION, 1, [1.0, 0.0, 0.0], "k=4", "answer", ["a.pdf"])
+
+    assert cache.get(COLLECTION, 1, [0.99, 0.05, 0.0], "k=4") == ("answer", ["a.pdf"])
+    assert cache.get(COLLECTION, 1, [0.0, 1.0, 0.0], "k=4") is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_variant_must_match():
+    cache = _cache()
+    cache.put(COLLECTION, 1, [1.0, 0.0], "k=4", "answer", [])
+
+    assert cache.get(COLLECTION, 1, [1.0, 0.0], "k=8") is None
+
+
+def test_new_content_version_invalidates_and_stale_put_is_ignored():
+    cache = _cache()
+    cache.put(COLLECTION, 1, [1.0, 0.0], "v", "old", [])
+
+    assert cache.get(COLLECTION, 2, [1.0, 0.0], "v") is None
+    cache.put(COLLECTION, 2, [1.0, 0.0], "v", "new", [])
+    # An answer generated against version 1 finishes after the bump
+    cache.put(COLLECTION, 1, [1.0, 0.0], "v", "old", [])
+
+    assert cache.get(COLLECTION, 2, [1.0, 0.0], "v") == ("new", [])
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "monotonic", lambda: now[0])
+    cache = _cache(ttl_seconds=10.0)
+    cache.put(COLLECTION, 1, [1.0, 0.0], "v", "answer", [])
+
+    now[0] += 9.0
+    assert cache.get(COLLECTION, 1, [1.0, 0.0], "v") is not None
+    now[0] += 2.0
+    assert cache.get(COLLECTION, 1, [1.0, 0.0], "v") is None
+
+
+def test_slots_are_reused_round_robin():
+    cache = _cache(max_entries=2)
+    for i, vector in enumerate(np.eye(3)):
+        cache.put(COLLECTION, 1, vector, "v", f"answer{i}", [])
+
+    assert cache.get(COLLECTION, 1, [1.0, 0.0, 0.0], "v") is None
+    assert cache.get(COLLECTION, 1, [0.0, 0.0, 1.0], "v") == ("answer2", [])
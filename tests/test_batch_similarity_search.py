@@ -0,0 +1,23 @@
+import uuid
+from types import SimpleNamespace
+from unittest import mock
+
+from app.services import mmap_index, pg_vector_client
+
+
+def test_mmap_results_stay_aligned_when_a_chunk_is_missing(monkeypatch):
+    kept, deleted, other = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    resolved = SimpleNamespace(id=uuid.uuid4(), content_version=1)
+    hits = {0: [(deleted, 0.9), (kept, 0.8)], 1: [(other, 0.7)]}
+
+    monkeypatch.setattr(pg_vector_client, "resolve_collection", lambda db, name: resolved)
+    monkeypatch.setattr(mmap_index, "search", lambda cid, version, q, k: hits[q])
+    monkeypatch.setattr(
+        pg_vector_client,
+        "_fetch_chunk_rows",
+        lambda db, ids: [(kept, "kept text", "a.pdf", None, 0), (other, "other text", "b.pdf", None, 0)]
+    )
+
+    results = pg_vector_client.batch_similarity_search(mock.MagicMock(), [0, 1], k=2, collection="c")
+
+    assert results == [(["kept text"], ["a.pdf"]), (["other text"], ["b.pdf"])]
@@ -0,0 +1,130 @@
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import config
+from app.db.models import ChatMessage, ChatSession
+from app.services import chat_memory
+from app.services.chat_memory import _verbatim_start, summarize_session
+
+
+def _turns(*sizes):
+    """One user + one assistant message per turn, each of `size` words"""
+    messages = []
+    for size in sizes:
+        messages.append(SimpleNamespace(role="user", content=" ".join(["q"] * size)))
+        messages.append(SimpleNamespace(role="assistant", content=" ".join(["a"] * size)))
+    return messages
+
+
+def test_keeps_at_most_max_turns(whitespace_tokenizer):
+    messages = _turns(1, 1, 1, 1)
+
+    assert _verbatim_start(messages, max_turns=2, budget_tokens=100) == 4
+
+
+def test_stops_at_token_budget(whitespace_tokenizer):
+    # Turns cost 20, 6 and 4 tokens; only the newest two fit in 12
+    messages = _turns(10, 3, 2)
+
+    assert _verbatim_start(messages, max_turns=6, budget_tokens=12) == 2
+
+
+def test_newest_turn_over_budget_keeps_nothing(whitespace_tokenizer):
+    messages = _turns(1, 50)
+
+    assert _verbatim_start(messages, max_turns=6, budget_tokens=10) == len(messages)
+
+
+def test_leading_assistant_message_counts_as_a_turn(whitespace_tokenizer):
+    messages = [SimpleNamespace(role="assistant", content="hello")] + _turns(1)
+
+    assert _verbatim_start(messages, max_turns=6, budget_tokens=100) == 0
+
+
+def _session_with_turns(chat_db, n_turns):
+    session_id = uuid.uuid4()
+    start = datetime(2026, 1, 1)
+    db = chat_db()
+    db.add(ChatSession(session_id=session_id))
+    for i in range(n_turns):
+        created_at = start + timedelta(seconds=i)
+        db.add(ChatMessage(id=uuid.uuid4(), session_id=session_id, role="user", content=f"q{i}", created_at=created_at))
+        db.add(ChatMessage(id=uuid.uuid4(), session_id=session_id, role="assistant", content=f"a{i}", created_at=created_at))
+    db.commit()
+    db.close()
+    return session_id, start
+
+
+@pytest.fixture
+def summary_config(monkeypatch, whitespace_tokenizer):
+    monkeypatch.setattr(config, "CHAT_WRITE_BEHIND_ENABLED", False)
+    monkeypatch.setattr(config, "CHAT_HISTORY_MAX_TURNS", 2)
+    monkeypatch.setattr(config, "CHAT_HISTORY_TOKEN_BUDGET", 1000)
+    monkeypatch.setattr(config, "CHAT_SUMMARY_FOLD_TURNS", 10)
+
+
+def test_backlog_is_folded_in_bounded_chunks(chat_db, summary_config, monkeypatch):
+    session_id, start = _session_with_turns(chat_db, 30)
+    calls = []
+
+    def fake_summarize(summary, messages):
+        calls.append((summary, [m.content for m in messages]))
+        return f"summary {len(calls)}"
+
+    monkeypatch.setattr(chat_memory, "_summarize", fake_summarize)
+
+    assert summarize_session(session_id) is True
+
+    # 28 turns fall outside the 2-turn window: 10 + 10 + 8 turns, each call building on the last summary
+    assert [len(folded) for _, folded in calls] == [20, 20, 16]
+    assert [summary for summary, _ in calls] == [None, "summary 1", "summary 2"]
+    assert calls[0][1][:2] == ["q0", "a0"] and calls[2][1][-2:] == ["q27", "a27"]
+
+    db = chat_db()
+    state = db.query(ChatSession).one()
+    assert state.summary == "summary 3"
+    assert state.summary_until == start + timedelta(seconds=27)
+    db.close()
+    assert summarize_session(session_id) is False
+
+
+def test_failed_fold_keeps_the_chunks_already_committed(chat_db, summary_config, monkeypatch):
+    session_id, start = _session_with_turns(chat_db, 30)
+    calls = []
+    fail_on_call = [2]
+
+    def flaky_summarize(summary, messages):
+        calls.append(len(messages))
+        if len(calls) == fail_on_call[0]:
+            raise RuntimeError("LLM unavailable")
+        return f"summary {len(calls)}"
+
+    monkeypatch.setattr(chat_memory, "_summarize", flaky_summarize)
+
+    with pytest.raises(RuntimeError):
+        summarize_session(session_id)
+
+    db = chat_db()
+    assert db.query(ChatSession.summary_until).scalar() == start + timedelta(seconds=9)
+    db.close()
+
+    # The retry starts after the committed chunk, not from the first turn
+    calls.clear()
+    fail_on_call[0] = None
+    assert summarize_session(session_id) is True
+    assert calls == [20, 16]
+
+
+def test_fold_chunk_never_splits_a_turn(chat_db, summary_config, monkeypatch):
+    monkeypatch.setattr(config, "CHAT_SUMMARY_FOLD_TURNS", 1)
+    session_id, start = _session_with_turns(chat_db, 5)
+    db = chat_db()
+
+    # Limit of 3 messages would cut the second turn in half
+    folded = chat_memory._oldest_unsummarized(db, session_id, None, start + timedelta(seconds=10), limit=3)
+    db.close()
+
+    assert [m.content for m in folded] == ["q0", "a0"]
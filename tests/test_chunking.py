@@ -0,0 +1,67 @@
+import pytest
+
+from app.services import pg_vector_client
+from app.services.chunking import iter_token_chunks
+
+
+class CharTokenizer:
+    """One token per character, so separators between units count too"""
+
+    def encode_ordinary(self, text):
+        return list(text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+@pytest.fixture
+def char_tokenizer(monkeypatch):
+    monkeypatch.setattr(pg_vector_client, "_tokenizer", CharTokenizer())
+
+
+def _pages():
+    paragraph = " ".join(f"Sentence number {i} ends here." for i in range(12))
+    return [paragraph + "\n\n" + paragraph, "Short page.", "", paragraph]
+
+
+def test_chunks_fit_the_limit_including_separators(char_tokenizer):
+    chunks = list(iter_token_chunks(_pages(), chunk_tokens=80, overlap_tokens=20))
+
+    assert len(chunks) > 3
+    for chunk in chunks:
+        assert chunk.token_count == len(chunk.text)
+        assert chunk.token_count <= 80
+
+
+def test_separators_count_towards_the_limit(char_tokenizer):
+    # Three 11-character sentences sum to 33 tokens but join to 35
+    text = " ".join(f"Sentence{i:02d}." for i in range(9))
+    chunks = list(iter_token_chunks([text], chunk_tokens=33, overlap_tokens=0))
+
+    assert [c.token_count for c in chunks] == [23, 23, 23, 23, 11]
+
+
+def test_every_sentence_is_kept(char_tokenizer):
+    chunks = list(iter_token_chunks(_pages(), chunk_tokens=80, overlap_tokens=20))
+    joined = "\n".join(c.text for c in chunks)
+
+    for i in range(12):
+        assert f"Sentence number {i} ends here." in joined
+    assert "Short page." in joined
+
+
+def test_consecutive_chunks_overlap(whitespace_tokenizer):
+    text = " ".join(f"Word{i} is here." for i in range(60))
+    chunks = list(iter_token_chunks([text], chunk_tokens=30, overlap_tokens=9))
+
+    assert all(c.token_count <= 30 for c in chunks)
+    for previous, following in zip(chunks, chunks[1:]):
+        # 9 tokens of overlap = the previous chunk's last three sentences
+        tail = " ".join(previous.text.split(" ")[-9:])
+        assert following.text.startswith(tail)
+
+
+def test_oversized_unit_is_cut_by_tokens(whitespace_tokenizer):
+    chunks = list(iter_token_chunks([" ".join(["x"] * 25)], chunk_tokens=10, overlap_tokens=0))
+
+    assert [c.token_count for c in chunks] == [10, 10, 5]
@@ -0,0 +1,37 @@
+import uuid
+from unittest import mock
+
+from app.core import config
+from app.services import context_builder
+from app.services.context_builder import build_context
+
+
+def _hit(content, **extra):
+    return dict({"content": content, "filename": "a.pdf", "document_id": uuid.uuid4(), "chunk_index": 3}, **extra)
+
+
+def test_only_close_vector_hits_get_neighbors(whitespace_tokenizer, monkeypatch):
+    fetch = mock.MagicMock(return_value={})
+    monkeypatch.setattr(context_builder, "fetch_neighbors", fetch)
+    near = _hit("near hit text", distance=config.CONTEXT_NEIGHBOR_MAX_DISTANCE / 2)
+    hits = [
+        near,
+        _hit("far hit text", distance=config.CONTEXT_NEIGHBOR_MAX_DISTANCE + 0.5),
+        _hit("lexical only hit", score=0.03, distance=None),
+    ]
+
+    build_context(hits, db=mock.MagicMock(), budget_tokens=1000, neighbor_radius=1)
+
+    strong = fetch.call_args[0][1]
+    assert [h["content"] for h in strong] == ["near hit text"]
+
+
+def test_no_neighbor_fetch_without_distances(whitespace_tokenizer, monkeypatch):
+    fetch = mock.MagicMock(return_value={})
+    monkeypatch.setattr(context_builder, "fetch_neighbors", fetch)
+
+    context, sources = build_context([_hit("hybrid hit", score=0.03)], db=mock.MagicMock(), budget_tokens=1000)
+
+    fetch.assert_not_called()
+    assert "hybrid hit" in context
+    assert sources == ["a.pdf"]
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from app.services import embedding_cache
+from app.services.embedding_cache import cache_key, get_embeddings_cached, lookup_many, normalize_text
+
+
+def test_normalize_text_collapses_whitespace():
+    assert normalize_text("  a\n\tb   c ") == "a b c"
+    assert cache_key("a  b") == cache_key("a\nb")
+
+
+def test_get_embeddings_cached_embeds_only_misses_and_never_commits(monkeypatch):
+    db = mock.MagicMock()
+    hit_key = cache_key("cached")
+    stored = {}
+
+    monkeypatch.setattr(embedding_cache, "lookup_many", lambda _db, keys: {hit_key: [1.0]})
+    embedded = []
+    monkeypatch.setattr(
+        "app.services.pg_vector_client.get_embeddings_batch",
+        lambda texts: embedded.extend(texts) or [[2.0] for _ in texts]
+    )
+    monkeypatch.setattr(embedding_cache, "store_many_async", stored.update)
+
+    result = get_embeddings_cached(db, ["cached", "new", "new"])
+
+    assert result == [[1.0], [2.0], [2.0]]
+    assert embedded == ["new"]
+    assert list(stored) == [cache_key("new")]
+    db.begin_nested.assert_called_once()
+    db.commit.assert_not_called()
+    db.rollback.assert_not_called()
+
+
+def test_lookup_many_touches_only_stale_hits(monkeypatch):
+    now = datetime.now(timezone.utc)
+    db = mock.MagicMock()
+    db.execute.return_value.all.return_value = [
+        ("fresh", [1.0], now),
+        ("stale", [2.0], now - timedelta(days=2)),
+    ]
+    writes = []
+    monkeypatch.setattr(embedding_cache, "_submit_write", lambda write, keys: writes.append((write, keys)))
+
+    found = lookup_many(db, ["fresh", "stale", "missing"])
+
+    assert found == {"fresh": [1.0], "stale": [2.0]}
+    assert writes == [(embedding_cache.touch_many, ["stale"])]
+    assert db.execute.call_count == 1
+
+
+def test_async_variant_embeds_the_same_misses(monkeypatch):
+    import asyncio
+    from contextlib import asynccontextmanager
+
+    from app.services.embedding_cache import aget_embeddings_cached
+
+    hit_key = cache_key("cached")
+    stored = {}
+    embedded = []
+
+    class FakeAsyncSession:
+        @asynccontextmanager
+        async def begin_nested(self):
+            yield
+
+        async def run_sync(self, fn, *args):
+            return fn(None, *args)
+
+    async def fake_embed(texts):
+        embedded.extend(texts)
+        return [[2.0] for _ in texts]
+
+    monkeypatch.setattr(embedding_cache, "lookup_many", lambda _db, keys: {hit_key: [1.0]})
+    monkeypatch.setattr("app.services.pg_vector_client.aget_embeddings_batch", fake_embed)
+    monkeypatch.setattr(embedding_cache, "store_many_async", stored.update)
+
+    result = asyncio.run(aget_embeddings_cached(FakeAsyncSession(), ["cached", "new", "new"]))
+
+    assert result == [[1.0], [2.0], [2.0]]
+    assert embedded == ["new"]
+    assert list(stored) == [cache_key("new")]
@@ -0,0 +1,144 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import openai
+
+from app.services import embedding_executor
+from app.services.embedding_executor import EmbeddingExecutor, _parse_duration
+
+
+def _headers(remaining, limit=100):
+    return {"x-ratelimit-limit-requests": str(limit), "x-ratelimit-remaining-requests": str(remaining)}
+
+
+def test_parse_duration():
+    assert _parse_duration("2") == 2.0
+    assert _parse_duration("6m0s") == 360.0
+    assert _parse_duration("20ms") == 0.02
+    assert _parse_duration("bogus") is None
+
+
+def test_burst_of_429s_halves_once(monkeypatch):
+    executor = EmbeddingExecutor(max_concurrency=16)
+    clock = [100.0]
+    monkeypatch.setattr(embedding_executor.time, "monotonic", lambda: clock[0])
+
+    for _ in range(8):
+        executor._decrease("429 from embeddings API")
+    assert executor.concurrency == 8
+
+    clock[0] += embedding_executor._DECREASE_COOLDOWN_SECONDS
+    executor._decrease("429 from embeddings API")
+    assert executor.concurrency == 4
+    executor.shutdown()
+
+
+def test_increase_needs_rate_limit_headers(monkeypatch):
+    executor = EmbeddingExecutor(max_concurrency=8)
+    executor._limit = 2
+
+    executor._adjust_from_headers({})
+    assert executor.concurrency == 2
+
+    executor._adjust_from_headers(_headers(remaining=90))
+    assert executor.concurrency == 3
+
+    executor._adjust_from_headers(_headers(remaining=5))
+    assert executor.concurrency == 1
+    executor.shutdown()
+
+
+def test_no_increase_during_cooldown(monkeypatch):
+    executor = EmbeddingExecutor(max_concurrency=8)
+    clock = [50.0]
+    monkeypatch.setattr(embedding_executor.time, "monotonic", lambda: clock[0])
+
+    executor._decrease("429 from embeddings API")
+    executor._adjust_from_headers(_headers(remaining=90))
+    assert executor.concurrency == 4
+
+    clock[0] += embedding_executor._DECREASE_COOLDOWN_SECONDS
+    executor._adjust_from_headers(_headers(remaining=90))
+    assert executor.concurrency == 5
+    executor.shutdown()
+
+
+class _FakeAsyncEmbeddings:
+    """embeddings.with_raw_response.create stand-in that records concurrency"""
+
+    def __init__(self, fail_first=0):
+        self.in_flight = self.max_in_flight = self.calls = 0
+        self.fail_first = fail_first
+        self.with_raw_response = self
+
+    def with_options(self, **kwargs):
+        return SimpleNamespace(embeddings=self)
+
+    async def create(self, model, input):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if self.calls <= self.fail_first:
+                response = httpx.Response(
+                    429, request=httpx.Request("POST", "http://test"), headers={"retry-after-ms": "1"}
+                )
+                raise openai.RateLimitError("rate limited", response=response, body=None)
+        finally:
+            self.in_flight -= 1
+
+        data = [SimpleNamespace(index=i, embedding=[float(len(t))]) for i, t in enumerate(input)]
+        return SimpleNamespace(headers={}, parse=lambda: SimpleNamespace(data=data))
+
+
+def test_async_batches_share_the_in_flight_limit(monkeypatch):
+    fake = _FakeAsyncEmbeddings()
+    monkeypatch.setattr(embedding_executor, "get_async_openai_client", lambda: fake)
+    executor = EmbeddingExecutor(max_concurrency=3)
+
+    async def run():
+        return await asyncio.gather(*(executor.aembed_batch(["x" * i]) for i in range(1, 11)))
+
+    results = asyncio.run(run())
+
+    assert results == [[[float(i)]] for i in range(1, 11)]
+    assert fake.max_in_flight == 3
+    executor.shutdown()
+
+
+def test_async_429_is_retried_and_halves_the_limit(monkeypatch):
+    fake = _FakeAsyncEmbeddings(fail_first=1)
+    monkeypatch.setattr(embedding_executor, "get_async_openai_client", lambda: fake)
+    executor = EmbeddingExecutor(max_concurrency=4, max_retries=3)
+
+    assert asyncio.run(executor.aembed_batch(["ab"])) == [[2.0]]
+    assert fake.calls == 2
+    assert executor.concurrency == 2
+    executor.shutdown()
+
+
+def test_query_embeddings_do_not_wait_for_ingest_slots(monkeypatch):
+    from app.core import config
+    from app.services import pg_vector_client
+
+    fake = _FakeAsyncEmbeddings()
+    monkeypatch.setattr(embedding_executor, "get_async_openai_client", lambda: fake)
+    monkeypatch.setattr(config, "EMBED_MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(config, "OPENAI_MAX_CONNECTIONS", 50)
+    monkeypatch.setattr(embedding_executor, "_executor", None)
+    monkeypatch.setattr(embedding_executor, "_query_executor", None)
+
+    # Every ingest slot is taken
+    ingest = embedding_executor.get_embedding_executor()
+    ingest._in_flight = ingest.concurrency
+
+    async def run():
+        return await asyncio.wait_for(
+            asyncio.gather(*(pg_vector_client.aembed_batch([f"q{i}"]) for i in range(20))), timeout=5
+        )
+
+    assert len(asyncio.run(run())) == 20
+    assert fake.max_in_flight == 20
+    assert embedding_executor.get_query_embedding_executor().max_concurrency == 50
@@ -0,0 +1,26 @@
+import numpy as np
+
+from app.services import mmap_index
+from app.services.mmap_index import top_k
+
+
+def test_top_k_matches_full_sort_across_blocks(monkeypatch):
+    monkeypatch.setattr(mmap_index, "_SCORE_BLOCK_ROWS", 7)
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(50, 16)).astype(np.float16)
+    query = rng.normal(size=16).astype(np.float32)
+
+    order, scores = top_k(vectors, query, 5)
+
+    expected = np.argsort(-(vectors.astype(np.float32) @ query))[:5]
+    assert order.tolist() == expected.tolist()
+    assert np.all(np.diff(scores) <= 0)
+
+
+def test_top_k_larger_than_n_returns_everything():
+    vectors = np.eye(3, dtype=np.float32)
+
+    order, scores = top_k(vectors, np.array([0.1, 0.3, 0.2], dtype=np.float32), 10)
+
+    assert order.tolist() == [1, 2, 0]
+    assert scores.tolist() == [np.float32(0.3), np.float32(0.2), np.float32(0.1)]
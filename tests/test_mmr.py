@@ -0,0 +1,44 @@
+import numpy as np
+
+from app.services.mmr import mmr_select, rerank_mmr
+
+
+def test_most_relevant_candidate_is_picked_first():
+    query = np.array([1.0, 0.0])
+    candidates = np.array([[0.0, 1.0], [1.0, 0.1], [0.5, 0.5]])
+
+    assert mmr_select(query, candidates, 1)[0] == 1
+
+
+def test_near_duplicates_are_skipped_for_diverse_candidates():
+    query = np.array([1.0, 0.2, 0.0])
+    candidates = np.array([
+        [1.0, 0.20, 0.0],
+        [1.0, 0.21, 0.0],  # near duplicate of the first
+        [0.7, 0.0, 0.7],
+    ])
+
+    assert mmr_select(query, candidates, 2, lambda_mult=0.3) == [0, 2]
+    # Pure relevance keeps the duplicate
+    assert mmr_select(query, candidates, 2, lambda_mult=1.0) == [0, 1]
+
+
+def test_k_is_capped_and_picks_are_unique():
+    rng = np.random.default_rng(0)
+    candidates = rng.normal(size=(5, 4)).astype(np.float32)
+
+    picked = mmr_select(rng.normal(size=4), candidates, 10)
+    assert sorted(picked) == list(range(5))
+    assert mmr_select(np.ones(4), candidates, 0) == []
+
+
+def test_zero_vectors_do_not_produce_nan():
+    candidates = np.array([[0.0, 0.0], [1.0, 0.0]])
+
+    assert mmr_select(np.array([1.0, 0.0]), candidates, 2) == [1, 0]
+
+
+def test_hits_without_embeddings_keep_their_order():
+    hits = [{"chunk_id": i, "embedding": None} for i in range(5)]
+
+    assert rerank_mmr([1.0, 0.0], hits, 3) == hits[:3]
@@ -0,0 +1,67 @@
+import asyncio
+import threading
+import uuid
+from types import SimpleNamespace
+from unittest import mock
+
+from app.core import config
+from app.services import mmap_index, pg_vector_client, qa
+
+
+class FakeAsyncSession:
+    """AsyncSession stand-in: run_sync calls fn with a mock Session on the calling (loop) thread"""
+
+    def __init__(self):
+        self.sync_session = mock.MagicMock()
+        self.run_sync_threads = []
+
+    async def run_sync(self, fn, *args, **kwargs):
+        self.run_sync_threads.append((fn.__name__, threading.get_ident()))
+        return fn(self.sync_session, *args, **kwargs)
+
+
+def test_aprepare_query_keeps_cpu_work_off_the_event_loop(whitespace_tokenizer, monkeypatch):
+    monkeypatch.setattr(config, "ANSWER_CACHE_ENABLED", False)
+    monkeypatch.setattr(config, "CONTEXT_NEIGHBOR_RADIUS", 1)
+    chunk_id, document_id = uuid.uuid4(), uuid.uuid4()
+    threads = {}
+
+    monkeypatch.setattr(
+        pg_vector_client, "resolve_collection", lambda db, name: SimpleNamespace(id=uuid.uuid4(), content_version=1)
+    )
+
+    def fake_mmap_search(*args):
+        threads["mmap"] = threading.get_ident()
+        return [(chunk_id, 0.9)]
+
+    monkeypatch.setattr(mmap_index, "search", fake_mmap_search)
+    monkeypatch.setattr(
+        pg_vector_client, "_fetch_chunk_rows", lambda db, ids: [(chunk_id, "the answer is here", "a.pdf", document_id, 2)]
+    )
+    monkeypatch.setattr(qa, "fetch_neighbors", lambda db, strong, radius: {
+        (document_id, 3): {"content": "next chunk", "filename": "a.pdf", "document_id": document_id, "chunk_index": 3}
+    })
+
+    real_build_context = qa.build_context
+
+    def recording_build_context(*args, **kwargs):
+        threads["pack"] = threading.get_ident()
+        return real_build_context(*args, **kwargs)
+
+    monkeypatch.setattr(qa, "build_context", recording_build_context)
+    db = FakeAsyncSession()
+
+    async def run():
+        threads["loop"] = threading.get_ident()
+        return await qa.aprepare_query("question", [1.0, 0.0], collection="docs", db=db)
+
+    prepared = asyncio.run(run())
+
+    assert "the answer is here" in prepared.context and "next chunk" in prepared.context
+    assert prepared.sources == ["a.pdf"]
+    assert threads["mmap"] != threads["loop"]
+    assert threads["pack"] != threads["loop"]
+    # Every SQL step, including the neighbor fetch issued from the packing thread, ran on the loop
+    # resolve_collection, _mmap_search_results, fetch_neighbors
+    assert len(db.run_sync_threads) == 3
+    assert {thread for _, thread in db.run_sync_threads} == {threads["loop"]}
@@ -0,0 +1,54 @@
+import numpy as np
+
+from app.services import query_embedding_cache
+from app.services.query_embedding_cache import QueryEmbeddingCache, _ENTRY_OVERHEAD_BYTES
+
+DIMS = 8
+
+
+def _entry_bytes(text):
+    return DIMS * 4 + len(text) + _ENTRY_OVERHEAD_BYTES
+
+
+def test_put_returns_read_only_float32():
+    cache = QueryEmbeddingCache(max_bytes=10_000, ttl_seconds=60.0)
+    vector = cache.put("q", [1.0] * DIMS)
+
+    assert vector.dtype == np.float32
+    assert not vector.flags.writeable
+    assert cache.get(" q ") is vector
+
+
+def test_least_recently_used_is_evicted():
+    cache = QueryEmbeddingCache(max_bytes=2 * _entry_bytes("a"), ttl_seconds=60.0)
+    cache.put("a", [1.0] * DIMS)
+    cache.put("b", [2.0] * DIMS)
+    cache.get("a")
+    cache.put("c", [3.0] * DIMS)
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+    assert cache.stats()["evicted"] == 1
+    assert cache.stats()["bytes"] == 2 * _entry_bytes("a")
+
+
+def test_entries_expire(monkeypatch):
+    now = [500.0]
+    monkeypatch.setattr(query_embedding_cache.time, "monotonic", lambda: now[0])
+    cache = QueryEmbeddingCache(max_bytes=10_000, ttl_seconds=5.0)
+    cache.put("q", [1.0] * DIMS)
+
+    now[0] += 6.0
+    assert cache.get("q") is None
+    stats = cache.stats()
+    assert stats["expired"] == 1
+    assert stats["entries"] == 0
+    assert stats["bytes"] == 0
+
+
+def test_entry_larger_than_cache_is_not_stored():
+    cache = QueryEmbeddingCache(max_bytes=10, ttl_seconds=60.0)
+    cache.put("q", [1.0] * DIMS)
+
+    assert cache.stats()["entries"] == 0
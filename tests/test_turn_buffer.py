@@ -0,0 +1,195 @@
+import logging
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.core import config
+from app.db.models import ChatMessage, ChatSession
+from app.services import chat_memory, turn_buffer
+from app.services.turn_buffer import ConversationTurnBuffer
+
+
+@pytest.fixture
+def buffer_db(chat_db, monkeypatch):
+    monkeypatch.setattr(turn_buffer, "SessionLocal", chat_db)
+    return chat_db
+
+
+def _buffer(**overrides):
+    # Flushed by hand: the background thread only runs when woken
+    options = dict(flush_interval=3600, max_pending_turns=100, max_queued_turns=100, max_retries=2)
+    options.update(overrides)
+    return ConversationTurnBuffer(**options)
+
+
+def _session(session_factory):
+    session_id = uuid.uuid4()
+    db = session_factory()
+    db.add(ChatSession(session_id=session_id))
+    db.commit()
+    db.close()
+    return session_id
+
+
+def _contents(session_factory, session_id):
+    db = session_factory()
+    try:
+        return sorted(m.content for m in db.query(ChatMessage).filter(ChatMessage.session_id == session_id))
+    finally:
+        db.close()
+
+
+class _Unreachable:
+    def execute(self, *args, **kwargs):
+        raise OperationalError("SELECT 1", {}, Exception("connection refused"))
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_created_at_comes_from_the_database_per_turn(buffer_db):
+    session_id = _session(buffer_db)
+    buffer = _buffer()
+    buffer.add(session_id, "q1", "a1")
+    buffer.add(session_id, "q2", "a2")
+    assert [m.created_at for m in buffer.pending_for(session_id)] == [None] * 4
+
+    buffer.flush()
+
+    db = buffer_db()
+    stamps = dict(db.query(ChatMessage.content, ChatMessage.created_at).filter(ChatMessage.session_id == session_id))
+    db.close()
+    assert stamps["q1"] == stamps["a1"] < stamps["q2"] == stamps["a2"]
+
+
+def test_unflushed_turns_stay_in_the_window_after_a_summary(buffer_db, monkeypatch, whitespace_tokenizer):
+    session_id = _session(buffer_db)
+    db = buffer_db()
+    session = db.query(ChatSession).filter(ChatSession.session_id == session_id).one()
+    session.summary, session.summary_until = "earlier", datetime(2999, 1, 1)
+    db.commit()
+
+    buffer = _buffer()
+    monkeypatch.setattr(config, "CHAT_WRITE_BEHIND_ENABLED", True)
+    monkeypatch.setattr(config, "CHAT_SUMMARY_ENABLED", False)
+    monkeypatch.setattr(chat_memory, "get_turn_buffer", lambda: buffer)
+    buffer.add(session_id, "q1", "a1")
+
+    try:
+        summary, messages = chat_memory.get_chat_memory(db, session_id)
+    finally:
+        db.close()
+    assert summary == "earlier"
+    assert [m["content"] for m in messages] == ["q1", "a1"]
+
+
+def test_rejected_row_is_dropped_and_the_rest_stored(buffer_db):
+    session_id = _session(buffer_db)
+    buffer = _buffer()
+    buffer.add(session_id, "q1", "a1")
+    buffer.add(session_id, "q2", None)  # NOT NULL violation fails the batch INSERT
+    buffer.add(session_id, "q3", "a3")
+
+    assert buffer.flush() == 5
+    assert _contents(buffer_db, session_id) == ["a1", "a3", "q1", "q2", "q3"]
+    stats = buffer.stats()
+    assert stats["dropped_messages"] == 1
+    assert stats["pending_messages"] == 0
+
+
+def test_messages_are_dropped_after_max_retries(buffer_db, monkeypatch):
+    session_id = _session(buffer_db)
+    buffer = _buffer(max_retries=2)
+    buffer.add(session_id, "q1", "a1")
+
+    monkeypatch.setattr(turn_buffer, "SessionLocal", _Unreachable)
+    for _ in range(2):
+        assert buffer.flush() == 0
+        assert buffer.stats()["pending_messages"] == 2
+
+    assert buffer.flush() == 0
+    stats = buffer.stats()
+    assert stats["pending_messages"] == 0
+    assert stats["dropped_messages"] == 2
+    assert stats["failed_flushes"] == 3
+
+
+def test_shutdown_retries_the_final_flush(buffer_db, monkeypatch):
+    session_id = _session(buffer_db)
+    buffer = _buffer(max_retries=5)
+    buffer.add(session_id, "q1", "a1")
+
+    calls = []
+
+    def flaky_session():
+        calls.append(1)
+        return _Unreachable() if len(calls) <= 2 else buffer_db()
+
+    monkeypatch.setattr(turn_buffer, "SessionLocal", flaky_session)
+    monkeypatch.setattr(turn_buffer.time, "sleep", lambda seconds: None)
+    buffer.shutdown()
+
+    assert _contents(buffer_db, session_id) == ["a1", "q1"]
+    assert buffer.stats()["pending_messages"] == 0
+
+
+def test_shutdown_logs_messages_it_could_not_store(buffer_db, monkeypatch, caplog):
+    session_id = _session(buffer_db)
+    buffer = _buffer(max_retries=3)
+    buffer.add(session_id, "q1", "a1")
+
+    monkeypatch.setattr(turn_buffer, "SessionLocal", _Unreachable)
+    monkeypatch.setattr(turn_buffer.time, "sleep", lambda seconds: None)
+    with caplog.at_level(logging.ERROR, logger="app.turn_buffer"):
+        buffer.shutdown()
+
+    # Dropped once out of retries, or reported as lost if still queued
+    errors = [r.getMessage() for r in caplog.records if r.levelno == logging.ERROR]
+    assert any("2 buffered chat messages" in m and ("Dropped" in m or "Lost" in m) for m in errors)
+
+
+def test_full_buffer_saves_the_turn_synchronously(buffer_db, monkeypatch):
+    session_id = _session(buffer_db)
+    buffer = _buffer(max_pending_turns=1, max_queued_turns=1)
+    monkeypatch.setattr(config, "CHAT_WRITE_BEHIND_ENABLED", True)
+    monkeypatch.setattr(chat_memory, "get_turn_buffer", lambda: buffer)
+
+    assert buffer.add(session_id, "queued", "queued")
+    assert not buffer.add(session_id, "overflow", "overflow")
+    assert buffer.stats()["overflow_turns"] == 1
+
+    db = buffer_db()
+    try:
+        assert chat_memory.save_conversation_turn(db, session_id, "sync q", "sync a")
+    finally:
+        db.close()
+    assert {"sync a", "sync q"} <= set(_contents(buffer_db, session_id))
+
+
+def test_session_counts_skip_in_flight_messages_already_stored(buffer_db, monkeypatch):
+    session_id = _session(buffer_db)
+    buffer = _buffer()
+    monkeypatch.setattr(config, "CHAT_WRITE_BEHIND_ENABLED", True)
+    monkeypatch.setattr(chat_memory, "get_turn_buffer", lambda: buffer)
+
+    buffer.add(session_id, "q1", "a1")
+    buffer.add(session_id, "q2", "a2")
+    # A flush that has committed the first turn but not cleared _in_flight yet
+    in_flight = buffer._pending[:2]
+    db = buffer_db()
+    db.add_all([
+        ChatMessage(id=r["id"], session_id=r["session_id"], role=r["role"], content=r["content"]) for r in in_flight
+    ])
+    db.commit()
+    buffer._in_flight, buffer._pending = in_flight, buffer._pending[2:]
+
+    try:
+        sessions = chat_memory.get_all_sessions(db)
+    finally:
+        db.close()
+    assert [s["message_count"] for s in sessions] == [4]
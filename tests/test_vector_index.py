@@ -0,0 +1,46 @@
+from unittest import mock
+
+import pytest
+from pydantic import ValidationError
+
+from app.schemas.schemas import BatchQueryRequest, QueryRequest, SearchRequest
+from app.services.vector_index import MAX_EF_SEARCH, apply_search_settings
+
+
+def _applied_ef(**kwargs):
+    db = mock.MagicMock()
+    apply_search_settings(db, **kwargs)
+    return db.execute.call_args[0][1]["ef"]
+
+
+def test_ef_search_is_raised_to_k_and_clamped():
+    assert _applied_ef(ef_search=40, k=200) == "200"
+    assert _applied_ef(ef_search=40, k=5000) == str(MAX_EF_SEARCH)
+
+
+def test_k_is_bounded():
+    with pytest.raises(ValidationError):
+        QueryRequest(query="q", k=5000)
+    with pytest.raises(ValidationError):
+        BatchQueryRequest(queries=["q"], k=0)
+
+
+def test_search_window_is_bounded():
+    assert SearchRequest(query="q", offset=899, limit=100).offset == 899
+    with pytest.raises(ValidationError):
+        SearchRequest(query="q", offset=1000, limit=100)
+
+
+def test_hybrid_search_raises_ef_search_to_the_candidate_count(monkeypatch):
+    from app.core import config
+    from app.services import pg_vector_client
+
+    monkeypatch.setattr(config, "HNSW_EF_SEARCH", 40)
+    monkeypatch.setattr(config, "HYBRID_CANDIDATES", 100)
+    monkeypatch.setattr(pg_vector_client, "resolve_collection", lambda db, collection: None)
+    db = mock.MagicMock()
+    db.execute.return_value.all.return_value = []
+
+    pg_vector_client.hybrid_search_chunks(db, "query", [0.0] * 3, k=4)
+
+    assert db.execute.call_args_list[0][0][1]["ef"] == "100"